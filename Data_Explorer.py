@@ -1,9 +1,31 @@
 import streamlit as st
-from getNISEPdata import getTimeseries, getLookup
+from instrumentation import configure_logging
+from getNISEPdata import getTimeseries, get_token_manager, choose_granularity, label_columns
+from history_cache import HistoryCache
 from datetime import datetime, timedelta
 import plotly.graph_objects as go
+from column_model import select, variables
+from rollups import RollupStore
+from plotting import series_trace
+from refresher import shared_refresher
+from series_store import get_series_store
 import pandas as pd
 
+# Rows per page of the raw data table
+RAW_PAGE_SIZE = 1000
+# Days kept warm by the background refresher (shared with the Checks page)
+REFRESH_DAYS = 30
+# How often the background refresher pulls new data
+REFRESH_INTERVAL_S = 15 * 60
+# Memory cap of the shared store holding ranges longer than the snapshot
+STORE_MAX_BYTES = 1024 ** 3
+# Keep sensor data as float32 and the ref map as categoricals (see compact.py)
+COMPACT = True
+# Longest wait for the first snapshot before showing an error instead of the spinner
+SNAPSHOT_TIMEOUT_S = 5 * 60
+# Days of point history kept in the on-disk cache; older day partitions are deleted
+HISTORY_RETENTION = "400D"
+
 # Page layout configuration
 st.set_page_config(
     page_title="NISEP Heat Pumpz",
@@ -11,18 +33,73 @@ st.set_page_config(
     layout="wide"
 )
 st.logo('logo.svg',size='large')
+configure_logging()
 # --- Auth & Data Fetching ---
 auth_url = st.secrets.get("Login", {}).get("URL", "https://users.carnego.net")
 username = st.secrets.get("Login", {}).get("Username", "")
 password = st.secrets.get("Login", {}).get("Password", "")
 
-# Cache Lookup Data
-@st.cache_resource(ttl="1d")
-def cache_lookup():
-    lookup_df = getLookup(auth_url, username, password)
-    return lookup_df.siteNamespace.unique()
-
-all_sites = cache_lookup()
+# Point histories already downloaded are kept on disk; only gaps are fetched
+history_cache = HistoryCache(".cache/history", retention=HISTORY_RETENTION)
+# Reuse the bearer token across reruns and restarts instead of logging in per fetch
+get_token_manager(auth_url, username, password, cache_path=".cache/token.json")
+
+# A background thread keeps the last REFRESH_DAYS fresh for every session
+refresher = shared_refresher(auth_url, username, password, days=REFRESH_DAYS, interval=REFRESH_INTERVAL_S,
+                             cache=history_cache, compact=COMPACT)
+# Longer ranges are fetched once into a store shared by every session, which only keeps views into it
+series_store = get_series_store(STORE_MAX_BYTES)
+
+
+# Sites, variables and the ref map come from the shared snapshot (refreshed by the background thread),
+# so a rerun never waits on the BMOS API for them
+with st.spinner("Loading NISEP data..."):
+    try:
+        snapshot = refresher.latest(SNAPSHOT_TIMEOUT_S)
+    except Exception as e:
+        st.error(f"Could not load NISEP data: {e}")
+        st.stop()
+lookup = snapshot.lookup
+all_sites = snapshot.sites
+
+
+@st.cache_resource
+def refresher_rollups(name):
+    """Minute -> 15min -> hour -> day rollups of a refresher's snapshots, shared by all sessions."""
+    return RollupStore()
+
+
+def snapshot_rollups(snapshot):
+    # Each new snapshot only recomputes the buckets of the rows it added
+    rollups = refresher_rollups(refresher.name)
+    rollups.append(snapshot.frame)
+    return rollups
+
+
+def load_traces(start_time, end_time, sites, variable_list):
+    """Return (level, plot frame, raw frame) holding only the selected site/variable columns."""
+    if end_time - start_time <= timedelta(days=REFRESH_DAYS):
+        # Served from the shared snapshot, no request to the BMOS API
+        start = pd.Timestamp(start_time).tz_localize("Europe/London")
+        columns = select(snapshot.frame, variable=variable_list, site=sites).columns
+        # Read the coarsest rollup level that still gives enough points for the range
+        rollups = snapshot_rollups(snapshot)
+        level, plot_df = rollups.read(start, snapshot.frame.index.max(), "mean", columns=columns)
+        return level, plot_df, snapshot.frame.loc[start:, columns]
+
+    # Let the server aggregate long ranges instead of shipping raw minutes
+    granularity = choose_granularity(start_time, end_time)
+
+    def fetch(refs, start, end):
+        return getTimeseries(end, start, None, None, auth_url, username, password, cache=history_cache,
+                             averaging="auto", interval=granularity, refs=['@' + ref for ref in refs], columns="ref",
+                             compact=COMPACT)
+
+    # Only the refs behind the selected traces go over the wire, and only once per range
+    refs = [ref.lstrip('@') for ref in lookup.refs(sites, variable_list, display=snapshot.display)]
+    frame = series_store.read(granularity, refs, start_time, end_time, fetch)
+    frame = label_columns(frame, lookup)
+    return granularity, frame, frame
 
 # --- Sidebar for Control ---
 st.sidebar.title("Controls")
@@ -30,44 +107,35 @@ st.sidebar.title("Controls")
 # Days Displayed Input
 past_days = st.sidebar.number_input("Days Displayed", 1, None, 1)
 
-# Only download data when `past_days` is updated
-if 'df' not in st.session_state or st.session_state.past_days != past_days:
-    # Calculate start and end time
-    end_time = datetime(*datetime.now().timetuple()[:3])  # Today's date from the start of the day
-    start_time = end_time - timedelta(days=past_days)
-
-    # Fetch the time series data
-    st.session_state.df = getTimeseries(end_time, start_time, None, None, auth_url, username, password)
-    st.session_state.past_days = past_days
-
-
 # Temporary variables for UI selections
 current_display_site = st.sidebar.multiselect("Select Site", all_sites, None)
 
 # Filter available columns based on the selected sites
-if current_display_site:
-    site_columns = [col for col in st.session_state.df.columns if any(f"({site})" in col for site in current_display_site)]
-else:
-    site_columns = st.session_state.df.columns[1:]  # Exclude 'datetime'
+selected_sites = current_display_site or None
 
-# Dynamically update the available variables based on the filtered columns
-variable_options = list(set([col.split(" (")[0].strip() for col in site_columns]))
+# Dynamically update the available variables based on the selected sites
+variable_options = variables(snapshot.frame, site=selected_sites)
 
 current_variable_1 = st.sidebar.multiselect("Select Variable 1 (Y1)", variable_options, None)
 current_variable_2 = st.sidebar.multiselect("Select Variable 2 (Y2)", variable_options, None)
 
 # --- Update Graph Button ---
 update_button = st.sidebar.button("Update Graph")
+if update_button:
+    # Remember what was plotted, so paging through the raw data keeps the graph
+    st.session_state.plotted = (selected_sites, current_variable_1, current_variable_2)
 
 # --- Data Processing ---
-if update_button:  # Only update the graph when the button is pressed
+if 'plotted' in st.session_state:  # Only update the graph when the button is pressed
+    selected_sites, current_variable_1, current_variable_2 = st.session_state.plotted
+    # Calculate start and end time
+    end_time = datetime(*datetime.now().timetuple()[:3])  # Today's date from the start of the day
+    start_time = end_time - timedelta(days=past_days)
     with st.spinner("(com)Plotting!"):
-        # Filter the dataframe to include only relevant columns
-        filtered_columns = [
-            col for col in site_columns if col.split(" (")[0].strip() in current_variable_1 + current_variable_2
-        ]
+        # Load only the columns of the selected traces; nothing is kept in `st.session_state`
+        level, plot_df, raw_df = load_traces(start_time, end_time, selected_sites, current_variable_1 + current_variable_2)
 
-        if st.session_state.df.empty:
+        if plot_df.empty and (current_variable_1 or current_variable_2):
             st.warning("No data available for the selected parameters.")
         else:
             # --- Main Content ---
@@ -79,19 +147,19 @@ if update_button:  # Only update the graph when the button is pressed
 
                 # Add traces for Variable 1 (Y1)
                 for var in current_variable_1:
-                    cols = [col for col in site_columns if col.startswith(var)]
+                    cols = select(plot_df, variable=var, site=selected_sites).columns
                     for col in cols:
-                        fig.add_trace(go.Scatter(x=st.session_state.df.index, y=st.session_state.df[col], mode='lines', name=f"{col} (Y1)", yaxis="y1"))
+                        fig.add_trace(series_trace(plot_df[col], mode='lines', name=f"{col} (Y1)", yaxis="y1"))
 
                 # Add traces for Variable 2 (Y2)
                 for var in current_variable_2:
-                    cols = [col for col in site_columns if col.startswith(var)]
+                    cols = select(plot_df, variable=var, site=selected_sites).columns
                     for col in cols:
-                        fig.add_trace(go.Scatter(x=st.session_state.df.index, y=st.session_state.df[col], mode='lines', name=f"{col} (Y2)", yaxis="y2"))
+                        fig.add_trace(series_trace(plot_df[col], mode='lines', name=f"{col} (Y2)", yaxis="y2"))
 
                 # Configure axes with dynamic labels and place legend to the right of the plot
                 fig.update_layout(
-                    title=f"Heat pump data over the past {past_days} days",
+                    title=f"Heat pump data over the past {past_days} days" + (f" ({level} mean)" if level else ""),
                     xaxis=dict(title="Datetime"),
                     yaxis=dict(title=", ".join(current_variable_1) if current_variable_1 else "Y1 Variables"),
                     yaxis2=dict(
@@ -114,7 +182,10 @@ if update_button:  # Only update the graph when the button is pressed
 
             # --- Raw Data Preview ---
             with st.expander("🗂️ Show Raw Data"):
-                st.dataframe(st.session_state.df[filtered_columns])  # Show filtered data for the selected columns
+                # Page through the filtered rows instead of sending the whole frame to the browser
+                n_pages = max(1, -(-len(raw_df) // RAW_PAGE_SIZE))
+                page = st.number_input(f"Page (of {n_pages})", 1, n_pages, 1)
+                st.dataframe(raw_df.iloc[(page - 1) * RAW_PAGE_SIZE:page * RAW_PAGE_SIZE])
 else:
     st.info("BALLOONS!")
     st.balloons()
\ No newline at end of file
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import re  # Import regex
-from getNISEPdata import getTimeseries
+from async_client import fetch_timeseries
 from datetime import datetime, timedelta
 
 st.set_page_config(layout="wide")
@@ -26,12 +26,12 @@ password = st.secrets.get("Login", {}).get("Password", "")
 
 end_time = datetime(*datetime.now().timetuple()[:3])  # Today's date from the start of the day
 
-# Fetch data for all intervals
-data_intervals = {
-    "Daily": getTimeseries(end_time, end_time - timedelta(days=1), None, None, auth_url, username, password, interval="hour", averaging=averaging),
-    "Weekly": getTimeseries(end_time, end_time - timedelta(days=7), None, None, auth_url, username, password, interval="hour", averaging=averaging),
-    "Monthly": getTimeseries(end_time, end_time - timedelta(days=30), None, None, auth_url, username, password, interval="hour", averaging=averaging),
-}
+# Fetch data for all intervals (the three requests run concurrently)
+data_intervals = fetch_timeseries({
+    "Daily": (end_time, end_time - timedelta(days=1)),
+    "Weekly": (end_time, end_time - timedelta(days=7)),
+    "Monthly": (end_time, end_time - timedelta(days=30)),
+}, auth_url, username, password, interval="hour", averaging=averaging)
 
 # --- Replace Zeros with NaN (None) ---
 for interval, data in data_intervals.items():
@@ -0,0 +1,116 @@
+#!python
+# -*- coding: utf-8 -*-
+"""asyncio front end to the Haystack API in ``getNISEPdata``.
+
+Every call goes through the same pooled ``HaystackClient`` and ``TokenManager``
+as the synchronous helpers, on a worker thread (``asyncio.to_thread``), so one
+event loop can overlap many logins, ref map reads and hisReads. A semaphore
+bounds how many requests are in flight; cancelling a task (or a failure inside
+``gather``) drops every request that has not started yet. A request already on
+the wire runs to completion in its thread and its result is discarded.
+"""
+import asyncio
+import logging
+import weakref
+
+from getNISEPdata import (getTimeseries, getRefLookup, get_token_manager, get_user_info, get_ref_map,
+                          _check_auth, _read_timeseries)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHaystackClient(object):
+    """Async access to one BMOS account.
+
+    Args:
+        auth_url (str): Login server URL.
+        username (str): Account name.
+        password (str): Account password.
+        client (HaystackClient): Pooled HTTP client; the shared one by default.
+        max_concurrency (int): Requests in flight at once, per event loop.
+        timeout (float): Seconds before a single call is cancelled (None waits forever).
+    """
+
+    def __init__(self, auth_url, username, password, client=None, max_concurrency=4, timeout=None):
+        self.auth_url = auth_url
+        self.username = username
+        self.password = password
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.tokens = get_token_manager(auth_url, username, password, client=client)
+        # asyncio primitives belong to one loop; keep one semaphore per running loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    async def _run(self, fn, *args, **kwargs):
+        async with self._semaphore():
+            return await asyncio.wait_for(asyncio.to_thread(fn, *args, **kwargs), self.timeout)
+
+    async def login(self):
+        """Return ``(bmos_server, auth_header)``, logging in only if the cached token is stale."""
+        return await self._run(self.tokens.session)
+
+    async def user_info(self):
+        _, header = await self.login()
+        response = await self._run(get_user_info, self.auth_url, header, client=self.client)
+        return response.json()
+
+    async def ref_map(self):
+        """Raw ref namespace map response (Zinc text)."""
+        return await self._run(self.tokens.call,
+                               lambda server, header: _check_auth(get_ref_map(server, header, client=self.client)))
+
+    async def ref_lookup(self, ttl=3600):
+        """The cached ``RefLookup`` (see ``getNISEPdata.getRefLookup``)."""
+        return await self._run(getRefLookup, self.auth_url, self.username, self.password, ttl=ttl, client=self.client)
+
+    async def his_read(self, refs, start_time, end_time, averaging="max", interval="minute"):
+        """One hisRead of ``refs``; columns are keyed by ref id (no '@')."""
+        return await self._run(self.tokens.call, lambda server, header: _read_timeseries(
+            server, header, averaging, interval, refs, start_time, end_time, client=self.client))
+
+    async def timeseries(self, end_time, start_time, site=None, variable=None, **kwargs):
+        """``getTimeseries`` for this account; ``kwargs`` are passed through (cache, interval, ...)."""
+        return await self._run(getTimeseries, end_time, start_time, site, variable,
+                               self.auth_url, self.username, self.password, client=self.client, **kwargs)
+
+    async def gather(self, *aws):
+        """Await all of ``aws`` concurrently; on the first failure cancel the rest and re-raise."""
+        tasks = [asyncio.ensure_future(aw) for aw in aws]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+def fetch_timeseries(requests, auth_url, username, password, max_concurrency=4, **kwargs):
+    """Run several ``getTimeseries`` calls concurrently from synchronous code.
+
+    Args:
+        requests (dict): name -> (end_time, start_time) or (end_time, start_time, overrides),
+            where ``overrides`` is a dict of extra ``getTimeseries`` arguments for that call.
+        kwargs: ``getTimeseries`` arguments shared by every call.
+
+    Returns:
+        dict: name -> DataFrame, in the order of ``requests``.
+    """
+    async def run():
+        client = AsyncHaystackClient(auth_url, username, password, client=kwargs.pop('client', None),
+                                     max_concurrency=max_concurrency)
+        calls = []
+        for request in requests.values():
+            end_time, start_time = request[:2]
+            overrides = dict(kwargs, **(request[2] if len(request) > 2 else {}))
+            calls.append(client.timeseries(end_time, start_time, **overrides))
+        return await client.gather(*calls)
+
+    return dict(zip(requests, asyncio.run(run())))
@@ -0,0 +1,158 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Benchmarks for the ingest and checks hot paths, with baseline regression tracking.
+
+Synthetic Zinc payloads and frames come from ``mock_server.SyntheticFleet`` and
+are scaled by sites x points x days. Each benchmark reports the best wall time
+of ``--repeat`` runs and the peak traced memory (``tracemalloc``) of one
+extra run. ``--save`` stores the results as the baseline; later runs compare
+against it and exit with status 1 when a benchmark got slower (or used more
+memory) by more than ``--threshold``.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --sites 20 100 --days 7 --save
+    python benchmarks/run_benchmarks.py --sites 20 100 --days 7
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zinc  # noqa: E402
+from checks_functions import (calculate_cop, cop_windows, process_temperature_and_delta_t_data,  # noqa: E402
+                             check_windows, DEFAULT_BOUNDS)
+from completeness import Completeness  # noqa: E402
+from getNISEPdata import RefLookup, giveRef, label_columns  # noqa: E402
+from mock_server import SyntheticFleet, POINT_CATALOGUE, point_id  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Ref map point id (not display name) of the first catalogue point, as giveRef expects
+FIRST_POINT = point_id(POINT_CATALOGUE[0][0])
+
+
+class Workload(object):
+    """Synthetic inputs for one sites x points x days scale, built once and shared by the benchmarks."""
+
+    def __init__(self, sites, points, days, gap_rate=0.02):
+        self.scale = "%dx%dx%d" % (sites, points, days)
+        self.fleet = SyntheticFleet(sites=sites, points=points, gap_rate=gap_rate)
+        frame = self.fleet.points.copy()
+        frame["siteNamespace"] = frame["siteNamespace"].str.split(".").str[-1]
+        frame["equipNamespace"] = frame["equipNamespace"].str.split(".").str[-1]
+        self.lookup = RefLookup(frame)
+        self.refs = list(self.lookup.by_ref)
+        self.end = pd.Timestamp.now(tz="Europe/London").floor("D")
+        self.start = self.end - timedelta(days=days)
+        self.days = days
+        self.payload = self.fleet.his_read(self.refs, self.start, self.end).splitlines()
+        raw = self.fleet.minutes(self.refs, self.start, self.end)
+        raw.columns = [ref.lstrip("@") for ref in raw.columns]
+        raw.attrs["display"] = dict(zip(raw.columns, self.fleet.points["dis"]))
+        self.by_ref = raw
+        self.labelled = label_columns(raw.copy(), self.lookup)
+        self.sites = self.lookup.sites
+
+
+BENCHMARKS = [
+    ("zinc.read_his_grid", lambda w: zinc.read_his_grid(w.payload, tz="Europe/London")),
+    ("getTimeseries column labels", lambda w: label_columns(w.by_ref.copy(deep=False), w.lookup)),
+    ("giveRef (RefLookup)", lambda w: giveRef(w.lookup, w.sites[: len(w.sites) // 2], [FIRST_POINT])),
+    ("giveRef (DataFrame)", lambda w: giveRef(w.lookup.frame, w.sites[: len(w.sites) // 2], [FIRST_POINT])),
+    ("process_temperature_and_delta_t_data",
+     lambda w: process_temperature_and_delta_t_data(w.labelled, min(w.days, 2), DEFAULT_BOUNDS, w.sites)),
+    ("calculate_cop", lambda w: calculate_cop(w.labelled)),
+    # get_sliced_data was replaced by one multi-window pass
+    ("cop_windows (sliced windows)", lambda w: cop_windows(w.labelled, check_windows(w.end))),
+    ("completeness", lambda w: Completeness(w.labelled).missing_percentage(check_windows(w.end))),
+]
+
+
+def measure(fn, workload, repeat):
+    """Return (best seconds, peak traced MB) of ``fn(workload)``."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn(workload)
+        times.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    fn(workload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak / 1024 ** 2
+
+
+def compare(results, baseline, threshold):
+    """Names of the results more than ``threshold`` (fraction) slower or larger than the baseline."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_mb"):
+            # Ignore noise on tiny values
+            floor = 0.005 if metric == "seconds" else 1.0
+            if result[metric] > max(base[metric], floor) * (1 + threshold):
+                regressions.append("%s %s: %.4g -> %.4g" % (key, metric, base[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NISEP ingest and checks hot paths.")
+    parser.add_argument("--sites", type=int, nargs="+", default=[20, 100])
+    parser.add_argument("--points", type=int, nargs="+", default=[len(POINT_CATALOGUE)])
+    parser.add_argument("--days", type=int, nargs="+", default=[7])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default=None, help="run only benchmarks whose name contains this")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    args = parser.parse_args()
+
+    results = {}
+    for sites in args.sites:
+        for points in args.points:
+            for days in args.days:
+                workload = Workload(sites, points, days)
+                for name, fn in BENCHMARKS:
+                    if args.only and args.only not in name:
+                        continue
+                    seconds, peak_mb = measure(fn, workload, args.repeat)
+                    key = "%s[%s]" % (name, workload.scale)
+                    results[key] = {"seconds": seconds, "peak_mb": peak_mb}
+                    print("%-60s %10.4f s %10.1f MB" % (key, seconds, peak_mb))
+                del workload
+
+    if args.save:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print("Baseline saved to %s" % args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline at %s (run with --save first)" % args.baseline)
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.threshold)
+    for line in regressions:
+        print("REGRESSION " + line)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,145 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import pytz
+from column_model import column_keys, site_of
+from completeness import Completeness
+from instrumentation import timed
+from periods import period_starts
+
+# Ordered (substring, bounds key) rules: the first substring found in a variable
+# name picks its bounds, anything unmatched uses DEFAULT_BOUNDS_KEY.
+BOUNDS_RULES = [
+    ("Flow", "Flow/Return"),
+    ("Return", "Flow/Return"),
+    ("Outdoor", "Outdoor"),
+    ("Delta T", "Delta T"),
+]
+DEFAULT_BOUNDS_KEY = "Indoor"
+# Bounds the Checks page starts with (and run_checks.py uses unless told otherwise)
+DEFAULT_BOUNDS = {
+    "Flow/Return": {"min": 10, "max": 70},
+    "Outdoor": {"min": -10, "max": 30},
+    "Indoor": {"min": 15, "max": 26},
+    "Delta T": {"min": -10, "max": 10},
+}
+# Trailing windows of the missing data and COP tables
+CHECK_WINDOWS = {"Daily": timedelta(days=1), "Weekly": timedelta(days=7), "Monthly": timedelta(days=30)}
+
+
+def _london_index(df):
+    """Return the frame's index as a Europe/London DatetimeIndex without copying the frame."""
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is None:
+        index = index.tz_localize("UTC")  # Assume UTC if no timezone
+    return index.tz_convert("Europe/London")
+
+
+def _window_positions(index, start_time, end_time):
+    """Row positions of ``index`` within ``[start_time, end_time]``."""
+    if index.is_monotonic_increasing:
+        return np.arange(index.searchsorted(start_time, "left"), index.searchsorted(end_time, "right"))
+    return np.flatnonzero((index >= start_time) & (index <= end_time))
+
+
+def bounds_vectors(variables, bounds, rules=BOUNDS_RULES, default=DEFAULT_BOUNDS_KEY):
+    """Per-column min and max arrays for a list of variable names.
+
+    Args:
+        variables (list): Variable name of each column.
+        bounds (dict): Bounds keyed like the rules, each with "min" and "max".
+        rules (list): Ordered (substring, bounds key) pairs.
+        default (str): Bounds key used when no rule matches.
+
+    Returns:
+        tuple: (min_values, max_values) float arrays aligned with ``variables``.
+    """
+    keys = []
+    for variable in variables:
+        keys.append(next((key for substring, key in rules if substring in variable), default))
+    min_values = np.array([bounds[key]["min"] for key in keys], dtype=float)
+    max_values = np.array([bounds[key]["max"] for key in keys], dtype=float)
+    return min_values, max_values
+
+
+@timed("checks.check_bounds")
+def check_bounds(df, start_time, end_time, bounds, site_names, subsample_freq='10min'):
+    """Evaluate the temperature/Delta T bounds of every column in one vectorized pass.
+
+    Args:
+        df (pd.DataFrame): DataFrame with datetime as index and sites/sensors as columns.
+        start_time, end_time (datetime): Window to check (tz-aware, Europe/London).
+        bounds (dict): Dictionary with temperature and Delta T bounds (min/max values for filtering).
+        site_names (list): List of site names to ensure data is returned for each.
+        subsample_freq (str): Frequency for resampling the in-bounds data.
+
+    Returns:
+        dict: Site name -> {"out_of_bounds", "within_bounds", "mask"}; "mask" is the boolean
+            violation frame of the site's violating columns.
+    """
+    result = {site_name: {"out_of_bounds": pd.DataFrame(), "within_bounds": pd.DataFrame(), "mask": pd.DataFrame()}
+              for site_name in site_names}
+
+    keys = column_keys(df)
+    positions = bounds_positions(keys, result)
+    if not positions:
+        return result
+
+    index = _london_index(df)
+    rows = _window_positions(index, start_time, end_time)
+    values = df.iloc[rows, positions].to_numpy(dtype=float)
+    min_values, max_values = bounds_vectors([keys[pos][0] for pos in positions], bounds)
+
+    # One broadcast over the whole (rows x columns) block
+    mask = (values < min_values) | (values > max_values)
+    violating = np.flatnonzero(mask.any(axis=0))
+    if violating.size == 0:
+        return result
+
+    violating_positions = [positions[j] for j in violating]
+    return split_violations(result, index[rows], values[:, violating], mask[:, violating], df.columns[violating_positions],
+                            [keys[pos][1] for pos in violating_positions], subsample_freq)
+
+
+def bounds_positions(keys, sites=None):
+    """Column positions checked against the bounds: temperatures first, then Delta T.
+
+    Args:
+        keys (list): (variable, site) of every column, see ``column_keys``.
+        sites: Only columns of these sites (any container), or every site when None.
+    """
+    temperature = [pos for pos, (variable, site) in enumerate(keys)
+                   if 'Temperature' in variable and variable != "Temperature" and (sites is None or site in sites)]
+    delta_t = [pos for pos, (variable, site) in enumerate(keys)
+               if 'Delta T' in variable and 'Temperature' not in variable and (sites is None or site in sites)]
+    return temperature + delta_t
+
+
+def split_violations(result, window_index, values, mask, columns, sites, subsample_freq='10min'):
+    """Fill the per-site "out_of_bounds", "within_bounds" and "mask" frames of ``result``.
+
+    Args:
+        result (dict): Site name -> result dict, see ``check_bounds``.
+        window_index (pd.DatetimeIndex): Rows of the checked window.
+        values, mask (np.ndarray): (rows x columns) values and violations of the violating columns only.
+        columns (pd.Index): Labels of those columns.
+        sites (list): Site of each of those columns.
+        subsample_freq (str): Frequency for resampling the in-bounds data.
+    """
+    out_of_bounds = pd.DataFrame(np.where(mask, values, np.nan), index=window_index, columns=columns)
+    within_bounds = pd.DataFrame(values, index=window_index, columns=columns).resample(subsample_freq).first()
+    masks = pd.DataFrame(mask, index=window_index, columns=columns)
+
+    sites = np.array(sites, dtype=object)
+    for site_name in dict.fromkeys(sites):
+        site_columns = np.flatnonzero(sites == site_name)
+        site_mask = mask[:, site_columns].any(axis=1)
+        result[site_name]["out_of_bounds"] = out_of_bounds.iloc[site_mask, site_columns]
+        result[site_name]["within_bounds"] = within_bounds.iloc[:, site_columns]
+        result[site_name]["mask"] = masks.iloc[:, site_columns]
+
+    return result
+
 
 def process_temperature_and_delta_t_data(df, past_days, bounds, site_names, subsample_freq='10min'):
     """
@@ -18,86 +157,499 @@ def process_temperature_and_delta_t_data(df, past_days, bounds, site_names, subs
             - 'out_of_bounds': DataFrame containing out-of-bounds values for plotting in red.
             - 'within_bounds': DataFrame with out-of-bounds values replaced by None, subsampled every 30 minutes.
     """
+    start_time, end_time = bounds_window(past_days)
+    return check_bounds(df, start_time, end_time, bounds, site_names, subsample_freq)
+
+
+def bounds_window(past_days):
+    """The ``past_days`` up to today's midnight (Europe/London), as (start, end)."""
     # Ensure datetime index is in UK timezone
     uk_tz = pytz.timezone("Europe/London")
     end_time = datetime.now(uk_tz).replace(hour=0, minute=0, second=0, microsecond=0)
-    start_time = end_time - timedelta(days=past_days)
+    return end_time - timedelta(days=past_days), end_time
 
-    # Convert df datetime index to timezone-aware format
-    df = df.copy()
-    df.index = pd.to_datetime(df.index)  # Ensure index is datetime
-    if df.index.tz is None:
-        df.index = df.index.tz_localize("UTC")  # Assume UTC if no timezone
-    df.index = df.index.tz_convert("Europe/London")  # Convert to UK time
 
-    # Filter based on UK time range
-    df_filtered = df.loc[start_time:end_time]
-    
-    temperature_columns = df_filtered.filter(like='Temperature').columns
-    delta_t_columns = df_filtered.filter(like='Delta T').columns
-    all_columns = list(temperature_columns) + list(delta_t_columns)
-    
-    result = {site_name: {"out_of_bounds": pd.DataFrame(), "within_bounds": pd.DataFrame()} for site_name in site_names}
-
-    for column in all_columns:
-        variable_type = column.split(" (")[0].strip()
-        site_name = column.split(" (")[-1].strip(")") if "(" in column else "Unknown"
-        if site_name not in result:
-            continue  # Skip if the site is not in the provided list of site_names
-        if variable_type=="Temperature":
-            continue
-        # Find appropriate bounds
-        if "Flow" in variable_type or "Return" in variable_type:
-            min_val, max_val = bounds["Flow/Return"]["min"], bounds["Flow/Return"]["max"]
-        elif "Outdoor" in variable_type:
-            min_val, max_val = bounds["Outdoor"]["min"], bounds["Outdoor"]["max"]
-        elif "Delta T" in variable_type:
-            min_val, max_val = bounds["Delta T"]["min"], bounds["Delta T"]["max"]
-        else:
-            min_val, max_val = bounds["Indoor"]["min"], bounds["Indoor"]["max"]
-
-        # Filter out-of-range values
-        mask = (df_filtered[column] < min_val) | (df_filtered[column] > max_val)
-        
-        if mask.any():
-            # Create DataFrame for out-of-bounds data and add it as a new column
-            out_of_bounds_df = df_filtered[mask][[column]]
-            result[site_name]["out_of_bounds"] = pd.concat([result[site_name]["out_of_bounds"], out_of_bounds_df], axis=1)
-
-            # Subsample in-bounds data every 30 minutes
-            within_bounds_df_resampled = df_filtered[column].resample(subsample_freq).first()
-            result[site_name]["within_bounds"] = pd.concat([result[site_name]["within_bounds"], within_bounds_df_resampled.to_frame()], axis=1)
 
-    return result
+# Sensor fault detectors with their default parameters (see check_faults)
+FAULT_DETECTORS = {
+    "Flatline": {"min_duration": "2h"},
+    "Spike": {"window": 11, "threshold": 5.0, "min_delta": 1.0},
+    "Stuck value": {"window": 60, "min_std": 0.02},
+    "Step change": {"window": 30, "threshold": 3.0},
+}
+# Scales the median absolute deviation to a standard deviation for normal noise
+MAD_TO_STD = 1.4826
+
+
+def run_lengths(values):
+    """Run-length encode every column of a (rows x columns) array at once.
+
+    A run is a stretch of equal consecutive values in one column; NaN never
+    joins a run. Runs are numbered column by column (column-major order).
+
+    Returns:
+        tuple: (run_id, first, last, column): the (rows x columns) run number of every
+            sample, then the first row, last row and column of every run.
+    """
+    n, m = values.shape
+    new_run = np.ones((n, m), dtype=bool)
+    new_run[1:] = values[1:] != values[:-1]  # NaN != NaN, so every NaN is its own run
+    flat = new_run.ravel(order="F")
+    run_id = np.cumsum(flat) - 1
+    starts = np.flatnonzero(flat)
+    ends = np.append(starts[1:], n * m) - 1
+    return run_id.reshape((n, m), order="F"), starts % n, ends % n, starts // n
+
+
+def rolling_median(values, window, chunk=2048):
+    """Centered rolling median of every column, ignoring NaN (NaN where a window holds no value).
+
+    The windows of ``chunk`` rows at a time are sorted as strided views (in float32), so
+    the cost is O(rows x window) without copying the whole (rows x columns x window) block.
+    """
+    half = window // 2
+    padded = np.pad(values.astype(np.float32), ((half, window - 1 - half), (0, 0)), constant_values=np.nan)
+    medians = np.empty(values.shape, dtype=float)
+    for start in range(0, len(values), chunk):
+        windows = np.sort(np.lib.stride_tricks.sliding_window_view(
+            padded[start:start + chunk + window - 1], window, axis=0), axis=-1)
+        # NaN sorts last: the median is taken over the first n values
+        n = window - np.isnan(windows).sum(axis=-1)
+        low = np.take_along_axis(windows, np.maximum((n - 1) // 2, 0)[..., None], axis=-1)[..., 0]
+        high = np.take_along_axis(windows, (n // 2)[..., None], axis=-1)[..., 0]
+        medians[start:start + chunk] = np.where(n > 0, (low + high) / 2, np.nan)
+    return medians
+
+
+def flatline_mask(values, index, min_duration="2h"):
+    """Samples in runs of exactly repeated values lasting at least ``min_duration`` (frozen sensors)."""
+    run_id, first, last, _ = run_lengths(values)
+    times = pd.DatetimeIndex(index).as_unit("ns").asi8
+    long_runs = times[last] - times[first] >= pd.Timedelta(min_duration).value
+    return long_runs[run_id] & ~np.isnan(values)
+
+
+def spike_mask(values, index, window=11, threshold=5.0, min_delta=1.0):
+    """Hampel filter: samples more than ``threshold`` robust standard deviations from the rolling median.
+
+    ``min_delta`` (in the unit of the data) keeps flat, noise-free stretches (MAD of 0)
+    from flagging every small step.
+    """
+    deviation = np.abs(values - rolling_median(values, window))
+    mad = MAD_TO_STD * rolling_median(deviation, window)
+    return (deviation > threshold * mad) & (deviation > min_delta)
+
+
+def stuck_mask(values, index, window=60, min_std=0.02):
+    """Samples inside a full ``window`` of rows whose standard deviation is below ``min_std``.
+
+    The rolling variance comes from prefix sums of the (column-centered) values, so the
+    cost is O(rows) per column whatever the window.
+    """
+    n = len(values)
+    if n < window:
+        return np.zeros(values.shape, dtype=bool)
+    valid = ~np.isnan(values)
+    centered = np.where(valid, values - np.nanmean(np.where(valid, values, np.nan), axis=0), 0)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.vstack([zeros, np.cumsum(centered, axis=0)])
+    squares = np.vstack([zeros, np.cumsum(centered ** 2, axis=0)])
+    counts = np.vstack([zeros, np.cumsum(valid, axis=0)])
+    # Windows ending at rows window-1 .. n-1
+    full = counts[window:] - counts[:-window] == window
+    mean = (sums[window:] - sums[:-window]) / window
+    variance = (squares[window:] - squares[:-window]) / window - mean ** 2
+    low = full & (variance < min_std ** 2)
+    # A sample is flagged when any low-variance window covers it
+    covering = np.vstack([zeros, np.cumsum(low, axis=0)])
+    ends = np.minimum(np.arange(n) + 1, len(low))
+    starts = np.maximum(np.arange(n) - window + 1, 0)
+    return (covering[ends] - covering[np.minimum(starts, len(low))]) > 0
+
+
+def _shifted(values, rows):
+    """``values`` moved down by ``rows`` (up when negative), NaN where nothing moved in."""
+    shifted = np.full(values.shape, np.nan)
+    if rows >= 0:
+        shifted[rows:] = values[:len(values) - rows]
+    else:
+        shifted[:rows] = values[-rows:]
+    return shifted
+
+
+def step_mask(values, index, window=30, threshold=3.0):
+    """First sample of a level shift: the medians of the ``window`` rows before and from it differ by ``threshold``.
+
+    Only the sample where the data crosses from the old level to the new one is flagged
+    (closer to the median after than before, with the previous sample the other way round),
+    so one shift is one flag however long the plateau of large differences is.
+    """
+    if len(values) < 2 * window:
+        return np.zeros(values.shape, dtype=bool)
+    half = window // 2
+    medians = rolling_median(values, window)
+    # Centered windows moved to cover rows [i - window, i) and [i, i + window)
+    before = _shifted(medians, window - half)
+    after = _shifted(medians, -half)
+    with np.errstate(invalid="ignore"):
+        after_side = np.abs(values - after) < np.abs(values - before)
+        crossed = after_side & (_shifted(np.where(after_side, 1.0, 0.0), 1) == 0)
+        return crossed & (np.abs(after - before) > threshold)
+
+
+FAULT_FUNCTIONS = {"Flatline": flatline_mask, "Spike": spike_mask, "Stuck value": stuck_mask,
+                   "Step change": step_mask}
+
+
+@timed("checks.check_faults")
+def check_faults(df, start_time, end_time, site_names, detector, subsample_freq='10min', **params):
+    """Run one sensor fault detector over the bounds-checked columns (temperatures, Delta T).
+
+    Args:
+        df (pd.DataFrame): DataFrame with datetime as index and sites/sensors as columns.
+        start_time, end_time (datetime): Window to check (tz-aware, Europe/London).
+        site_names (list): List of site names to ensure data is returned for each.
+        detector (str): Key of ``FAULT_DETECTORS``.
+        subsample_freq (str): Frequency for resampling the unflagged data.
+        **params: Detector parameters overriding the ``FAULT_DETECTORS`` defaults.
+
+    Returns:
+        dict: Same structure as ``check_bounds``, the flagged samples as "out_of_bounds".
+    """
+    result = {site_name: {"out_of_bounds": pd.DataFrame(), "within_bounds": pd.DataFrame(), "mask": pd.DataFrame()}
+              for site_name in site_names}
+
+    keys = column_keys(df)
+    positions = bounds_positions(keys, result)
+    if not positions:
+        return result
+
+    index = _london_index(df)
+    rows = _window_positions(index, start_time, end_time)
+    if not index.is_monotonic_increasing:
+        rows = rows[np.argsort(index[rows], kind="stable")]
+    values = df.iloc[rows, positions].to_numpy(dtype=float)
+    # Zeros are dropouts, left to the missing data check
+    mask = FAULT_FUNCTIONS[detector](np.where(values == 0, np.nan, values), index[rows],
+                                     **dict(FAULT_DETECTORS[detector], **params))
+    violating = np.flatnonzero(mask.any(axis=0))
+    if violating.size == 0:
+        return result
+
+    violating_positions = [positions[j] for j in violating]
+    return split_violations(result, index[rows], values[:, violating], mask[:, violating], df.columns[violating_positions],
+                            [keys[pos][1] for pos in violating_positions], subsample_freq)
+
+
+def process_sensor_fault_data(df, past_days, site_names, detector, subsample_freq='10min', **params):
+    """``check_faults`` over the same window as ``process_temperature_and_delta_t_data``."""
+    start_time, end_time = bounds_window(past_days)
+    return check_faults(df, start_time, end_time, site_names, detector, subsample_freq, **params)
+
+HEAT_METER = 'Output Heat Energy'
+CONSUMPTION_METER = 'ASHP Consumption Energy'
+# A drop of more than this fraction of the previous reading is a meter reset (or a rollover)
+RESET_FRACTION = 0.5
+
+
+def meter_pairs(data):
+    """Return (site, heat column, consumption column) for every site with both energy meters."""
+    keys = column_keys(data)
+    columns_by_key = {}
+    for column, key in zip(data.columns, keys):
+        columns_by_key.setdefault(key, column)
+
+    pairs = []
+    for column, (variable, site_id) in zip(data.columns, keys):
+        if HEAT_METER in variable:
+            consumption_column = columns_by_key.get((variable.replace(HEAT_METER, CONSUMPTION_METER), site_id))
+            if consumption_column is not None and site_id not in [pair[0] for pair in pairs]:
+                pairs.append((site_id, column, consumption_column))
+    return pairs
+
+
+def corrected_counters(values, rollover=None, reset_fraction=RESET_FRACTION):
+    """Turn cumulative meter readings into counters, removing resets and rollovers.
+
+    Each valid reading is compared with the previous valid one. A drop of more than
+    ``reset_fraction`` of the previous reading is a rollover when ``rollover`` (the meter's
+    wrap value) is given, and is added back; otherwise it is treated as a meter reset and
+    contributes nothing. Smaller drops are meter jitter: they are kept, so they cancel
+    against the next increase and the difference of two counters is last minus first.
+
+    Args:
+        values (np.ndarray): (rows x meters) readings, NaN where missing.
+        rollover (float): Value at which the meters wrap to zero, if known.
+        reset_fraction (float): Smallest drop, as a fraction of the previous reading, taken as a reset.
+
+    Returns:
+        np.ndarray: Counters with the same NaNs, whose differences are the consumed energy.
+    """
+    valid = ~np.isnan(values)
+    previous = pd.DataFrame(values).ffill().shift(1).to_numpy()
+    steps = values - previous
+    steps[np.isnan(steps)] = 0
+    reset = steps < -reset_fraction * np.abs(np.nan_to_num(previous))
+    if rollover is not None:
+        steps = np.where(reset, steps + rollover, steps)
+    else:
+        steps = np.where(reset, 0, steps)
+    counters = np.cumsum(steps, axis=0)
+    counters[~valid] = np.nan
+    return counters
+
+
+def window_deltas(counters, index, starts, ends, closed_end=True):
+    """Last-valid minus first-valid counter value inside each [start, end] window.
+
+    With ``closed_end=False`` the windows are [start, end) instead.
+
+    All windows and meters are handled at once through prefix arrays of the last and
+    next valid row, so the cost is one pass over the data plus O(1) per window.
+
+    Returns:
+        np.ndarray: (windows x meters) deltas, NaN where a window holds fewer than two readings.
+    """
+    n = len(index)
+    valid = ~np.isnan(counters)
+    rows = np.arange(n)[:, None]
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, rows, n)[::-1], axis=0)[::-1]
+    counts = np.vstack([np.zeros((1, counters.shape[1]), dtype=int), np.cumsum(valid, axis=0)])
+
+    a = index.searchsorted(starts, "left")
+    b = index.searchsorted(ends, "right" if closed_end else "left")
+    enough = (counts[b] - counts[a]) >= 2
+    padded = np.vstack([counters, np.full((1, counters.shape[1]), np.nan)])
+    first = np.take_along_axis(padded, np.vstack([next_valid, np.full((1, counters.shape[1]), n)])[a], axis=0)
+    last = np.take_along_axis(padded, np.where(b[:, None] > 0, last_valid[np.maximum(b - 1, 0)], n), axis=0)
+    return np.where(enough, last - first, np.nan)
+
+
+def _meter_counters(data, rollover=None):
+    pairs = meter_pairs(data)
+    sites = [site for site, _, _ in pairs]
+    index = _london_index(data)
+    order = np.argsort(index, kind="stable") if not index.is_monotonic_increasing else None
+    columns = [heat for _, heat, _ in pairs] + [consumption for _, _, consumption in pairs]
+    values = data[columns].to_numpy(dtype=float) if columns else np.empty((len(index), 0))
+    if order is not None:
+        index, values = index[order], values[order]
+    return sites, index, corrected_counters(values, rollover)
+
+
+def _cop(heat, consumption):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(consumption != 0, heat / consumption, np.nan)
+
+
+@timed("checks.cop_windows")
+def cop_windows(data, windows, rollover=None):
+    """Heat delta, consumption delta and COP for every site and window in one pass.
+
+    Args:
+        data (pd.DataFrame): Frame with the cumulative heat and consumption energy meters.
+        windows (dict): Window name -> (start, end) timestamps.
+        rollover (float): Meter wrap value, see ``corrected_counters``.
+
+    Returns:
+        tuple: (cop, heat_diff, consumption_diff) DataFrames, sites x window names.
+    """
+    sites, index, counters = _meter_counters(data, rollover)
+    names = list(windows)
+    starts = pd.DatetimeIndex([pd.Timestamp(windows[name][0]) for name in names])
+    ends = pd.DatetimeIndex([pd.Timestamp(windows[name][1]) for name in names])
+    if starts.tz is None:
+        starts, ends = starts.tz_localize("Europe/London"), ends.tz_localize("Europe/London")
+    deltas = window_deltas(counters, index, starts, ends)
+
+    heat, consumption = deltas[:, :len(sites)].T, deltas[:, len(sites):].T
+    heat_diff = pd.DataFrame(heat, index=sites, columns=names)
+    consumption_diff = pd.DataFrame(consumption, index=sites, columns=names)
+    cop = pd.DataFrame(_cop(heat, consumption), index=sites, columns=names)
+    return cop, heat_diff, consumption_diff
+
+
+@timed("checks.daily_cop")
+def daily_cop(data, freq='D', rollover=None):
+    """COP time series per site, one value per ``freq`` period (first/last valid reading per period).
+
+    ``freq`` must be a fixed frequency ('D', 'h', '15min', ...).
+
+    Returns:
+        tuple: (cop, heat_diff, consumption_diff) DataFrames, periods x sites.
+    """
+    sites, index, counters = _meter_counters(data, rollover)
+    if len(index) == 0:
+        empty = pd.DataFrame(columns=sites, dtype=float)
+        return empty, empty.copy(), empty.copy()
+    starts = period_starts(index[0], index[-1], freq)
+    ends = starts + pd.tseries.frequencies.to_offset(freq)
+    deltas = window_deltas(counters, index, starts, ends, closed_end=False)
+
+    heat, consumption = deltas[:, :len(sites)], deltas[:, len(sites):]
+    heat_diff = pd.DataFrame(heat, index=starts, columns=sites)
+    consumption_diff = pd.DataFrame(consumption, index=starts, columns=sites)
+    cop = pd.DataFrame(_cop(heat, consumption), index=starts, columns=sites)
+    return cop, heat_diff, consumption_diff
+
+
+@timed("checks.calculate_cop")
+def calculate_cop(data, rollover=None):
+    """COP, heat and consumption deltas per site over the whole of ``data``.
+
+    Sites with fewer than two readings on either meter are left out, as is the
+    COP of sites with no consumption.
+    """
+    index = _london_index(data)
+    if len(index) == 0:
+        return pd.DataFrame(columns=['COP']), pd.DataFrame(columns=['Heat Diff']), pd.DataFrame(columns=['Consumption Diff'])
+    cop, heat_diff, consumption_diff = cop_windows(data, {'all': (index.min(), index.max())}, rollover)
+    keep = heat_diff['all'].notna() & consumption_diff['all'].notna()
+    return (cop.loc[keep].rename(columns={'all': 'COP'}),
+            heat_diff.loc[keep].rename(columns={'all': 'Heat Diff'}),
+            consumption_diff.loc[keep].rename(columns={'all': 'Consumption Diff'}))
+
+
+def check_windows(end_time, windows=CHECK_WINDOWS):
+    """Named (start, end) windows ending at ``end_time``, e.g. {"Daily": (end - 1 day, end), ...}."""
+    return {name: (end_time - length, end_time) for name, length in windows.items()}
+
+
+def missing_data_by_site(completeness, windows, threshold=1):
+    """Missing data percentages per site, as shown on the Checks page.
+
+    Args:
+        completeness (Completeness): Completeness index of the data (or an OnlineChecks).
+        windows (dict): Window name -> (start, end), see ``check_windows``.
+        threshold (float): Columns missing at most this percentage in every window are left out.
+
+    Returns:
+        dict: Site name (NISEPxx) -> DataFrame of columns x windows, rounded to 0.1 %.
+    """
+    missing = completeness.missing_percentage(windows).fillna(0)
+    site_groups = {}
+    for row_name, site_id in site_of(missing.T).items():
+        if site_id is not None and site_id.startswith("NISEP"):
+            site_groups.setdefault(site_id, []).append(row_name)
+    return {
+        site_id: missing.loc[rows].loc[~missing.loc[rows].le(threshold).all(axis=1)].round(1)
+        for site_id, rows in site_groups.items()
+    }
+
+
+def cop_summary(data, windows, rollover=None):
+    """COP, heat and consumption deltas (sites x windows) without the sites that have no data at all."""
+    return tuple(df.dropna(how="all") for df in cop_windows(data, windows, rollover))
+
+
+# Signals that tell whether the compressor runs, in order of preference per site:
+# (variable, "level" or "rate" of a cumulative meter, threshold in the signal's unit or per hour)
+CYCLING_SIGNALS = [
+    ("ASHP Power", "level", 0.2),  # kW
+    (CONSUMPTION_METER, "rate", 0.2),  # kWh per hour
+    ("Delta T", "level", 1.5),  # °C between flow and return
+]
+# Trailing window of the "rate" signals: several resolution steps of a quantized meter
+# (0.1 kWh at 1.5 kW is one step every 4 minutes), so steady running reads as steady
+RATE_WINDOW = "15min"
+
+
+def compressor_states(data, signals=CYCLING_SIGNALS, rate_window=RATE_WINDOW):
+    """On (1) / off (0) state of every site's compressor, NaN where its signal is missing.
+
+    Each site uses the first of ``signals`` it has; sites with none are left out.
+    "rate" signals are the meter increase over the trailing ``rate_window`` per hour,
+    which delays the detected starts and stops by up to that window.
+
+    Returns:
+        tuple: (sites, index, states) with ``states`` a (rows x sites) float array.
+    """
+    keys = column_keys(data)
+    index = _london_index(data)
+    order = np.argsort(index, kind="stable") if not index.is_monotonic_increasing else None
+    if order is not None:
+        index = index[order]
+    times = index.as_unit("ns").asi8
+    hours = times / 3.6e12
+    # First row inside the trailing rate window of every row; rows with no full window before them are unknown
+    window = pd.Timedelta(rate_window).value
+    back = np.searchsorted(times, times - window, "left")
+    partial = times - times[0] < window if len(times) else np.zeros(0, dtype=bool)
+
+    sites, states = [], []
+    for site in dict.fromkeys(site for _, site in keys if site is not None):
+        for variable, kind, threshold in signals:
+            position = next((pos for pos, key in enumerate(keys) if key == (variable, site)), None)
+            if position is None:
+                continue
+            values = data.iloc[:, position].to_numpy(dtype=float)
+            if order is not None:
+                values = values[order]
+            if kind == "rate":
+                # Meter increase over the window per hour; missing readings and resets are unknown
+                missing = np.isnan(values)
+                filled = pd.Series(values).ffill().to_numpy()
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    values = (filled - filled[back]) / (hours - hours[back])
+                values[missing | partial | (values < 0) | (back == np.arange(len(back)))] = np.nan
+            sites.append(site)
+            states.append(np.where(np.isnan(values), np.nan, values > threshold))
+            break
+    states = np.column_stack(states) if states else np.empty((len(index), 0))
+    return sites, index, states
+
+
+@timed("checks.cycling_analysis")
+def cycling_analysis(data, freq='D', signals=CYCLING_SIGNALS):
+    """Compressor cycling per site and ``freq`` period, from run-length encoded on/off states.
+
+    A start is an off -> on transition. Run and off lengths only count complete
+    periods (bounded by the opposite state on both sides, not by missing data),
+    attributed to the period they start in. Lengths are in minutes.
+
+    Returns:
+        tuple: (starts_per_hour, mean_run_length, min_off_time) DataFrames, periods x sites.
+            Starts per hour are over the hours with a known state.
+    """
+    sites, index, states = compressor_states(data, signals)
+    if len(index) == 0 or not sites:
+        empty = pd.DataFrame(columns=sites, dtype=float)
+        return empty, empty.copy(), empty.copy()
+
+    times = index.as_unit("ns").asi8
+    # Each sample stands for the time up to the next one; the last for the typical step
+    step = np.diff(times)
+    step = np.append(step, np.median(step) if len(step) else pd.Timedelta("1min").value)
+    periods = period_starts(index[0], index[-1], freq)
+    n_periods, n_sites = len(periods), len(sites)
+    sample_period = periods.searchsorted(index, "right") - 1
+
+    run_id, first, last, column = run_lengths(states)
+    state = states[first, column]
+    before = np.where(first > 0, states[np.maximum(first - 1, 0), column], np.nan)
+    after = np.where(last < len(times) - 1, states[np.minimum(last + 1, len(times) - 1), column], np.nan)
+    minutes = (times[last] - times[first] + step[last]) / 6e10
+    cell = sample_period[first] * n_sites + column
 
+    starts = np.bincount(cell[(state == 1) & (before == 0)], minlength=n_periods * n_sites)
+    runs = (state == 1) & (before == 0) & (after == 0)
+    run_count = np.bincount(cell[runs], minlength=n_periods * n_sites)
+    run_minutes = np.bincount(cell[runs], weights=minutes[runs], minlength=n_periods * n_sites)
+    offs = (state == 0) & (before == 1) & (after == 1)
+    min_off = np.full(n_periods * n_sites, np.inf)
+    np.minimum.at(min_off, cell[offs], minutes[offs])
 
+    # Hours with a known state per period and site
+    known = ~np.isnan(states)
+    known_hours = np.zeros((n_periods, n_sites))
+    np.add.at(known_hours, sample_period, np.where(known, step[:, None] / 3.6e12, 0))
 
-def calculate_cop(data):
-    cop = pd.DataFrame()
-    heat_diff = pd.DataFrame()
-    consumption_diff = pd.DataFrame()
-
-    for column in data.columns:
-        if 'Output Heat Energy' in column:
-            consumption_column = column.replace('Output Heat Energy', 'ASHP Consumption Energy')
-            if consumption_column in data.columns:
-                site_id = column.split('(')[-1].strip(')')  # Extract site ID
-                
-                # Get first and last non-null values for both columns
-                heat_series = data[column].dropna().sort_index()
-                consumption_series = data[consumption_column].dropna().sort_index()
-
-                if len(heat_series) < 2 or len(consumption_series) < 2:
-                    continue  # Skip sites with insufficient data
-                
-                # Compute differences
-                heat_diff.loc[site_id, 'Heat Diff'] = heat_series.iloc[-1] - heat_series.iloc[0]
-                consumption_diff.loc[site_id, 'Consumption Diff'] = consumption_series.iloc[-1] - consumption_series.iloc[0]
-
-                # Calculate COP, avoid division by zero
-                if consumption_diff.loc[site_id, 'Consumption Diff'] != 0:
-                    cop.loc[site_id, 'COP'] = heat_diff.loc[site_id, 'Heat Diff'] / consumption_diff.loc[site_id, 'Consumption Diff']
-                else:
-                    cop.loc[site_id, 'COP'] = None  # Avoid division by zero
-
-    return cop, heat_diff, consumption_diff
\ No newline at end of file
+    shape = (n_periods, n_sites)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        starts_per_hour = np.where(known_hours > 0, starts.reshape(shape) / known_hours, np.nan)
+        mean_run_length = np.where(run_count > 0, run_minutes / run_count, np.nan).reshape(shape)
+    min_off_time = np.where(np.isinf(min_off), np.nan, min_off).reshape(shape)
+    return (pd.DataFrame(starts_per_hour, index=periods, columns=sites),
+            pd.DataFrame(mean_run_length, index=periods, columns=sites),
+            pd.DataFrame(min_off_time, index=periods, columns=sites))
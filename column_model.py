@@ -0,0 +1,111 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Column model for getTimeseries frames.
+
+Frames come either with flat labels ("Flow Temperature (NISEP03)", duplicates
+suffixed "_1", "_2", ...) or with a (variable, site, equip, ref) MultiIndex.
+The helpers here work on both, so pages and checks select columns through an
+index lookup instead of re-parsing label strings on every rerun.
+"""
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+COLUMN_LEVELS = ("variable", "site", "equip", "ref")
+
+_LABEL = re.compile(r"^(.*) \(([^()]*)\)(?:_\d+)?$")
+
+
+def parse_label(label):
+    """Split a flat "Variable (SITE)" label into (variable, site); site is None if absent."""
+    match = _LABEL.match(str(label))
+    if match is None:
+        return str(label).strip(), None
+    return match.group(1).strip(), match.group(2)
+
+
+def make_label(variable, site):
+    """Inverse of ``parse_label`` (without the duplicate suffix)."""
+    return f"{variable} ({site})"
+
+
+@lru_cache(maxsize=32)
+def _keys(columns):
+    keys = []
+    for column in columns:
+        if isinstance(column, tuple):
+            keys.append((column[0], column[1]))
+        else:
+            keys.append(parse_label(column))
+    positions = {}
+    for pos, key in enumerate(keys):
+        positions.setdefault(key, []).append(pos)
+        positions.setdefault((key[0], None), []).append(pos)
+        positions.setdefault((None, key[1]), []).append(pos)
+    return tuple(keys), positions
+
+
+def column_keys(df):
+    """Return a list of (variable, site) for each column of ``df``."""
+    return list(_keys(tuple(df.columns))[0])
+
+
+def positions(df, variable=None, site=None):
+    """Column positions of ``df`` matching the given variable(s) and site(s)."""
+    keys, index = _keys(tuple(df.columns))
+    variables = [variable] if isinstance(variable, str) else variable
+    sites = [site] if isinstance(site, str) else site
+    if variables is None and sites is None:
+        return list(range(len(keys)))
+    found = []
+    for v in variables if variables is not None else [None]:
+        for s in sites if sites is not None else [None]:
+            found.extend(index.get((v, s), []))
+    return sorted(set(found))
+
+
+def select(df, variable=None, site=None):
+    """Sub-frame of the columns for the given variable(s) and/or site(s)."""
+    return df.iloc[:, positions(df, variable, site)]
+
+
+def sites(df):
+    """Sites present in ``df`` in column order."""
+    return list(dict.fromkeys(s for _, s in column_keys(df) if s is not None))
+
+
+def variables(df, site=None):
+    """Variables present in ``df`` (optionally only for the given site(s)) in column order."""
+    keys = column_keys(df)
+    return list(dict.fromkeys(keys[pos][0] for pos in positions(df, site=site)))
+
+
+def site_of(df):
+    """Series mapping each column of ``df`` to its site."""
+    return pd.Series([s for _, s in column_keys(df)], index=df.columns)
+
+
+def to_multiindex(df, lookup):
+    """Turn a frame keyed by ref id (no '@') into (variable, site, equip, ref) columns.
+
+    The variable is the display name from ``attrs['display']`` where known, else the point id.
+    """
+    display = df.attrs.pop('display', {})
+    tuples = []
+    for ref in df.columns:
+        site, equip, name = lookup.by_ref.get('@' + ref, (None, None, ref))
+        tuples.append((display.get(ref, name), site, equip, ref))
+    df.columns = pd.MultiIndex.from_tuples(tuples, names=COLUMN_LEVELS)
+    return df
+
+
+def flatten(df):
+    """Turn MultiIndex columns back into unique flat "Variable (SITE)" labels."""
+    if not isinstance(df.columns, pd.MultiIndex):
+        return df
+    labels = pd.Series([make_label(v, s) for v, s in column_keys(df)])
+    duplicated = labels.duplicated()
+    df = df.copy(deep=False)
+    df.columns = labels.where(~duplicated, labels + '_' + duplicated.cumsum().astype(str))
+    return df
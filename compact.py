@@ -0,0 +1,87 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Compact in-memory representation of point histories and the ref map.
+
+Sensor columns are stored as float32 when float32 still resolves their values
+to ``resolution`` (temperatures, powers, flows); columns with large magnitudes,
+like cumulative energy meters, stay float64 so COP deltas are unaffected.
+String attributes of the ref map become categoricals. ``memory_report`` shows
+where the bytes are.
+"""
+import numpy as np
+import pandas as pd
+
+# Smallest step that must survive the float64 -> float32 conversion
+DEFAULT_RESOLUTION = 1e-3
+
+
+def float32_safe(values, resolution=DEFAULT_RESOLUTION):
+    """True when float32 spacing at the largest magnitude in ``values`` is within ``resolution``."""
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return True
+    return np.spacing(np.float32(np.abs(finite).max())) <= resolution
+
+
+def compact_frame(df, resolution=DEFAULT_RESOLUTION):
+    """Return ``df`` with every float column that fits in float32 downcast (same index object).
+
+    Args:
+        df (pd.DataFrame): Numeric point histories.
+        resolution (float): Required precision, see ``float32_safe``.
+    """
+    if df.empty:
+        return df
+    columns = {}
+    for position in range(df.shape[1]):
+        values = df.iloc[:, position].to_numpy()
+        if values.dtype == np.float64 and float32_safe(values, resolution):
+            values = values.astype(np.float32)
+        columns[position] = values
+    compacted = pd.DataFrame(columns, index=df.index, copy=False)
+    compacted.columns = df.columns
+    compacted.attrs = dict(df.attrs)
+    return compacted
+
+
+def compact_lookup(frame, max_unique_ratio=0.5):
+    """Ref map frame with repetitive string columns (site, equip, name, unit, ...) as categoricals.
+
+    Columns whose unique values exceed ``max_unique_ratio`` of the rows (e.g. ``ref``) are kept.
+    """
+    frame = frame.copy()
+    for column in frame.columns:
+        if frame[column].dtype == object or pd.api.types.is_string_dtype(frame[column].dtype):
+            if frame[column].nunique() <= max_unique_ratio * len(frame):
+                frame[column] = frame[column].astype("category")
+    return frame
+
+
+def nbytes(obj):
+    """Deep memory use of a DataFrame or Series in bytes."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    return int(obj.memory_usage(deep=True))
+
+
+def memory_report(**frames):
+    """Memory use of the named frames, split into values and index.
+
+    Returns:
+        pd.DataFrame: One row per name with "values_mb", "index_mb", "total_mb" and the dtypes.
+    """
+    rows = {}
+    for name, frame in frames.items():
+        if frame is None:
+            continue
+        usage = frame.memory_usage(deep=True)
+        index_bytes = int(usage.get("Index", 0))
+        total = int(usage.sum())
+        rows[name] = {
+            "values_mb": (total - index_bytes) / 1024 ** 2,
+            "index_mb": index_bytes / 1024 ** 2,
+            "total_mb": total / 1024 ** 2,
+            "dtypes": ", ".join(f"{dtype}: {n}" for dtype, n in frame.dtypes.astype(str).value_counts().items()),
+        }
+    return pd.DataFrame.from_dict(rows, orient="index")
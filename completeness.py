@@ -0,0 +1,87 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Completeness analytics from one validity mask and its prefix sums.
+
+The mask (non-null and, by default, non-zero) is built once per frame and
+cumulatively summed along time. Missing percentages for any trailing window,
+or per-hour/per-day completeness, are then differences of two rows of the
+prefix sums: no per-window copies of the data.
+"""
+import numpy as np
+import pandas as pd
+
+from column_model import site_of
+from instrumentation import timed
+from periods import period_starts
+
+
+class Completeness(object):
+    """Prefix-sum completeness index over the columns of a time series frame.
+
+    Args:
+        df (pd.DataFrame): Frame with a sorted datetime index and one column per point.
+        zero_is_missing (bool): Count exact zeros as missing (dropouts report 0).
+    """
+
+    @timed("completeness.index")
+    def __init__(self, df, zero_is_missing=True):
+        self.columns = df.columns
+        self.index = pd.DatetimeIndex(df.index)
+        values = df.to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        if zero_is_missing:
+            valid &= values != 0
+        self.counts = np.zeros((len(values) + 1, values.shape[1]), dtype=np.int32)
+        np.cumsum(valid, axis=0, out=self.counts[1:])
+
+    @classmethod
+    def from_counts(cls, columns, index, counts):
+        """Completeness over prefix sums kept elsewhere (``len(index) + 1`` rows, e.g. by OnlineChecks)."""
+        self = cls.__new__(cls)
+        self.columns = columns
+        self.index = pd.DatetimeIndex(index)
+        self.counts = counts
+        return self
+
+    def _bounds(self, starts, ends, closed_end=True):
+        a = self.index.searchsorted(starts, "left")
+        b = self.index.searchsorted(ends, "right" if closed_end else "left")
+        return a, b
+
+    def valid_fraction(self, starts, ends, closed_end=True):
+        """(windows x columns) fraction of valid samples, NaN for windows with no rows."""
+        a, b = self._bounds(starts, ends, closed_end)
+        rows = (b - a).astype(float)[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(rows > 0, (self.counts[b] - self.counts[a]) / rows, np.nan)
+
+    @timed("completeness.missing_percentage")
+    def missing_percentage(self, windows):
+        """Percentage of missing samples per column for each named (start, end) window.
+
+        Returns:
+            pd.DataFrame: Columns of the source frame x window names (NaN for empty windows).
+        """
+        names = list(windows)
+        starts = pd.DatetimeIndex([pd.Timestamp(windows[name][0]) for name in names])
+        ends = pd.DatetimeIndex([pd.Timestamp(windows[name][1]) for name in names])
+        missing = 100 * (1 - self.valid_fraction(starts, ends))
+        return pd.DataFrame(missing.T, index=self.columns, columns=names)
+
+    @timed("completeness.heatmap")
+    def heatmap(self, freq="D"):
+        """Completeness percentage per ``freq`` period (rows) and column.
+
+        ``freq`` must be a fixed frequency ('D', 'h', ...).
+        """
+        if len(self.index) == 0:
+            return pd.DataFrame(columns=self.columns, dtype=float)
+        starts = period_starts(self.index[0], self.index[-1], freq)
+        ends = starts + pd.tseries.frequencies.to_offset(freq)
+        return pd.DataFrame(100 * self.valid_fraction(starts, ends, closed_end=False), index=starts, columns=self.columns)
+
+    def site_heatmap(self, freq="D"):
+        """Mean completeness percentage per ``freq`` period (rows) and site (columns)."""
+        per_column = self.heatmap(freq)
+        sites = site_of(per_column)
+        return per_column.T.groupby(sites.values).mean().T
@@ -2,49 +2,93 @@
 # -*- coding: utf-8 -*-
 import io
 import logging
-# Configure logging level here
-LOG_LEVEL = logging.INFO
-# Configure logging to include line number
-logging.basicConfig(level=LOG_LEVEL,
-                    format='%(asctime)s - %(levelname)s - %(message)s (line %(lineno)d)',
-                    datefmt='%Y-%m-%d %H:%M:%S')
 import requests
 from binascii import unhexlify, b2a_base64
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
 from hashlib import sha256
 import hmac
 import configparser
 import pandas as pd
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # set working directory so can import scram and credentials (file in folder)
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 import scram
-import logging
-
-
-# Configure logger
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-# Create logger
-logger = logging.getLogger('MyLogger')
+import zinc
+import column_model
+from compact import compact_frame, compact_lookup
+from instrumentation import span, count, timed, profiled
+
+# Logging is configured by the app or script (see instrumentation.configure_logging), not here
+logger = logging.getLogger(__name__)
+
+# Timezone of the BMOS server timestamps (and of naive start/end times)
+TIMEZONE = "Europe/London"
+# Server holding the point data; override with NISEP_BMOS_SERVER (e.g. to point at mock_server.py)
+BMOS_SERVER = os.environ.get("NISEP_BMOS_SERVER", "https://bmos12.carnego.net")
+
+class HaystackClient(object):
+    """Owns one pooled, keep-alive ``requests.Session`` shared by every API call.
+
+    Args:
+        pool_size (int): Max connections kept alive per host.
+        timeout (float or tuple): ``requests`` timeout, (connect, read) seconds.
+        gzip (bool): Ask the servers for gzip/deflate compressed responses.
+        retries (int): Connection-level retries done by urllib3.
+    """
+    def __init__(self, pool_size=10, timeout=(10, 300), gzip=True, retries=0):
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if gzip:
+            self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.post(url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_client():
+    """Return the process-wide HaystackClient, creating it on first use."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HaystackClient()
+        return _default_client
 
 # http://www.alienfactory.co.uk/articles/skyspark-scram-over-sasl
 class HaystackLogin(object):
-    def __init__(self, url, user, password):
+    def __init__(self, url, user, password, client=None):
         self.url = url
         self.user = user
         self.password = password
         self.headers = {}
+        self.client = client or get_client()
 
     # https://bmos.carnegosystems.net/ui
     # hello username=Z2xlbm5waWVyY2U
     def hello(self):
         headers = {'Authorization': 'HELLO username=%s' % (scram.base64_no_padding(self.user))}
         logger.debug(headers)
-        logging.debug(self.user)
-        logging.debug(headers)
-        logging.debug(self.url)
-        x = requests.get(self.url + '/ui', headers=headers)
+        logger.debug(self.user)
+        logger.debug(headers)
+        logger.debug(self.url)
+        x = self.client.get(self.url + '/ui', headers=headers)
         if x.status_code != 401:
             raise Exception("Hello failed")
 
@@ -57,7 +101,7 @@ class HaystackLogin(object):
 
     def first_message(self):
         self._nonce = "5GK3jXL3hz0vuhrJI-h2ag=="  # scram.get_nonce_24()
-        logging.debug('nonce %s', self._nonce)
+        logger.debug('nonce %s', self._nonce)
         gs2_header = 'n,,'  # Is this to spec ? This is what I implemented on our server
         self.client_bare = 'n=' + self.user + ',r=' + self._nonce
         msg = gs2_header + self.client_bare
@@ -65,8 +109,8 @@ class HaystackLogin(object):
 
         headers = {'Authorization': 'SCRAM handshakeToken=%s, data=%s' % (self.handshake_token, data)}
         logger.debug(headers)
-        logging.debug("first_message %s", self.url)
-        x = requests.get(self.url + '/ui', headers=headers)
+        logger.debug("first_message %s", self.url)
+        x = self.client.get(self.url + '/ui', headers=headers)
         www_str = x.headers['www-authenticate']
         if not www_str.lower().startswith('scram'):
             raise Exception("first_message fail")
@@ -84,39 +128,40 @@ class HaystackLogin(object):
         self._server_salt_hex = scram.hexlify(self._server_salt)
         self._server_interations = decoded.split(',i=')[1].strip()
 
-        logging.debug('self._server_first_msg %s', self._server_first_msg)
-        logging.debug('self._server_nonce %s', self._server_nonce)
-        logging.debug('self._server_salt_base64 %s', self._server_salt_base64)
-        logging.debug('self._server_salt %s', self._server_salt)
-        logging.debug('self._server_salt_hex %s', self._server_salt_hex)
-        logging.debug('self._server_interations %s', self._server_interations)
+        logger.debug('self._server_first_msg %s', self._server_first_msg)
+        logger.debug('self._server_nonce %s', self._server_nonce)
+        logger.debug('self._server_salt_base64 %s', self._server_salt_base64)
+        logger.debug('self._server_salt %s', self._server_salt)
+        logger.debug('self._server_salt_hex %s', self._server_salt_hex)
+        logger.debug('self._server_interations %s', self._server_interations)
 
     def _create_client_proof(salted_password, auth_msg):
-        logging.debug('auth_msg %s', auth_msg)
-        logging.debug('salted_password: %s', salted_password)
+        logger.debug('auth_msg %s', auth_msg)
+        logger.debug('salted_password: %s', salted_password)
         client_key = hmac.new(unhexlify(salted_password), "Client Key".encode("utf-8"), sha256).hexdigest()
-        logging.debug('client_key: %s', client_key)
-        logging.debug("client key un hexed: %s", unhexlify(client_key))
+        logger.debug('client_key: %s', client_key)
+        logger.debug("client key un hexed: %s", unhexlify(client_key))
         stored_key = scram._hash_sha256(unhexlify(client_key), sha256)
-        logging.debug('stored_key: %s', stored_key)
-        logging.debug("unhexlify(stored_key) %s", unhexlify(stored_key))
-        logging.debug("auth_msg.encode() %s", auth_msg.encode())
+        logger.debug('stored_key: %s', stored_key)
+        logger.debug("unhexlify(stored_key) %s", unhexlify(stored_key))
+        logger.debug("auth_msg.encode() %s", auth_msg.encode())
         client_signature = hmac.new(unhexlify(stored_key), auth_msg.encode(), sha256).hexdigest()
-        logging.debug('client_signature: %s', client_signature)
+        logger.debug('client_signature: %s', client_signature)
         client_proof = scram._xor(client_key, client_signature)
-        logging.debug('client_proof: %s', client_proof)
+        logger.debug('client_proof: %s', client_proof)
         return b2a_base64(unhexlify(client_proof)).decode("utf-8")
 
     def second_message(self):
-        logging.debug("scram.salted_password_2 %s %s %s", self._server_salt_hex, self._server_interations, self.password)
-        self.salted_password = scram.salted_password_2(
-            self._server_salt_hex,
-            self._server_interations,
-            "sha256",
-            self.password,
-        )
+        logger.debug("scram.salted_password_2 %s %s", self._server_salt_hex, self._server_interations)
+        with span("auth.pbkdf2", iterations=self._server_interations):
+            self.salted_password = scram.cached_salted_password_2(
+                self._server_salt_hex,
+                self._server_interations,
+                "sha256",
+                self.password,
+            )
 
-        logging.debug('salted_password: %s', self.salted_password)
+        logger.debug('salted_password: %s', self.salted_password)
 
         self.salted_password_hex = scram.hexlify(self.salted_password)
 
@@ -130,18 +175,18 @@ class HaystackLogin(object):
 
         logger.debug("c2_no_proof: %s", c2_no_proof)
 
-        logging.debug("self.client_bare: %s", self.client_bare)
-        logging.debug("self._server_first_msg: %s", self._server_first_msg)
-        logging.debug("c2_no_proof: %s", c2_no_proof)
+        logger.debug("self.client_bare: %s", self.client_bare)
+        logger.debug("self._server_first_msg: %s", self._server_first_msg)
+        logger.debug("c2_no_proof: %s", c2_no_proof)
 
         auth_msg = self.client_bare + ',' + self._server_first_msg + ',' + c2_no_proof
 
         logger.debug('auth_msg: %s', auth_msg)
 
-        logging.debug("_create_client_proof args %s %s", self.salted_password, auth_msg)
+        logger.debug("_create_client_proof args %s %s", self.salted_password, auth_msg)
         client_proof = HaystackLogin._create_client_proof(self.salted_password, auth_msg)
 
-        logging.debug('client_proof base64 encoded: %s', client_proof)
+        logger.debug('client_proof base64 encoded: %s', client_proof)
 
         client_final = c2_no_proof + ',p=' + client_proof
 
@@ -152,8 +197,8 @@ class HaystackLogin(object):
         logger.debug('data: %s', data)
 
         headers = {'Authorization': 'SCRAM handshakeToken=%s, data=%s' % (self.handshake_token, data)}
-        logger.info(headers)
-        x = requests.get(self.url + '/ui', headers=headers)
+        logger.debug("second_message %s", self.url)
+        x = self.client.get(self.url + '/ui', headers=headers)
 
         if x.status_code != 200:
             raise Exception("failed to authenticate")
@@ -164,40 +209,42 @@ class HaystackLogin(object):
         return headers
 
     def login(self):
-        self.hello()
-        logger.debug('handshake_token: %s', self.handshake_token)
-        self.first_message()
-        return self.second_message()
-
-def about(url, auth_header):
-    response = requests.post(url=url + '/about', headers=auth_header)
+        with span("auth.login"):
+            count("auth.logins")
+            self.hello()
+            logger.debug('handshake_token: %s', self.handshake_token)
+            self.first_message()
+            return self.second_message()
+
+def about(url, auth_header, client=None):
+    response = (client or get_client()).post(url=url + '/about', headers=auth_header)
     data = response.content
-    logging.debug('Response: %s', response)
-    logging.debug('Data: %s', data)
+    logger.debug('Response: %s', response)
+    logger.debug('Data: %s', data)
 
-def get_ref_map(url, auth_header):
+def get_ref_map(url, auth_header, client=None):
     zinc = 'ver:"3.0" action:"ref_namespace_map"\n'
-    logging.debug('Zinc: %s', zinc)
-    return requests.post(url=url + '/action', headers=auth_header, data=zinc)
+    logger.debug('Zinc: %s', zinc)
+    return (client or get_client()).post(url=url + '/action', headers=auth_header, data=zinc)
 
-def historical_read(url, auth_header, aggregate, granularity, refs, daterange):
+def historical_read(url, auth_header, aggregate, granularity, refs, daterange, client=None, stream=False):
     zinc_fmt = 'ver:"3.0" aggregate:"%s" granularity:"%s" interpolate:"true"\nid,range\n%s,"%s"\n'
     zinc = zinc_fmt % (aggregate, granularity, refs, daterange)
-    logging.debug('Zinc: %s', zinc)
-    return requests.post(url=url + '/hisRead', headers=auth_header, data=zinc)
+    logger.debug('Zinc: %s', zinc)
+    return (client or get_client()).post(url=url + '/hisRead', headers=auth_header, data=zinc, stream=stream)
 
-def refresh_token(url, auth_header):
-    response = requests.post(url=url + '/refresh_token', headers=auth_header)
+def refresh_token(url, auth_header, client=None):
+    response = (client or get_client()).post(url=url + '/refresh_token', headers=auth_header)
     data = response.content
-    logging.debug('Response: %s', response)
-    logging.debug('Data: %s', data)
+    logger.debug('Response: %s', response)
+    logger.debug('Data: %s', data)
     return response
 
-def get_user_info(url, auth_header):
-    response = requests.get(url=url + '/api/info', headers=auth_header)
+def get_user_info(url, auth_header, client=None):
+    response = (client or get_client()).get(url=url + '/api/info', headers=auth_header)
     data = response.content
-    logging.debug('Response: %s', response)
-    logging.debug('Data: %s', data)
+    logger.debug('Response: %s', response)
+    logger.debug('Data: %s', data)
     return response
 
 
@@ -227,6 +274,8 @@ def load_config():
     return url, username, password
 
 def giveRef(lookup, site, variable=None):
+    if isinstance(lookup, RefLookup):
+        return lookup.refs(site, variable)
     # Ensure site is always a list if not None
     if site is not None and isinstance(site, str):
         site = [site]
@@ -250,7 +299,7 @@ def giveRef(lookup, site, variable=None):
                 lookup.name.isin(variable)
             ].tolist()
 
-def login(auth_url, username, password):
+def login(auth_url, username, password, client=None):
     # Load the configuration
     #auth_url, username, password = load_config()
     if not auth_url:
@@ -262,17 +311,17 @@ def login(auth_url, username, password):
         username = prompt_for_input("Enter your username: ")
     if not password:
         password = prompt_for_input("Enter your password: ")
-    logging.debug("username: %s password: %s", username, password)
-    auth = HaystackLogin(auth_url, username, password)
+    logger.debug("username: %s", username)
+    auth = HaystackLogin(auth_url, username, password, client=client)
     # This gives us a header that includes an auth token to send to the server for more data.
-    # Note here I set the server which the data to bmos12. In the future this made need to be determined from what
-    # is returned from user_info
+    # Note here I set the server which the data to bmos12 (BMOS_SERVER). In the future this made need to be
+    # determined from what is returned from user_info
     auth_header = auth.login()
-    bmos_server = 'https://bmos12.carnego.net'
+    bmos_server = BMOS_SERVER
 
     # Get the user info 
-    user_info = get_user_info(auth_url, auth_header)
-    logging.debug("Text: %s", user_info.text)
+    user_info = get_user_info(auth_url, auth_header, client=client)
+    logger.debug("Text: %s", user_info.text)
     user_info = json.loads(user_info.text)
 
     attributes = {}
@@ -285,52 +334,442 @@ def login(auth_url, username, password):
     auth_header['site_group_namespace'] = 'yosemite.nisep.refresh'
     return bmos_server,auth_header
 
-def getLookup(auth_url, username, password,return_login=False):
-    bmos_server,auth_header = login(auth_url, username, password)
+class AuthExpired(Exception):
+    """Raised when the BMOS server rejects the bearer token (HTTP 401)."""
+
+def _check_auth(response):
+    if response.status_code == 401:
+        raise AuthExpired("bearer token rejected")
+    return response
 
-    # return a zinc file (csv like) of points and all their attributes
-    ref_map = get_ref_map(bmos_server, auth_header)
-    # create lookup
-    df = pd.read_csv(io.StringIO(ref_map.text), skiprows=1)
-    df['siteNamespace'] = df['siteNamespace'].str.split('.').str[-1]
-    df['equipNamespace'] = df['equipNamespace'].str.split('.').str[-1]
+class TokenManager(object):
+    """Caches the bearer header from the SCRAM login and keeps it fresh.
+
+    The header is reused for every call; after ``refresh_after`` seconds it is
+    renewed through ``/refresh_token`` and after ``ttl`` seconds (or on a 401)
+    a full login is done. With ``cache_path`` the header is also kept on disk
+    so a restarted process skips the login.
+    """
+    def __init__(self, auth_url, username, password, client=None, ttl=3600, refresh_after=1800, cache_path=None):
+        self.auth_url = auth_url
+        self.username = username
+        self.password = password
+        self.client = client
+        self.ttl = ttl
+        self.refresh_after = refresh_after
+        self.cache_path = cache_path
+        self.bmos_server = None
+        self.auth_header = None
+        self.issued_at = 0
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return
+        if cached.get('auth_url') == self.auth_url and cached.get('username') == self.username:
+            self.bmos_server = cached['bmos_server']
+            self.auth_header = cached['auth_header']
+            self.issued_at = cached['issued_at']
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp = self.cache_path + '.tmp'
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'auth_url': self.auth_url, 'username': self.username, 'bmos_server': self.bmos_server,
+                       'auth_header': self.auth_header, 'issued_at': self.issued_at}, f)
+        os.replace(tmp, self.cache_path)
+
+    def _login(self):
+        self.bmos_server, self.auth_header = login(self.auth_url, self.username, self.password, client=self.client)
+        self.issued_at = time.time()
+        self._save()
+
+    def _refresh(self):
+        count("auth.refreshes")
+        response = refresh_token(self.auth_url, self.auth_header, client=self.client)
+        if response.status_code != 200:
+            return False
+        if 'authentication-info' in response.headers:
+            self.auth_header['authorization'] = 'bearer ' + response.headers['authentication-info'].split(',')[0]
+        self.issued_at = time.time()
+        self._save()
+        return True
+
+    def session(self):
+        """Return ``(bmos_server, auth_header)``, logging in or refreshing only when needed."""
+        with self._lock:
+            age = time.time() - self.issued_at
+            if self.auth_header is None or age >= self.ttl:
+                self._login()
+            elif age >= self.refresh_after:
+                try:
+                    refreshed = self._refresh()
+                except requests.RequestException:
+                    refreshed = False
+                if not refreshed:
+                    self._login()
+            else:
+                count("auth.token_reuse")
+            return self.bmos_server, dict(self.auth_header)
+
+    def invalidate(self):
+        with self._lock:
+            self.auth_header = None
+            self.issued_at = 0
+
+    def call(self, fn):
+        """Run ``fn(bmos_server, auth_header)``, logging in again once if it raises AuthExpired."""
+        bmos_server, auth_header = self.session()
+        try:
+            return fn(bmos_server, auth_header)
+        except AuthExpired:
+            logger.info("bearer token rejected, logging in again")
+            self.invalidate()
+            bmos_server, auth_header = self.session()
+            return fn(bmos_server, auth_header)
+
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+def get_token_manager(auth_url, username, password, client=None, **kwargs):
+    """Return the shared TokenManager for these credentials, creating it on first use."""
+    key = (auth_url, username, sha256(password.encode()).hexdigest())
+    with _token_managers_lock:
+        if key not in _token_managers:
+            _token_managers[key] = TokenManager(auth_url, username, password, client=client, **kwargs)
+        return _token_managers[key]
+
+class RefLookup(object):
+    """The ref namespace map plus hash indexes for O(1) ref resolution.
+
+    Attributes:
+        frame (pd.DataFrame): The parsed map (ref, siteNamespace, equipNamespace, name, ...).
+        by_ref (dict): ref -> (site, equip, name).
+        by_point (dict): (site, equip, name) -> ref, the reverse of ``by_ref``.
+        by_site_variable (dict): (site, name) -> list of refs.
+        added (set): Refs new against the previously fetched map.
+        removed (set): Refs dropped from the map, kept until every history cache has pruned them.
+        pruned (set): Directories of the history caches ``removed`` has been invalidated in.
+    """
+    def __init__(self, frame, digest=None):
+        self.frame = frame
+        self.digest = digest
+        self.fetched_at = time.time()
+        self.added = set()
+        self.removed = set()
+        self.pruned = set()
+        self.by_ref = {}
+        self.by_point = {}
+        self.by_site_variable = {}
+        self.by_site = {}
+        self.by_variable = {}
+        self._position = {}
+        for pos, (ref, site, equip, name) in enumerate(zip(frame['ref'], frame['siteNamespace'], frame['equipNamespace'], frame['name'])):
+            self._position[ref] = pos
+            self.by_ref[ref] = (site, equip, name)
+            self.by_point[(site, equip, name)] = ref
+            self.by_site_variable.setdefault((site, name), []).append(ref)
+            self.by_site.setdefault(site, []).append(ref)
+            self.by_variable.setdefault(name, []).append(ref)
+
+    @property
+    def sites(self):
+        return list(self.by_site)
+
+    @property
+    def variables(self):
+        return list(self.by_variable)
+
+    def refs(self, site=None, variable=None, display=None):
+        """Refs for the given site(s) and variable(s), in ref map order (None means all).
+
+        With ``display`` (ref id -> display name, e.g. ``Snapshot.display``) the variables are
+        display names; refs without one are matched on their point id.
+        """
+        if site is not None and isinstance(site, str):
+            site = [site]
+        if variable is not None and isinstance(variable, str):
+            variable = [variable]
+        if display is not None and variable is not None:
+            wanted = set(variable)
+            return [ref for ref in self.refs(site)
+                    if display.get(ref.lstrip('@'), self.by_ref[ref][2]) in wanted]
+        if site is None and variable is None:
+            return list(self.by_ref)
+        if site is None:
+            found = [ref for name in variable for ref in self.by_variable.get(name, [])]
+        elif variable is None:
+            found = [ref for s in site for ref in self.by_site.get(s, [])]
+        else:
+            found = [ref for s in site for name in variable for ref in self.by_site_variable.get((s, name), [])]
+        return sorted(set(found), key=self._position.__getitem__)
+
+    def site_variables(self, site=None):
+        """Variable names available at the given site(s), in ref map order (None means all)."""
+        if site is None:
+            return self.variables
+        if isinstance(site, str):
+            site = [site]
+        return list(dict.fromkeys(self.by_ref[ref][2] for ref in self.refs(site)))
+
+    def label(self, ref, display=None):
+        """Column label "Variable (NISEPxx)" for ``ref`` (with or without '@').
+
+        ``display`` is the point's display name from a hisRead header; the ref map only has
+        its point id (``name``), which is used when no display name is known.
+        """
+        site, _, name = self.by_ref.get(ref) or self.by_ref.get('@' + ref)
+        return f"{display or name} ({site})"
+
+    def diff(self, previous):
+        """Return (added, removed) ref sets relative to an older RefLookup."""
+        if previous is None:
+            return set(self.by_ref), set()
+        return set(self.by_ref) - set(previous.by_ref), set(previous.by_ref) - set(self.by_ref)
+
+_lookups = {}
+_lookups_lock = threading.Lock()
+
+def getRefLookup(auth_url, username, password, ttl=3600, client=None, compact=False):
+    """Return the cached RefLookup, re-fetching the ref map at most every ``ttl`` seconds.
+
+    The raw map is hashed so an unchanged map is not re-parsed; when it did change,
+    ``added``/``removed`` on the returned lookup list the refs that differ. Removed refs
+    are kept (also across later changes) until every history cache has pruned them,
+    see ``RefLookup.pruned``. With
+    ``compact`` the string attributes of the map are stored as categoricals.
+    """
+    key = (auth_url, username, compact)
+    with _lookups_lock:
+        previous = _lookups.get(key)
+        if previous is not None and time.time() - previous.fetched_at < ttl:
+            return previous
+
+        tokens = get_token_manager(auth_url, username, password, client=client)
+        # return a zinc file (csv like) of points and all their attributes
+        with span("ref_map.fetch"):
+            ref_map = tokens.call(lambda server, header: _check_auth(get_ref_map(server, header, client=client)))
+        count("http.bytes", len(ref_map.content))
+        digest = sha256(ref_map.content).hexdigest()
+        if previous is not None and previous.digest == digest:
+            count("ref_map.unchanged")
+            # ``removed`` stays: caches that have not pruned it yet still need to
+            previous.fetched_at = time.time()
+            return previous
+
+        # create lookup
+        with span("ref_map.parse"):
+            df = pd.read_csv(io.StringIO(ref_map.text), skiprows=1)
+            df['siteNamespace'] = df['siteNamespace'].str.split('.').str[-1]
+            df['equipNamespace'] = df['equipNamespace'].str.split('.').str[-1]
+            if compact:
+                df = compact_lookup(df)
+            lookup = RefLookup(df, digest)
+        lookup.added, lookup.removed = lookup.diff(previous)
+        if previous is not None:
+            logger.info("ref map changed: %d added, %d removed", len(lookup.added), len(lookup.removed))
+            # Carry removals some cache may not have pruned yet (re-pruning costs one directory walk)
+            lookup.removed |= previous.removed - set(lookup.by_ref)
+        _lookups[key] = lookup
+        return lookup
+
+def cached_lookups():
+    """The RefLookups currently cached, keyed by (auth_url, username, compact)."""
+    with _lookups_lock:
+        return dict(_lookups)
+
+def getLookup(auth_url, username, password,return_login=False,client=None):
+    df = getRefLookup(auth_url, username, password, client=client).frame
     if return_login==True:
+        bmos_server,auth_header = get_token_manager(auth_url, username, password, client=client).session()
         return df, bmos_server,auth_header
     else:
         return df
 
-def getTimeseries(end_time,start_time,site,variable, auth_url, username, password,averaging="max",interval="minute"):
-    df, bmos_server,auth_header = getLookup(auth_url, username, password, return_login=True)
+def _read_timeseries(bmos_server, auth_header, averaging, interval, refs, start_time, end_time, client=None):
+    """hisRead ``refs`` and return a frame with one column per ref id (no '@') and a London index.
 
+    ``attrs['display']`` maps each ref id to the display name of its column header.
+    """
     daterange = f"{start_time.strftime('%Y-%m-%dT%H:%M:%S')},{end_time.strftime('%Y-%m-%dT%H:%M:%S')}" # format into the right date range string
-    formatted_list = "[" + ", ".join(giveRef(df,site, variable)) + "]"
-
-    timeseries_response = historical_read(bmos_server, auth_header, averaging, interval, formatted_list, daterange)
-    timeseries_df = pd.read_csv(io.StringIO(timeseries_response.text), skiprows=1)
-
-    # Filter the lookup DataFrame to only include relevant refs found in timeseries_df column names
-    filtered_lookup = df[df['ref'].str.strip('@').isin(
-        [col.split('(')[-1].split(')')[0] for col in timeseries_df.columns if '(' in col]
-    )]
-    
-    # Create a mapping dictionary from the filtered lookup DataFrame
-    mapping = {ref.strip('@'): name for ref, name in zip(filtered_lookup['ref'], filtered_lookup['siteNamespace'])}
-    
-    # Replace numbers in column names using the filtered mapping
+    formatted_list = "[" + ", ".join(refs) + "]"
+
+    # Stream the grid straight into the Zinc reader instead of buffering the whole text
+    # (so the span covers both the transfer and the parse)
+    with span("hisread", refs=len(refs), granularity=interval) as fields, \
+            _check_auth(historical_read(bmos_server, auth_header, averaging, interval, formatted_list, daterange,
+                                        client=client, stream=True)) as timeseries_response:
+        timeseries_response.encoding = timeseries_response.encoding or 'utf-8'
+        timeseries_df = zinc.read_his_grid(timeseries_response.iter_lines(decode_unicode=True), tz=TIMEZONE)
+        fields['rows'] = len(timeseries_df)
+        fields['bytes'] = timeseries_response.raw.tell()
+    count("hisread.requests")
+    count("hisread.rows", len(timeseries_df))
+    count("http.bytes", fields['bytes'])
+
+    # Columns come back as "Display name (ref)"; key them by ref so they can be cached and relabelled,
+    # and keep the display name, which the ref map does not have (its ``name`` is the point id)
+    refs = [col.split('(')[-1].split(')')[0] if '(' in col else col for col in timeseries_df.columns]
+    display = {ref: col.split('(')[0].strip() for ref, col in zip(refs, timeseries_df.columns) if '(' in col}
+    timeseries_df.columns = refs
+    timeseries_df.attrs['display'] = display
+    return timeseries_df
+
+@timed("label_columns")
+def label_columns(timeseries_df, lookup):
+    """Rename ref-id columns to "Variable (NISEPxx)" and return the frame.
+
+    The variable is the display name from ``attrs['display']`` (see ``getTimeseries(columns="ref")``),
+    the site comes from the RefLookup.
+    """
+    display = timeseries_df.attrs.pop('display', {})
     timeseries_df.columns = [
-        col.split('(')[0].strip() + f" ({mapping[num]})" if '(' in col and num in mapping else col
-        for col in timeseries_df.columns for num in [col.split('(')[-1].split(')')[0] if '(' in col else '']
+        lookup.label(col, display.get(col)) if '@' + col in lookup.by_ref else col for col in timeseries_df.columns
     ]
     # Make column names unique
     timeseries_df.columns = pd.Series(timeseries_df.columns).where(~pd.Series(timeseries_df.columns).duplicated(), 
                                              pd.Series(timeseries_df.columns) + '_' + pd.Series(timeseries_df.columns).duplicated().cumsum().astype(str))
+    return timeseries_df
+
+def _fetch_partitioned(fetch, refs, start_time, end_time, ref_batch_size=None, time_slice=None, max_workers=4, retries=2):
+    """Split a hisRead into ref batches x time slices, run them on a thread pool and stitch the result.
+
+    Each chunk is retried ``retries`` times with exponential backoff. Chunks that still
+    fail are logged and left as NaN; they are listed as (refs, start, end) in
+    ``frame.attrs['failed_chunks']`` so callers (e.g. the history cache) can tell.
+    """
+    batch_size = ref_batch_size or max(len(refs), 1)
+    batches = [refs[i:i + batch_size] for i in range(0, len(refs), batch_size)]
+    if time_slice:
+        edges = list(pd.date_range(start_time, end_time, freq=time_slice))
+        if not edges or edges[-1] < pd.Timestamp(end_time):
+            edges.append(pd.Timestamp(end_time))
+        slices = list(zip(edges[:-1], edges[1:])) or [(start_time, end_time)]
+    else:
+        slices = [(start_time, end_time)]
+
+    def run(batch, start, end):
+        for attempt in range(retries + 1):
+            try:
+                return fetch(batch, start, end)
+            except Exception:
+                if attempt == retries:
+                    raise
+                logger.warning("hisRead chunk %s - %s failed (attempt %d), retrying", start, end, attempt + 1)
+                time.sleep(2 ** attempt)
+
+    pieces = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, batch, start, end): (i, batch, start, end)
+                   for i, batch in enumerate(batches) for start, end in slices}
+        for future in as_completed(futures):
+            i, batch, start, end = futures[future]
+            try:
+                piece = future.result()
+            except Exception as e:
+                logger.error("hisRead chunk of %d refs %s - %s failed: %s", len(batch), start, end, e)
+                failed.append((batch, start, end))
+                continue
+            pieces.setdefault(i, []).append(piece)
+
+    columns = []
+    display = {}
+    for i in sorted(pieces):
+        for piece in pieces[i]:
+            display.update(piece.attrs.get('display', {}))
+        # Slices share their boundary timestamp, keep it once
+        frame = pd.concat(pieces[i]).sort_index()
+        columns.append(frame[~frame.index.duplicated()])
+    if columns:
+        timeseries_df = pd.concat(columns, axis=1)
+    else:
+        timeseries_df = pd.DataFrame(index=pd.DatetimeIndex([], tz=TIMEZONE, name="datetime"))
+    # Refs whose every chunk failed are still there, as NaN, so they do not look removed
+    timeseries_df = timeseries_df.reindex(columns=list(dict.fromkeys(ref.lstrip('@') for ref in refs)))
+    timeseries_df.attrs['display'] = display
+    timeseries_df.attrs['failed_chunks'] = failed
+    return timeseries_df
+
+# hisRead granularities from fine to coarse, used by interval="auto"
+GRANULARITIES = [("minute", pd.Timedelta(minutes=1)), ("hour", pd.Timedelta(hours=1)), ("day", pd.Timedelta(days=1))]
+# Default rows-per-point budget for interval="auto" (a week of minute data)
+AUTO_MAX_ROWS = 7 * 24 * 60
+
+def choose_granularity(start_time, end_time, max_rows=None):
+    """Finest hisRead granularity whose row count over the range fits in ``max_rows`` per point."""
+    budget = max_rows or AUTO_MAX_ROWS
+    span = pd.Timestamp(end_time) - pd.Timestamp(start_time)
+    for granularity, step in GRANULARITIES:
+        if span / step <= budget:
+            return granularity
+    return GRANULARITIES[-1][0]
+
+def getTimeseries(end_time,start_time,site,variable, auth_url, username, password,averaging="max",interval="minute",cache=None,client=None,
+                  ref_batch_size=None,time_slice=None,max_workers=4,retries=2,columns="flat",max_rows=None,refs=None,compact=False):
+    """Fetch a wide frame of point histories labelled "Variable (NISEPxx)".
+
+    Pass a ``history_cache.HistoryCache`` as ``cache`` to only download the parts of
+    the window that are not already stored on disk. Setting ``ref_batch_size`` and/or
+    ``time_slice`` (a pandas frequency such as "7D") splits the hisRead into chunks that
+    are fetched concurrently on ``max_workers`` threads with ``retries`` per chunk.
+    With ``columns="multi"`` the columns are a (variable, site, equip, ref) MultiIndex
+    instead of flat labels; see ``column_model`` for selectors that handle both.
+    ``columns="ref"`` keeps the columns keyed by ref id (no '@'), with the display names
+    of the hisRead headers in ``attrs['display']``, for callers that label them later.
+    Variables are the display names of the hisRead headers; the ``variable`` filter
+    takes the ref map's point ids.
+    ``interval="auto"`` lets the server aggregate long ranges: the finest granularity that
+    keeps each point within ``max_rows`` rows is used, and ``averaging="auto"`` keeps "max"
+    for minute data and asks for "average" when aggregating. The chosen values are in
+    ``attrs['granularity']`` and ``attrs['aggregate']``. An explicit ``refs`` list
+    (e.g. from ``RefLookup.refs``) is fetched as is, in place of the site/variable filter.
+    ``compact=True`` returns float32 columns wherever float32 keeps 0.001 resolution
+    (see ``compact.compact_frame``), roughly halving the memory of sensor data.
+    """
+    if interval == "auto":
+        interval = choose_granularity(start_time, end_time, max_rows)
+    if averaging == "auto":
+        averaging = "max" if interval == "minute" else "average"
+
+    lookup = getRefLookup(auth_url, username, password, client=client, compact=compact)
+    if refs is None:
+        refs = lookup.refs(site, variable)
+    tokens = get_token_manager(auth_url, username, password, client=client)
+
+    def read(refs, start, end):
+        return tokens.call(lambda server, header: _read_timeseries(server, header, averaging, interval, refs, start, end, client=client))
+
+    if ref_batch_size or time_slice:
+        def fetch(refs, start, end):
+            return _fetch_partitioned(read, refs, start, end, ref_batch_size, time_slice, max_workers, retries)
+    else:
+        fetch = read
 
-        # Coerce all columns to numeric except the 'datetime' column
-    for col in timeseries_df.columns:
-        if col != 'datetime':  # Exclude datetime column from coercion
-            timeseries_df[col] = pd.to_numeric(timeseries_df[col], errors='coerce')
-
-    timeseries_df["datetime"] = pd.to_datetime(timeseries_df["datetime"])  # Ensure datetime column is in datetime format
-    timeseries_df.set_index("datetime", inplace=True)
-    
-    return timeseries_df
\ No newline at end of file
+    with span("getTimeseries", refs=len(refs), granularity=interval, cached=cache is not None), profiled("getTimeseries"):
+        if cache is None:
+            timeseries_df = fetch(refs, start_time, end_time)
+        else:
+            if lookup.removed and cache.cache_dir not in lookup.pruned:
+                # Points that left the ref map should not linger in the cache; once per map and cache
+                cache.invalidate(lookup.removed)
+                lookup.pruned.add(cache.cache_dir)
+            timeseries_df = cache.read(refs, averaging, interval, start_time, end_time, fetch)
+
+    timeseries_df.attrs['granularity'] = interval
+    timeseries_df.attrs['aggregate'] = averaging
+    if compact:
+        timeseries_df = compact_frame(timeseries_df)
+    if columns == "ref":
+        return timeseries_df
+    if columns == "multi":
+        return column_model.to_multiindex(timeseries_df, lookup)
+    return label_columns(timeseries_df, lookup)
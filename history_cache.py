@@ -0,0 +1,279 @@
+#!python
+# -*- coding: utf-8 -*-
+"""On-disk history cache for hisRead results.
+
+Each (ref, aggregate, granularity) is stored as one Parquet file per UTC day,
+next to a small JSON sidecar listing the time ranges already downloaded and
+the point's display name from the hisRead header. A gap fill only rewrites
+the days it touches, and an optional retention window drops old days.
+A read only asks the server for the sub-ranges that are not covered yet and
+merges them into the stored series, so refreshing a rolling 30 day window
+every day moves roughly one day of data over the wire.
+"""
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+import pandas as pd
+
+from instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TZ = "Europe/London"
+
+
+def _localize(ts, tz=DEFAULT_TZ):
+    """Return ``ts`` as a tz-aware timestamp, treating naive values as site local time."""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        return ts.tz_localize(tz)
+    return ts.tz_convert(tz)
+
+
+def _day(ts):
+    """UTC day ("YYYY-MM-DD") of a timestamp or of every timestamp of an index: the partition key."""
+    return ts.tz_convert("UTC").strftime("%Y-%m-%d")
+
+
+def merge_ranges(ranges):
+    """Merge overlapping or touching (start, end) ranges into a sorted list."""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(start, end, covered):
+    """Return the parts of ``[start, end]`` not contained in the ``covered`` ranges."""
+    missing = []
+    cursor = start
+    for lo, hi in merge_ranges(covered):
+        if hi <= cursor:
+            continue
+        if lo >= end:
+            break
+        if lo > cursor:
+            missing.append((cursor, lo))
+        cursor = max(cursor, hi)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+class HistoryCache(object):
+    """Columnar cache of point histories keyed by ref, aggregate and granularity.
+
+    Args:
+        cache_dir (str): Directory holding the Parquet files and coverage sidecars.
+        tz (str): Timezone used for naive start/end times and the returned index.
+        settle (str): The most recent stretch of this length is never marked as
+            covered, so late-arriving samples are picked up by the next read.
+        retention (str): Day partitions older than this (e.g. "365D") are deleted and
+            their range uncovered when a point is stored; None keeps everything.
+    """
+
+    def __init__(self, cache_dir, tz=DEFAULT_TZ, settle="15min", retention=None):
+        self.cache_dir = cache_dir
+        self.tz = tz
+        self.settle = pd.Timedelta(settle)
+        self.retention = pd.Timedelta(retention) if retention is not None else None
+        self._lock = threading.RLock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, ref, aggregate, granularity):
+        """Base path of a point: ``<base>.json`` is its sidecar, ``<base>/`` holds its day partitions."""
+        safe_ref = re.sub(r"[^A-Za-z0-9_.-]", "_", ref.strip("@"))
+        folder = os.path.join(self.cache_dir, str(aggregate), str(granularity))
+        return os.path.join(folder, safe_ref)
+
+    def _days(self, base):
+        """Sorted UTC days ("YYYY-MM-DD") with a partition under ``base``."""
+        if not os.path.isdir(base):
+            return []
+        return sorted(name[:-len(".parquet")] for name in os.listdir(base) if name.endswith(".parquet"))
+
+    def _read_parquet(self, path):
+        series = pd.read_parquet(path).iloc[:, 0]
+        series.index = series.index.tz_convert(self.tz)
+        return series
+
+    def _sidecar(self, ref, aggregate, granularity):
+        path = self._path(ref, aggregate, granularity) + ".json"
+        if not os.path.exists(path):
+            return {"covered": [], "display": None}
+        with open(path) as f:
+            sidecar = json.load(f)
+        if isinstance(sidecar, list):  # written before display names were kept
+            sidecar = {"covered": sidecar, "display": None}
+        return sidecar
+
+    def coverage(self, ref, aggregate, granularity):
+        """Return the merged list of (start, end) ranges already stored for ``ref``."""
+        return [(pd.Timestamp(lo).tz_convert(self.tz), pd.Timestamp(hi).tz_convert(self.tz))
+                for lo, hi in self._sidecar(ref, aggregate, granularity)["covered"]]
+
+    def display(self, ref, aggregate, granularity):
+        """Display name of ``ref`` from the hisRead header it was stored from (None if unknown)."""
+        return self._sidecar(ref, aggregate, granularity).get("display")
+
+    def load(self, ref, aggregate, granularity, start_time=None, end_time=None):
+        """Return the stored series for ``ref`` (empty if nothing is cached).
+
+        Only the day partitions overlapping [start_time, end_time] are read, when given.
+        """
+        base = self._path(ref, aggregate, granularity)
+        first = _day(_localize(start_time, self.tz)) if start_time is not None else None
+        last = _day(_localize(end_time, self.tz)) if end_time is not None else None
+        parts = [self._read_parquet(os.path.join(base, day + ".parquet")) for day in self._days(base)
+                 if (first is None or day >= first) and (last is None or day <= last)]
+        # A single file per point, as written before the day partitions; partitions win over it
+        if os.path.exists(base + ".parquet"):
+            parts.insert(0, self._read_parquet(base + ".parquet"))
+        if not parts:
+            return pd.Series(dtype="float64", index=pd.DatetimeIndex([], tz=self.tz), name=ref.strip("@"))
+        series = pd.concat(parts) if len(parts) > 1 else parts[0]
+        series = series[~series.index.duplicated(keep="last")].sort_index()
+        series.name = ref.strip("@")
+        return series
+
+    def store(self, ref, aggregate, granularity, series, covered, display=None):
+        """Merge ``series`` into the cache and mark the ``covered`` (start, end) ranges as held.
+
+        Only the day partitions ``series`` touches are rewritten. ``display`` (the point's
+        display name) is kept with the coverage for relabelling reads.
+        """
+        with self._lock:
+            base = self._path(ref, aggregate, granularity)
+            os.makedirs(base, exist_ok=True)
+            legacy = base + ".parquet"
+            if series is None or series.empty:
+                series = pd.Series(dtype="float64", index=pd.DatetimeIndex([], tz=self.tz))
+            else:
+                series = series.copy()
+                series.index = series.index.tz_convert(self.tz)
+            if os.path.exists(legacy):
+                old = self._read_parquet(legacy)
+                series = pd.concat([old[~old.index.isin(series.index)], series]).sort_index()
+            series.name = ref.strip("@")
+            for day, part in series.groupby(_day(series.index)):
+                path = os.path.join(base, day + ".parquet")
+                if os.path.exists(path):
+                    existing = self._read_parquet(path)
+                    part = pd.concat([existing[~existing.index.isin(part.index)], part]).sort_index()
+                # The fetch's attrs (display names, failed chunks) belong in the sidecar, not the file
+                part = part.to_frame()
+                part.attrs = {}
+                tmp = path + ".tmp"
+                part.to_parquet(tmp)
+                os.replace(tmp, path)
+            if os.path.exists(legacy):
+                os.remove(legacy)
+
+            ranges = self.coverage(ref, aggregate, granularity)
+            ranges = merge_ranges(ranges + [(lo, hi) for lo, hi in covered if hi > lo])
+            if self.retention is not None:
+                ranges = self._prune(base, ranges)
+            display = display or self.display(ref, aggregate, granularity)
+            tmp = base + ".json.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"covered": [[lo.isoformat(), hi.isoformat()] for lo, hi in ranges], "display": display}, f)
+            os.replace(tmp, base + ".json")
+
+    def _prune(self, base, ranges):
+        """Delete the day partitions before the retention window and return ``ranges`` clipped to it."""
+        cutoff = (pd.Timestamp.now(tz="UTC") - self.retention).floor("D")
+        for day in self._days(base):
+            if day < _day(cutoff):
+                os.remove(os.path.join(base, day + ".parquet"))
+        cutoff = cutoff.tz_convert(self.tz)
+        return [(max(lo, cutoff), hi) for lo, hi in ranges if hi > cutoff]
+
+    def invalidate(self, refs, aggregate=None, granularity=None):
+        """Forget cached data for ``refs`` (all aggregates/granularities unless given)."""
+        with self._lock:
+            for folder in self._folders(aggregate, granularity):
+                for ref in refs:
+                    base = os.path.join(folder, re.sub(r"[^A-Za-z0-9_.-]", "_", ref.strip("@")))
+                    for path in (base + ".parquet", base + ".json"):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    if os.path.isdir(base):
+                        shutil.rmtree(base)
+
+    def _folders(self, aggregate=None, granularity=None):
+        """The ``<aggregate>/<granularity>`` directories of the cache, optionally only the given ones."""
+        aggregates = [str(aggregate)] if aggregate is not None else os.listdir(self.cache_dir)
+        folders = []
+        for agg in aggregates:
+            top = os.path.join(self.cache_dir, agg)
+            if not os.path.isdir(top):
+                continue
+            granularities = [str(granularity)] if granularity is not None else os.listdir(top)
+            folders.extend(os.path.join(top, gran) for gran in granularities if os.path.isdir(os.path.join(top, gran)))
+        return folders
+
+    def read(self, refs, aggregate, granularity, start_time, end_time, fetch):
+        """Return a frame of ``refs`` over ``[start_time, end_time]``, fetching only gaps.
+
+        Args:
+            refs (list): Refs (with or without a leading ``@``) to read.
+            aggregate (str): hisRead aggregate, part of the cache key.
+            granularity (str): hisRead granularity, part of the cache key.
+            start_time (datetime): Start of the window (naive values are site local time).
+            end_time (datetime): End of the window.
+            fetch (callable): ``fetch(refs, start, end)`` returning a DataFrame with one
+                column per ref id (without ``@``) and a tz-aware datetime index, and the
+                refs' display names in ``attrs['display']`` when known.
+
+        Returns:
+            pd.DataFrame: One column per ref id, indexed by timestamp, with the display
+            names of the refs in ``attrs['display']``.
+        """
+        start, end = _localize(start_time, self.tz), _localize(end_time, self.tz)
+        # Never mark the future (or the last few minutes) as covered: data for it may not have arrived yet.
+        covered_end = min(end, pd.Timestamp.now(tz=self.tz) - self.settle)
+
+        with self._lock:
+            # Group refs sharing the same gaps so each gap is one hisRead for the group.
+            groups = {}
+            for ref in refs:
+                gaps = tuple(missing_ranges(start, end, self.coverage(ref, aggregate, granularity)))
+                if gaps:
+                    groups.setdefault(gaps, []).append(ref)
+        count("cache.hit_refs", len(refs) - sum(len(group) for group in groups.values()))
+
+        # Fetch without holding the lock, so reads of other refs and ranges are not queued behind it
+        for gaps, group in groups.items():
+            for lo, hi in gaps:
+                logger.debug("history cache miss: %d refs %s - %s", len(group), lo, hi)
+                count("cache.miss_ranges")
+                count("cache.miss_refs", len(group))
+                fresh = fetch(group, lo, hi)
+                # Partitioned fetches report chunks that failed; those stay uncovered
+                failed = fresh.attrs.get("failed_chunks", [])
+                display = fresh.attrs.get("display", {})
+                for ref in group:
+                    ref_id = ref.strip("@")
+                    series = fresh[ref_id] if ref_id in fresh.columns else None
+                    holes = [(_localize(a, self.tz), _localize(b, self.tz)) for chunk, a, b in failed if ref in chunk]
+                    covered = missing_ranges(lo, min(hi, covered_end), holes)
+                    # store() merges with what is on disk under the lock
+                    self.store(ref, aggregate, granularity, series, covered, display.get(ref_id))
+
+        with self._lock:
+            columns = [self.load(ref, aggregate, granularity, start, end).loc[start:end] for ref in refs]
+            display = {ref.strip("@"): self.display(ref, aggregate, granularity) for ref in refs}
+
+        if not columns:
+            return pd.DataFrame(index=pd.DatetimeIndex([], tz=self.tz, name="datetime"))
+        frame = pd.concat(columns, axis=1).sort_index()
+        frame.index.name = "datetime"
+        frame.attrs["display"] = {ref: name for ref, name in display.items() if name}
+        return frame
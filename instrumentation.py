@@ -0,0 +1,143 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Timing spans, counters and an on-demand profiler for the data and checks hot paths.
+
+``span("hisread.transfer")`` times a block, ``count("http.bytes", n)`` adds to a
+counter, and ``timed("checks.cop")`` decorates a function. Every finished span
+is aggregated in the process-wide ``METRICS`` registry (shown on the
+Diagnostics page) and emitted as one JSON log line on the ``instrumentation``
+logger at DEBUG level. ``profiled(name)`` runs a block under cProfile, only
+while the profiler is switched on, and keeps the latest report per name.
+"""
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+def configure_logging(level=logging.INFO):
+    """One logging setup for scripts and the app, instead of a basicConfig per module."""
+    logging.basicConfig(level=level, format=LOG_FORMAT, datefmt='%Y-%m-%d %H:%M:%S')
+
+
+class Metrics(object):
+    """Thread-safe span statistics, counters and a ring buffer of recent spans."""
+
+    def __init__(self, recent=500):
+        self._lock = threading.Lock()
+        self.spans = {}
+        self.counters = {}
+        self.recent = deque(maxlen=recent)
+
+    def record(self, name, seconds, fields=None):
+        with self._lock:
+            stats = self.spans.get(name)
+            if stats is None:
+                stats = self.spans[name] = {"count": 0, "total_s": 0.0, "max_s": 0.0, "last_s": 0.0}
+            stats["count"] += 1
+            stats["total_s"] += seconds
+            stats["max_s"] = max(stats["max_s"], seconds)
+            stats["last_s"] = seconds
+            self.recent.append(dict(fields or {}, span=name, seconds=seconds, at=time.time(),
+                                    thread=threading.current_thread().name))
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """Copies of (spans, counters, recent spans) that are safe to read while recording goes on."""
+        with self._lock:
+            return ({name: dict(stats) for name, stats in self.spans.items()}, dict(self.counters),
+                    list(self.recent))
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+            self.recent.clear()
+
+
+METRICS = Metrics()
+
+
+@contextmanager
+def span(name, **fields):
+    """Time the block as span ``name``; ``fields`` (e.g. refs=12) go into the log line."""
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield fields
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        if failed:
+            fields["error"] = True
+        METRICS.record(name, seconds, fields)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(json.dumps(dict(fields, event="span", span=name, ms=round(seconds * 1000, 3)), default=str))
+
+
+def count(name, value=1):
+    """Add ``value`` to counter ``name``."""
+    METRICS.count(name, value)
+
+
+def timed(name):
+    """Decorator running the function inside ``span(name)``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler(object):
+    """Switchable cProfile wrapper; keeps the latest report for each profiled name."""
+
+    def __init__(self, lines=40):
+        self.enabled = False
+        self.lines = lines
+        self.reports = {}
+        # Only one cProfile can be active at a time
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profiled(self, name):
+        if not self.enabled or not self._lock.acquire(blocking=False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+            out = io.StringIO()
+            pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(self.lines)
+            self.reports[name] = (time.time(), out.getvalue())
+        finally:
+            self._lock.release()
+
+
+PROFILER = Profiler()
+
+
+def profiled(name):
+    """Profile the block under ``name`` when ``PROFILER.enabled`` is set, else do nothing."""
+    return PROFILER.profiled(name)
@@ -0,0 +1,373 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Local stand-in for the Carnego login server and the BMOS Haystack API.
+
+Implements what ``getNISEPdata`` talks to: the SCRAM-SHA-256 handshake on
+``/ui`` (as ``HaystackLogin`` sends it), ``/api/info``, ``/refresh_token``,
+``/about``, the ``ref_namespace_map`` action and ``/hisRead`` with
+aggregate/granularity. Point histories are synthetic but deterministic (the
+same ref and minute always give the same value), so caching and refresh
+behaviour can be tested reproducibly and the whole pipeline benchmarked
+offline.
+
+Usage::
+
+    python mock_server.py --sites 12 --points 10 --gap-rate 0.02 --latency 0.2
+    NISEP_BMOS_SERVER=http://127.0.0.1:8765 streamlit run Data_Explorer.py
+
+with ``URL = "http://127.0.0.1:8765"``, ``Username = "nisep"`` and
+``Password = "nisep"`` in the ``[Login]`` section of the Streamlit secrets.
+"""
+import argparse
+import gzip
+import hmac
+import json
+import logging
+import os
+import re
+import threading
+import time
+from base64 import b64decode, b64encode, urlsafe_b64decode, urlsafe_b64encode
+from hashlib import pbkdf2_hmac, sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TIMEZONE = "Europe/London"
+
+# (display name, unit, baseline, daily amplitude, noise) of the synthetic points, in ref map order
+POINT_CATALOGUE = [
+    ("Flow Temperature", "°C", 40.0, 6.0, 0.5),
+    ("Return Temperature", "°C", 35.0, 5.0, 0.5),
+    ("Delta T", "°C", 5.0, 1.0, 0.3),
+    ("Outdoor Temperature", "°C", 8.0, 5.0, 0.3),
+    ("Indoor Temperature", "°C", 20.0, 1.0, 0.2),
+    ("Output Heat Energy", "kWh", 0.0, 0.0, 0.0),
+    ("ASHP Consumption Energy", "kWh", 0.0, 0.0, 0.0),
+    ("ASHP Power", "kW", 1.5, 1.0, 0.2),
+]
+# Energy meters count up from their mean rate (kWh per minute)
+METER_RATES = {"Output Heat Energy": 0.1, "ASHP Consumption Energy": 0.03}
+AGGREGATES = {"max": "max", "min": "min", "average": "mean", "avg": "mean", "mean": "mean", "sum": "sum"}
+GRANULARITIES = {"minute": "min", "hour": "h", "day": "D"}
+
+
+def point_id(display):
+    """Snake_case point id the ref map lists as ``name`` ("Delta T" -> "delta_t").
+
+    hisRead names its columns with the display name instead, like the BMOS server.
+    """
+    return re.sub(r"[^a-z0-9]+", "_", display.lower()).strip("_")
+
+
+def _unit_hash(keys, salt):
+    """Deterministic uniform [0, 1) values from integer keys (vectorized integer hash)."""
+    x = (keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15) + np.uint64(salt * 0xBF58476D1CE4E5B9 % 2 ** 64))
+    x ^= x >> np.uint64(31)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(29)
+    return (x >> np.uint64(11)).astype(np.float64) / float(2 ** 53)
+
+
+def _b64_no_padding(data):
+    return urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def _b64_decode(data):
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class SyntheticFleet(object):
+    """A NISEP-like fleet of sites and points with deterministic minute histories.
+
+    Args:
+        sites (int): Number of sites (NISEP01, NISEP02, ...).
+        points (int): Points per site; beyond the catalogue extra "Sensor N" points are added.
+        gap_rate (float): Fraction of missing samples (single minutes plus whole-hour dropouts).
+        seed (int): Changes every generated value.
+    """
+
+    def __init__(self, sites=10, points=len(POINT_CATALOGUE), gap_rate=0.01, seed=0):
+        self.gap_rate = gap_rate
+        self.seed = seed
+        rows = []
+        for s in range(sites):
+            site = "NISEP%02d" % (s + 1)
+            for p in range(points):
+                if p < len(POINT_CATALOGUE):
+                    dis, unit, base, amplitude, noise = POINT_CATALOGUE[p]
+                else:
+                    dis, unit, base, amplitude, noise = "Sensor %d" % (p - len(POINT_CATALOGUE) + 1), "", 50.0, 10.0, 1.0
+                ref = "@p:nisep:r:%08x" % (s * 4096 + p)
+                rows.append((ref, "yosemite.nisep." + site, "yosemite.nisep.%s.heatpump" % site, point_id(dis), dis,
+                             unit, base, amplitude, noise))
+        self.points = pd.DataFrame(rows, columns=["ref", "siteNamespace", "equipNamespace", "name", "dis", "unit",
+                                                  "base", "amplitude", "noise"])
+        self._index = {ref: i for i, ref in enumerate(self.points["ref"])}
+
+    def ref_map(self):
+        """The ``ref_namespace_map`` grid as the BMOS server returns it (meta line, then CSV)."""
+        frame = self.points[["ref", "siteNamespace", "equipNamespace", "name", "unit"]]
+        return 'ver:"3.0"\n' + frame.to_csv(index=False)
+
+    def minutes(self, refs, start, end):
+        """Minute values of ``refs`` over [start, end) as a frame keyed by ref (NaN = missing)."""
+        index = pd.date_range(start.ceil("min"), end, freq="min", inclusive="left")
+        minute = index.as_unit("s").asi8 // 60
+        phase = 2 * np.pi * ((minute % 1440) / 1440.0)
+        columns = {}
+        for ref in refs:
+            i = self._index[ref]
+            point = self.points.iloc[i]
+            key = minute * 65_537 + i
+            if point["dis"] in METER_RATES:
+                rate = METER_RATES[point["dis"]]
+                # Integral of rate * (1 + 0.5 sin): monotonic, and the same reading for the same minute
+                values = rate * (minute + 0.5 * 1440 / (2 * np.pi) * (1 - np.cos(phase))) + 1000.0 * (i % 7)
+            else:
+                noise = (_unit_hash(key, self.seed + 1) - 0.5) * 2 * point["noise"]
+                values = point["base"] + point["amplitude"] * np.sin(phase - np.pi / 2) + noise
+            missing = _unit_hash(key, self.seed + 2) < self.gap_rate
+            missing |= _unit_hash((minute // 60) * 65_537 + i, self.seed + 3) < self.gap_rate / 10
+            columns[ref] = np.where(missing, np.nan, values)
+        return pd.DataFrame(columns, index=index)
+
+    def his_read(self, refs, start, end, aggregate="max", granularity="minute"):
+        """Zinc hisRead grid text, columns named "Display name (ref)" like the BMOS server."""
+        frame = self.minutes(refs, start, end)
+        freq = GRANULARITIES[granularity]
+        if freq != "min":
+            frame = frame.resample(freq).agg(AGGREGATES[aggregate])
+        names = ["%s (%s)" % (self.points.iloc[self._index[ref]]["dis"], ref.lstrip("@")) for ref in refs]
+        stamps = frame.index.strftime("%Y-%m-%dT%H:%M:%S%z")
+        stamps = stamps.str[:-2] + ":" + stamps.str[-2:] + " London"
+        body = pd.DataFrame(frame.to_numpy(), index=stamps).to_csv(header=False, na_rep="N", float_format="%.3f",
+                                                                   lineterminator="\n")
+        meta = 'ver:"3.0" hisStart:%s hisEnd:%s\n' % (start.isoformat(), end.isoformat())
+        return meta + "ts," + ",".join(names) + "\n" + body
+
+
+class MockHaystackServer(ThreadingHTTPServer):
+    """HTTP server holding the fleet, the SCRAM handshakes and the issued tokens.
+
+    Args:
+        address (tuple): (host, port) to bind; port 0 picks a free one.
+        fleet (SyntheticFleet): Data source.
+        username, password (str): The one accepted account.
+        latency (float): Seconds slept before answering each API request.
+        token_ttl (float): Seconds before a bearer token is rejected with 401 (None = never).
+        iterations (int): PBKDF2 iterations announced in the SCRAM handshake.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, fleet, username="nisep", password="nisep", latency=0.0, token_ttl=None,
+                 iterations=10000):
+        super().__init__(address, MockHaystackHandler)
+        self.fleet = fleet
+        self.username = username
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.iterations = iterations
+        self.salt = sha256(("salt:" + username).encode()).digest()[:16]
+        self.salted_password = pbkdf2_hmac("sha256", password.encode(), self.salt, iterations)
+        self.handshakes = {}
+        self.tokens = {}
+        self.stats = {"logins": 0, "his_reads": 0, "rows": 0, "bytes": 0}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def issue_token(self):
+        token = _b64_no_padding(os.urandom(24))
+        with self.lock:
+            self.tokens[token] = time.time()
+        return token
+
+    def token_valid(self, token):
+        with self.lock:
+            issued = self.tokens.get(token)
+        if issued is None:
+            return False
+        return self.token_ttl is None or time.time() - issued < self.token_ttl
+
+
+class MockHaystackHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    # --- responses ---
+    def _send(self, status, body=b"", content_type="text/plain; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if body and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            headers = dict(headers or {}, **{"Content-Encoding": "gzip"})
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.stats["bytes"] += len(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length).decode("utf-8") if length else ""
+
+    def _authorized(self):
+        match = re.match(r"\s*bearer\s+authToken=(\S+)", self.headers.get("Authorization", ""), re.I)
+        if match and self.server.token_valid(match.group(1)):
+            return True
+        self._send(401, "invalid or expired token")
+        return False
+
+    def _latency(self):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    # --- routing ---
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/ui":
+            return self._scram()
+        self._read_body()
+        if path == "/api/info":
+            if self._authorized():
+                self._latency()
+                info = {"username": self.server.username, "attributes": {"siteGroupNamespace": "yosemite.nisep"}}
+                self._send(200, json.dumps(info), "application/json")
+            return
+        self._send(404, "not found")
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        body = self._read_body()
+        if path not in ("/about", "/refresh_token", "/action", "/hisRead"):
+            return self._send(404, "not found")
+        if not self._authorized():
+            return
+        self._latency()
+        if path == "/about":
+            self._send(200, 'ver:"3.0"\nproductName,productVersion\n"mock_server","1.0"\n')
+        elif path == "/refresh_token":
+            self._send(200, "", headers={"authentication-info": "authToken=%s" % self.server.issue_token()})
+        elif path == "/action":
+            if 'ref_namespace_map' not in body:
+                return self._send(200, 'ver:"3.0" err dis:"unknown action"\nempty\n')
+            self._send(200, self.server.fleet.ref_map())
+        else:
+            self._his_read(body)
+
+    # --- SCRAM-SHA-256, as HaystackLogin speaks it ---
+    def _scram(self):
+        auth = self.headers.get("Authorization", "")
+        scheme, _, params = auth.partition(" ")
+        fields = dict(part.strip().split("=", 1) for part in params.split(",") if "=" in part)
+        if scheme.upper() == "HELLO":
+            token = _b64_no_padding(os.urandom(12))
+            self.server.handshakes[token] = {"user": _b64_decode(fields.get("username", "")).decode()}
+            return self._send(401, headers={"WWW-Authenticate": "SCRAM hash=SHA-256, handshakeToken=%s" % token})
+        state = self.server.handshakes.get(fields.get("handshakeToken"))
+        if scheme.upper() != "SCRAM" or state is None or "data" not in fields:
+            return self._send(400, "bad handshake")
+        message = _b64_decode(fields["data"]).decode()
+        if "client_bare" not in state:
+            # client-first-message: "n,,n=user,r=nonce"
+            state["client_bare"] = message[3:]
+            client_nonce = message.split("r=", 1)[1]
+            state["nonce"] = client_nonce + _b64_no_padding(os.urandom(18))
+            state["server_first"] = "r=%s,s=%s,i=%d" % (state["nonce"], b64encode(self.server.salt).decode(),
+                                                         self.server.iterations)
+            data = urlsafe_b64encode(state["server_first"].encode()).decode()
+            return self._send(401, headers={"WWW-Authenticate": "SCRAM handshakeToken=%s, hash=SHA-256, data=%s"
+                                                                % (fields["handshakeToken"], data)})
+        # client-final-message: "c=biws,r=nonce,p=proof"
+        self.server.handshakes.pop(fields["handshakeToken"], None)
+        without_proof, _, proof = message.rpartition(",p=")
+        if state["user"] != self.server.username or without_proof.split("r=", 1)[-1] != state["nonce"]:
+            return self._send(403, "authentication failed")
+        auth_message = ",".join([state["client_bare"], state["server_first"], without_proof]).encode()
+        client_key = hmac.new(self.server.salted_password, b"Client Key", sha256).digest()
+        stored_key = sha256(client_key).digest()
+        signature = hmac.new(stored_key, auth_message, sha256).digest()
+        # The client drops leading zero bytes of the proof, so compare as integers
+        received = int.from_bytes(b64decode(proof.strip()), "big")
+        recovered = (received ^ int.from_bytes(signature, "big")).to_bytes(32, "big")
+        if sha256(recovered).digest() != stored_key:
+            return self._send(403, "authentication failed")
+        with self.server.lock:
+            self.server.stats["logins"] += 1
+        server_key = hmac.new(self.server.salted_password, b"Server Key", sha256).digest()
+        server_signature = b64encode(hmac.new(server_key, auth_message, sha256).digest()).decode()
+        info = "authToken=%s, hash=SHA-256, data=%s" % (
+            self.server.issue_token(), _b64_no_padding(("v=" + server_signature).encode()))
+        self._send(200, headers={"authentication-info": info})
+
+    # --- hisRead ---
+    def _his_read(self, body):
+        lines = [line for line in body.splitlines() if line.strip()]
+        meta = dict(re.findall(r'(\w+):"([^"]*)"', lines[0])) if lines else {}
+        match = re.match(r'\s*\[?([^\]]*)\]?\s*,\s*"([^"]+)"', lines[2]) if len(lines) > 2 else None
+        aggregate, granularity = meta.get("aggregate", "max"), meta.get("granularity", "minute")
+        if match is None or aggregate not in AGGREGATES or granularity not in GRANULARITIES:
+            return self._send(200, 'ver:"3.0" err dis:"bad hisRead request"\nempty\n')
+        refs = [ref.strip() for ref in match.group(1).split(",") if ref.strip()]
+        unknown = [ref for ref in refs if ref not in self.server.fleet._index]
+        if unknown:
+            return self._send(200, 'ver:"3.0" err dis:"unknown refs %s"\nempty\n' % " ".join(unknown))
+        start, end = [pd.Timestamp(part).tz_localize(TIMEZONE) for part in match.group(2).split(",")]
+        grid = self.server.fleet.his_read(refs, start, end, aggregate, granularity)
+        with self.server.lock:
+            self.server.stats["his_reads"] += 1
+            self.server.stats["rows"] += grid.count("\n") - 2
+        self._send(200, grid)
+
+
+def serve_in_thread(sites=10, points=len(POINT_CATALOGUE), gap_rate=0.01, latency=0.0, host="127.0.0.1", port=0,
+                    **kwargs):
+    """Start a MockHaystackServer on a daemon thread and return it (``server.url``, ``server.shutdown()``)."""
+    fleet = SyntheticFleet(sites=sites, points=points, gap_rate=gap_rate, seed=kwargs.pop("seed", 0))
+    server = MockHaystackServer((host, port), fleet, latency=latency, **kwargs)
+    threading.Thread(target=server.serve_forever, name="mock-haystack", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local mock of the Carnego/BMOS Haystack API with synthetic NISEP data.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sites", type=int, default=10, help="number of sites")
+    parser.add_argument("--points", type=int, default=len(POINT_CATALOGUE), help="points per site")
+    parser.add_argument("--gap-rate", type=float, default=0.01, help="fraction of missing samples")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    parser.add_argument("--token-ttl", type=float, default=None, help="seconds before tokens expire")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--username", default="nisep")
+    parser.add_argument("--password", default="nisep")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    fleet = SyntheticFleet(sites=args.sites, points=args.points, gap_rate=args.gap_rate, seed=args.seed)
+    server = MockHaystackServer((args.host, args.port), fleet, username=args.username, password=args.password,
+                                latency=args.latency, token_ttl=args.token_ttl)
+    logger.info("Serving %d points on %s (set NISEP_BMOS_SERVER=%s)", len(fleet.points), server.url, server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Incremental evaluation of the Checks page as new minute data arrives.
+
+``OnlineChecks`` is fed the successive snapshots of the same rolling frame
+(see ``refresher``). It keeps running state per point and, on each update,
+only consumes the rows the new snapshot appended:
+
+- valid-sample prefix counts (missing data, completeness heatmaps)
+- violation prefix counts per bounds setting (bounds checks)
+- the valid readings of the energy meters as corrected counters (COP windows)
+
+Rows older than the snapshot's start are dropped from the front; the last
+``settle`` of the previous snapshot is re-read, as the history cache refetches
+that part. Queries give the same results as ``checks_functions`` on the full
+frame (COP up to floating point rounding of the meter sums), at a cost
+proportional to the new rows plus the size of the answer.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from checks_functions import (bounds_positions, bounds_vectors, bounds_window, check_bounds, corrected_counters,
+                              cop_windows, daily_cop, meter_pairs, split_violations, _cop, _london_index)
+from column_model import column_keys
+from completeness import Completeness
+from instrumentation import count, timed
+from periods import period_starts
+
+# Bounds settings whose violation counts are kept (one per distinct set of page inputs)
+MAX_BOUNDS_STATES = 8
+
+
+class _Rows(object):
+    """Growable (rows x width) array: amortized O(1) appends, truncation and front drops.
+
+    Rows are only rewritten after ``truncate``; callers serialize access.
+    """
+
+    def __init__(self, width, dtype):
+        self.data = np.empty((64, width), dtype=dtype)
+        self.start = 0
+        self.end = 0
+
+    def __len__(self):
+        return self.end - self.start
+
+    def view(self):
+        return self.data[self.start:self.end]
+
+    def last(self):
+        return self.data[self.end - 1]
+
+    def append(self, block):
+        if self.end + len(block) > len(self.data):
+            live = self.view()
+            data = np.empty((max(64, 2 * (len(live) + len(block))), self.data.shape[1]), dtype=self.data.dtype)
+            data[:len(live)] = live
+            self.data, self.start, self.end = data, 0, len(live)
+        self.data[self.end:self.end + len(block)] = block
+        self.end += len(block)
+
+    def truncate(self, length):
+        self.end = self.start + min(length, len(self))
+
+    def drop_front(self, n):
+        self.start = min(self.start + n, self.end)
+
+
+class _PrefixCounts(object):
+    """Running ``cumsum`` of a boolean (rows x columns) mask, with a leading row: ``len(index) + 1`` rows."""
+
+    def __init__(self, width):
+        self.rows = _Rows(width, np.int32)
+        self.rows.append(np.zeros((1, width), dtype=np.int32))
+
+    def __len__(self):
+        return len(self.rows) - 1
+
+    def view(self):
+        return self.rows.view()
+
+    def append(self, mask):
+        self.rows.append(self.rows.last() + np.cumsum(mask, axis=0, dtype=np.int32))
+
+    def truncate(self, length):
+        self.rows.truncate(length + 1)
+
+    def drop_front(self, n):
+        self.rows.drop_front(n)
+
+
+class _Meters(object):
+    """Valid readings of the energy meters as (raw, corrected counter) pairs, one list per meter."""
+
+    def __init__(self, frame, rollover=None):
+        pairs = meter_pairs(frame)
+        self.rollover = rollover
+        self.sites = [site for site, _, _ in pairs]
+        self.columns = [heat for _, heat, _ in pairs] + [consumption for _, _, consumption in pairs]
+        self.counts = _PrefixCounts(len(self.columns))
+        self.readings = [_Rows(2, np.float64) for _ in self.columns]
+
+    def truncate(self, length):
+        self.counts.truncate(length)
+        first = self.counts.view()[0]
+        last = self.counts.view()[-1]
+        for readings, n in zip(self.readings, last - first):
+            readings.truncate(n)
+
+    def drop_front(self, n):
+        first = self.counts.view()[0]
+        self.counts.drop_front(n)
+        for readings, dropped in zip(self.readings, self.counts.view()[0] - first):
+            readings.drop_front(dropped)
+
+    def consume(self, frame, start):
+        if not self.columns:
+            self.counts.append(np.zeros((len(frame) - start, 0), dtype=bool))
+            return
+        values = frame[self.columns].iloc[start:].to_numpy(dtype=float)
+        previous = np.array([readings.last() if len(readings) else (np.nan, 0.0) for readings in self.readings])
+        # Continue the counters from the last valid reading of each meter
+        counters = corrected_counters(np.vstack([previous[:, 0], values]), self.rollover)[1:] + previous[:, 1]
+        valid = ~np.isnan(values)
+        self.counts.append(valid)
+        for j, readings in enumerate(self.readings):
+            rows = valid[:, j]
+            readings.append(np.column_stack([values[rows, j], counters[rows, j]]))
+
+    def deltas(self, a, b):
+        """(windows x meters) last minus first valid counter in rows [a, b), NaN with fewer than two readings."""
+        counts = self.counts.view()
+        first, end = counts[a] - counts[0], counts[b] - counts[0]
+        deltas = np.full((len(a), len(self.readings)), np.nan)
+        for j, readings in enumerate(self.readings):
+            enough = end[:, j] - first[:, j] >= 2
+            if enough.any():
+                counters = readings.view()[:, 1]
+                deltas[enough, j] = counters[end[enough, j] - 1] - counters[first[enough, j]]
+        return deltas
+
+
+class _Bounds(object):
+    """Violation prefix counts of the bounds-checked columns for one bounds setting."""
+
+    def __init__(self, frame, positions, bounds):
+        keys = column_keys(frame)
+        self.positions = positions
+        self.min_values, self.max_values = bounds_vectors([keys[pos][0] for pos in positions], bounds)
+        self.counts = _PrefixCounts(len(positions))
+
+    def consume(self, frame):
+        values = frame.iloc[len(self.counts):, self.positions].to_numpy(dtype=float)
+        self.counts.append((values < self.min_values) | (values > self.max_values))
+
+
+class OnlineChecks(object):
+    """Running check state for successive snapshots of one rolling frame.
+
+    Args:
+        settle (str): Trailing part of the previous snapshot that is re-read on update.
+        rollover (float): Meter wrap value, see ``corrected_counters``.
+        zero_is_missing (bool): As in ``Completeness``.
+    """
+
+    def __init__(self, settle="15min", rollover=None, zero_is_missing=True):
+        self.settle = pd.Timedelta(settle)
+        self.rollover = rollover
+        self.zero_is_missing = zero_is_missing
+        self.lock = threading.RLock()
+        self.frame = None
+        self._index = None
+        self._valid = None
+        self._meters = None
+        self._bounds = OrderedDict()
+        self._bounds_positions = None
+
+    def _reset(self, frame):
+        self._valid = _PrefixCounts(frame.shape[1])
+        self._meters = _Meters(frame, self.rollover)
+        self._bounds = OrderedDict()
+        self._bounds_positions = bounds_positions(column_keys(frame))
+
+    def _kept_rows(self, frame, index):
+        """Rows at the front of ``frame`` already consumed, and the previous rows to drop; None to start over."""
+        previous = self._index
+        if (self._valid is None or len(previous) == 0 or len(index) == 0 or not index.is_monotonic_increasing
+                or not frame.columns.equals(self.frame.columns)):
+            return None
+        drop = previous.searchsorted(index[0], "left")
+        if drop == len(previous) or previous[drop] != index[0]:
+            return None
+        cut_time = previous[-1] - self.settle
+        cut = max(previous.searchsorted(cut_time, "left"), drop)
+        kept = cut - drop
+        if index.searchsorted(cut_time, "left") < kept or (kept and index[kept - 1] != previous[cut - 1]):
+            return None
+        return kept, drop
+
+    @timed("online_checks.update")
+    def update(self, frame):
+        """Bring the state up to date with ``frame``, the latest snapshot. Returns the number of rows consumed."""
+        with self.lock:
+            if frame is self.frame:
+                return 0
+            index = pd.DatetimeIndex(frame.index)
+            kept_rows = self._kept_rows(frame, index)
+            if kept_rows is None:
+                kept, drop = 0, 0
+                count("online_checks.resets")
+                self._reset(frame)
+            else:
+                kept, drop = kept_rows
+                for state in [self._valid, self._meters]:
+                    state.truncate(drop + kept)
+                    state.drop_front(drop)
+                for key, bounds in list(self._bounds.items()):
+                    if len(bounds.counts) < drop:
+                        del self._bounds[key]
+                    else:
+                        bounds.counts.truncate(drop + kept)
+                        bounds.counts.drop_front(drop)
+
+            self.frame = frame
+            self._index = index
+            self._london = _london_index(frame)
+            if not index.is_monotonic_increasing:
+                # Unsorted frames are answered by the full recompute
+                self._valid = None
+                return len(frame)
+            values = frame.iloc[kept:].to_numpy(dtype=float)
+            valid = ~np.isnan(values)
+            if self.zero_is_missing:
+                valid &= values != 0
+            self._valid.append(valid)
+            self._meters.consume(frame, kept)
+            count("online_checks.rows", int(len(frame) - kept))
+            return len(frame) - kept
+
+    def _bounds_state(self, bounds):
+        key = tuple(sorted((name, limits["min"], limits["max"]) for name, limits in bounds.items()))
+        state = self._bounds.get(key)
+        if state is None:
+            state = self._bounds[key] = _Bounds(self.frame, self._bounds_positions, bounds)
+            while len(self._bounds) > MAX_BOUNDS_STATES:
+                self._bounds.popitem(last=False)
+        self._bounds.move_to_end(key)
+        state.consume(self.frame)
+        return state
+
+    # --- Queries, same results as the checks_functions equivalents on the latest frame ---
+
+    def check_bounds(self, start_time, end_time, bounds, site_names, subsample_freq='10min'):
+        """Same as ``checks_functions.check_bounds`` on the latest frame."""
+        with self.lock:
+            if self._valid is None:
+                return check_bounds(self.frame, start_time, end_time, bounds, site_names, subsample_freq)
+            result = {site_name: {"out_of_bounds": pd.DataFrame(), "within_bounds": pd.DataFrame(),
+                                  "mask": pd.DataFrame()} for site_name in site_names}
+            state = self._bounds_state(bounds)
+            counts = state.counts.view()
+            a = self._london.searchsorted(start_time, "left")
+            b = max(self._london.searchsorted(end_time, "right"), a)
+            keys = column_keys(self.frame)
+            violating = [j for j in np.flatnonzero(counts[b] - counts[a] > 0)
+                         if keys[state.positions[j]][1] in result]
+            if not violating:
+                return result
+            values = self.frame.iloc[a:b, [state.positions[j] for j in violating]].to_numpy(dtype=float)
+            mask = (values < state.min_values[violating]) | (values > state.max_values[violating])
+            violating_positions = [state.positions[j] for j in violating]
+            return split_violations(result, self._london[a:b], values, mask, self.frame.columns[violating_positions],
+                                    [keys[pos][1] for pos in violating_positions], subsample_freq)
+
+    def process_temperature_and_delta_t_data(self, past_days, bounds, site_names, subsample_freq='10min'):
+        """Same as ``checks_functions.process_temperature_and_delta_t_data`` on the latest frame."""
+        start_time, end_time = bounds_window(past_days)
+        return self.check_bounds(start_time, end_time, bounds, site_names, subsample_freq)
+
+    def _completeness(self):
+        if self._valid is None:
+            return Completeness(self.frame, self.zero_is_missing)
+        return Completeness.from_counts(self.frame.columns, self._index, self._valid.view())
+
+    def missing_percentage(self, windows):
+        """Same as ``Completeness(frame).missing_percentage``; lets ``missing_data_by_site`` take this object."""
+        with self.lock:
+            return self._completeness().missing_percentage(windows)
+
+    def site_heatmap(self, freq="D"):
+        """Same as ``Completeness(frame).site_heatmap``."""
+        with self.lock:
+            return self._completeness().site_heatmap(freq)
+
+    def cop_windows(self, windows):
+        """Same as ``checks_functions.cop_windows`` on the latest frame."""
+        with self.lock:
+            if self._valid is None:
+                return cop_windows(self.frame, windows, self.rollover)
+            names = list(windows)
+            starts = pd.DatetimeIndex([pd.Timestamp(windows[name][0]) for name in names])
+            ends = pd.DatetimeIndex([pd.Timestamp(windows[name][1]) for name in names])
+            if starts.tz is None:
+                starts, ends = starts.tz_localize("Europe/London"), ends.tz_localize("Europe/London")
+            deltas = self._meters.deltas(self._london.searchsorted(starts, "left"),
+                                         self._london.searchsorted(ends, "right"))
+            n = len(self._meters.sites)
+            return _cop_frames(deltas[:, :n].T, deltas[:, n:].T, self._meters.sites, names)
+
+    def cop_summary(self, windows):
+        """Same as ``checks_functions.cop_summary`` on the latest frame."""
+        return tuple(df.dropna(how="all") for df in self.cop_windows(windows))
+
+    def daily_cop(self, freq='D'):
+        """Same as ``checks_functions.daily_cop`` on the latest frame."""
+        with self.lock:
+            if self._valid is None or len(self._london) == 0:
+                return daily_cop(self.frame, freq, self.rollover)
+            starts = period_starts(self._london[0], self._london[-1], freq)
+            ends = starts + pd.tseries.frequencies.to_offset(freq)
+            deltas = self._meters.deltas(self._london.searchsorted(starts, "left"),
+                                         self._london.searchsorted(ends, "left"))
+            n = len(self._meters.sites)
+            return _cop_frames(deltas[:, :n], deltas[:, n:], starts, self._meters.sites)
+
+
+def _cop_frames(heat, consumption, index, columns):
+    heat_diff = pd.DataFrame(heat, index=index, columns=columns)
+    consumption_diff = pd.DataFrame(consumption, index=index, columns=columns)
+    cop = pd.DataFrame(_cop(heat, consumption), index=index, columns=columns)
+    return cop, heat_diff, consumption_diff
+
+
+_checks = {}
+_checks_lock = threading.Lock()
+
+
+def shared_checks(name, settle="15min"):
+    """Return the process-wide OnlineChecks for the snapshots of the refresher called ``name``."""
+    with _checks_lock:
+        if name not in _checks:
+            _checks[name] = OnlineChecks(settle=settle)
+        return _checks[name]
@@ -1,10 +1,15 @@
 import streamlit as st
-from getNISEPdata import getTimeseries, getLookup
-from checks_functions import process_temperature_and_delta_t_data, calculate_cop
-from datetime import datetime, timedelta
+from instrumentation import configure_logging
+from getNISEPdata import get_token_manager
+from history_cache import HistoryCache
+from refresher import shared_refresher
+from checks_functions import (check_windows, missing_data_by_site, process_sensor_fault_data, cycling_analysis,
+                             DEFAULT_BOUNDS, FAULT_DETECTORS)
+from online_checks import shared_checks
+from plotting import make_trace, series_trace
+from datetime import datetime
 import plotly.graph_objects as go
 import pandas as pd
-import re
 import pytz
 
 # Page layout configuration
@@ -14,22 +19,92 @@ st.set_page_config(
     layout="wide"
 )
 st.logo('logo.svg', size='large')
+configure_logging()
+
+# Width of the two-column check charts, used to decimate their traces
+CHECK_CHART_WIDTH_PX = 800
+# How often the background refresher pulls new data
+REFRESH_INTERVAL_S = 15 * 60
+# Keep sensor data as float32 (must match Data_Explorer so both pages share one refresher)
+COMPACT = True
+# Longest wait for the first snapshot before showing an error instead of the spinner
+SNAPSHOT_TIMEOUT_S = 5 * 60
+# Days of point history kept in the on-disk cache; older day partitions are deleted
+HISTORY_RETENTION = "400D"
+# Cycling above this many starts per hour, or off times below this many minutes, is short-cycling
+MAX_STARTS_PER_HOUR = 3
+MIN_OFF_TIME_MIN = 10
 
 # --- Authentication & Data Fetching ---
 auth_url = st.secrets.get("Login", {}).get("URL", "https://users.carnego.net")
 username = st.secrets.get("Login", {}).get("Username", "")
 password = st.secrets.get("Login", {}).get("Password", "")
 
-@st.cache_resource(ttl="1d")
-def cache_nisep():
-    """Fetch lookup data and timeseries data, caching the results for one day."""
-    lookup_df = getLookup(auth_url, username, password)
-    end_time = datetime(*datetime.now().timetuple()[:3])
-    start_time = end_time - timedelta(days=30)
-    timeseries_df = getTimeseries(end_time, start_time, None, None, auth_url, username, password)
-    return lookup_df.siteNamespace.unique(), timeseries_df
+# Point histories already downloaded are kept on disk; only gaps are fetched
+history_cache = HistoryCache(".cache/history", retention=HISTORY_RETENTION)
+# Reuse the bearer token across reruns and restarts instead of logging in per fetch
+get_token_manager(auth_url, username, password, cache_path=".cache/token.json")
+
+# A background thread keeps the last 30 days fresh for every session; pages only read its snapshot
+refresher = shared_refresher(auth_url, username, password, days=30, interval=REFRESH_INTERVAL_S, cache=history_cache,
+                             compact=COMPACT)
+with st.spinner("Loading NISEP data..."):
+    try:
+        snapshot = refresher.latest(SNAPSHOT_TIMEOUT_S)
+    except Exception as e:
+        st.error(f"Could not load NISEP data: {e}")
+        st.stop()
+all_sites, st.session_state.nisep_df = snapshot.sites, snapshot.frame
+# Running check state shared by all sessions: only rows added since the last snapshot are evaluated
+checks = shared_checks(refresher.name)
+checks.update(snapshot.frame)
+
+
+
+def site_check_charts(results, flagged_name, yaxis_title="Temperature [°C]", only_flagged=False):
+    """Two columns of per-site charts: decimated lines plus every flagged point in red."""
+    if only_flagged:
+        results = {site: site_data for site, site_data in results.items() if not site_data["out_of_bounds"].empty}
+    site_columns = st.columns(2)
+    for idx, (site, site_data) in enumerate(results.items()):
+        col = site_columns[idx % 2]
+        with col:
+            fig = go.Figure()
+            # Lines are decimated to the half-width chart; every flagged point is kept (WebGL when many)
+            if not site_data["within_bounds"].empty:
+                for column in site_data["within_bounds"].columns:
+                    fig.add_trace(series_trace(
+                        site_data["within_bounds"][column], width_px=CHECK_CHART_WIDTH_PX,
+                        mode="lines", name=f"{column}", line=dict(color='blue'), showlegend=False
+                    ))
+            if not site_data["out_of_bounds"].empty:
+                for column in site_data["out_of_bounds"].columns:
+                    points = site_data["out_of_bounds"][column].dropna()
+                    fig.add_trace(make_trace(
+                        points.index, points.values,
+                        mode="markers", name=f"{column} ({flagged_name})", marker=dict(color='red', size=4), showlegend=False
+                    ))
+            fig.update_layout(
+                title=f"Site: {site}",
+                xaxis=dict(title="Datetime"),
+                yaxis_title=yaxis_title,
+                template="plotly_white",
+                legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
+            )
+            st.plotly_chart(fig, use_container_width=True)
+
+
+@st.cache_resource(max_entries=8)
+def sensor_faults(fetched_at, _frame, sites, past_days, detector, params):
+    # One detector run per snapshot and settings, shared by all sessions
+    return process_sensor_fault_data(_frame, past_days, list(sites), detector, **dict(params))
+
+
+@st.cache_resource(max_entries=2)
+def daily_cycling(fetched_at, _frame):
+    # Per site and day: starts per hour, mean run length and minimum off time
+    return cycling_analysis(_frame)
 
-all_sites, st.session_state.nisep_df = cache_nisep()
 
 # --- Temperature Checks ---
 with st.expander("⚙️ Temperature Checks", expanded=False):
@@ -38,23 +113,23 @@ with st.expander("⚙️ Temperature Checks", expanded=False):
 
     with col1:
         st.subheader("Flow/Return")
-        flow_return_min = st.number_input("Min", value=10)
-        flow_return_max = st.number_input("Max", value=70)
+        flow_return_min = st.number_input("Min", value=DEFAULT_BOUNDS["Flow/Return"]["min"])
+        flow_return_max = st.number_input("Max", value=DEFAULT_BOUNDS["Flow/Return"]["max"])
 
     with col2:
         st.subheader("Outdoor")
-        outdoor_min = st.number_input("Min", value=-10)
-        outdoor_max = st.number_input("Max", value=30)
+        outdoor_min = st.number_input("Min", value=DEFAULT_BOUNDS["Outdoor"]["min"])
+        outdoor_max = st.number_input("Max", value=DEFAULT_BOUNDS["Outdoor"]["max"])
 
     with col3:
         st.subheader("Indoor")
-        indoor_min = st.number_input("Min", value=15)
-        indoor_max = st.number_input("Max", value=26)
+        indoor_min = st.number_input("Min", value=DEFAULT_BOUNDS["Indoor"]["min"])
+        indoor_max = st.number_input("Max", value=DEFAULT_BOUNDS["Indoor"]["max"])
 
     with col4:
         st.subheader("Delta T")
-        delta_t_min = st.number_input("Min", value=-10,key='delta_t_min')
-        delta_t_max = st.number_input("Max", value=10,key='delta_t_max')
+        delta_t_min = st.number_input("Min", value=DEFAULT_BOUNDS["Delta T"]["min"],key='delta_t_min')
+        delta_t_max = st.number_input("Max", value=DEFAULT_BOUNDS["Delta T"]["max"],key='delta_t_max')
 
     bounds = {
         "Flow/Return": {"min": flow_return_min, "max": flow_return_max},
@@ -63,64 +138,40 @@ with st.expander("⚙️ Temperature Checks", expanded=False):
         "Delta T": {"min": delta_t_min, "max": delta_t_max},
     }
 
-    filtered_data = process_temperature_and_delta_t_data(st.session_state.nisep_df, past_days, bounds, all_sites)
+    filtered_data = checks.process_temperature_and_delta_t_data(past_days, bounds, all_sites)
+    site_check_charts(filtered_data, "out of bounds")
 
-    site_columns = st.columns(2)
-    for idx, (site, site_data) in enumerate(filtered_data.items()):
-        col = site_columns[idx % 2]
-        with col:
-            fig = go.Figure()
-            for key, color in [("within_bounds", 'blue'), ("out_of_bounds", 'red')]:
-                if key in site_data and not site_data[key].empty:
-                    for column in site_data[key].columns:
-                        fig.add_trace(go.Scatter(
-                            x=site_data[key].index, y=site_data[key][column],
-                            mode="lines" if key == "within_bounds" else "markers",
-                            name=f"{column} ({key.replace('_', ' ')})",
-                            line=dict(color=color) if key == "within_bounds" else None,
-                            marker=dict(color=color, size=4) if key == "out_of_bounds" else None,
-                            showlegend=False
-                        ))
-            fig.update_layout(
-                title=f"Site: {site}",
-                xaxis=dict(title="Datetime"),
-                yaxis_title="Temperature [°C]",
-                template="plotly_white",
-                legend=dict(orientation="h", yanchor="bottom", y=-0.2, xanchor="center", x=0.5)
-            )
-            st.plotly_chart(fig, use_container_width=True)
+# --- Sensor Fault Checks ---
+with st.expander("🔎 Sensor Fault Checks", expanded=False):
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        detector = st.selectbox("Detector", list(FAULT_DETECTORS))
+        fault_days = st.number_input("Days Displayed", 1, 30, 2, key="fault_days")
+    with col2:
+        # One input per parameter of the chosen detector, starting from its defaults
+        params = {}
+        for col, (name, default) in zip(st.columns(len(FAULT_DETECTORS[detector])), FAULT_DETECTORS[detector].items()):
+            with col:
+                label = name.replace("_", " ").capitalize()
+                if isinstance(default, str):
+                    params[name] = st.text_input(label, default, key=f"{detector}_{name}")
+                else:
+                    params[name] = st.number_input(label, value=default, key=f"{detector}_{name}")
 
-# --- Missing Data Analysis ---
-def calculate_missing_data_percentage(data):
-    """Calculate percentage of missing data for each column."""
-    return (data.isna().sum() / len(data)) * 100
+    fault_data = sensor_faults(snapshot.fetched_at, snapshot.frame, tuple(all_sites), fault_days, detector,
+                               tuple(params.items()))
+    if all(site_data["out_of_bounds"].empty for site_data in fault_data.values()):
+        st.info(f"No {detector.lower()} faults in the last {fault_days} days.")
+    site_check_charts(fault_data, detector.lower(), only_flagged=True)
 
+# --- Missing Data Analysis ---
 uk_tz = pytz.timezone("Europe/London")
 end_time = datetime.now(uk_tz)
+windows = check_windows(end_time)
 
-intervals = {
-    "Daily": end_time - timedelta(days=1),
-    "Weekly": end_time - timedelta(days=7),
-    "Monthly": end_time - timedelta(days=30),
-}
-
-missing_data_df = pd.DataFrame({
-    interval: st.session_state.nisep_df.loc[start:end_time].replace(0, pd.NA).apply(calculate_missing_data_percentage)
-    for interval, start in intervals.items()
-}).fillna(0)
-
-site_groups = {}
-for row_name in missing_data_df.index:
-    match = re.search(r"\((NISEP\d{2})\)", row_name)
-    if match:
-        site_id = match.group(1)
-        site_groups.setdefault(site_id, {})[row_name] = missing_data_df.loc[row_name]
-
-# Transpose, remove rows where all values are ≤ 1, and round to 1 decimal
-site_groups = {
-    k: pd.DataFrame(v).T.loc[~(pd.DataFrame(v).T.le(1).all(axis=1))].round(1)
-    for k, v in site_groups.items()
-}
+# Running validity prefix sums; zeros count as missing
+# Per site, rows where all values are ≤ 1 removed, rounded to 1 decimal
+site_groups = missing_data_by_site(checks, windows)
 with st.expander("📊 Missing Data Analysis by Site"):
     col1, col2 = st.columns(2)
     for idx, (site_id, df) in enumerate(site_groups.items()):
@@ -129,36 +180,20 @@ with st.expander("📊 Missing Data Analysis by Site"):
             st.subheader(f"📍 Site: {site_id}")
             st.dataframe(df_display.style.applymap(lambda v: 'background-color: red' if float(v) > 30 else ''), height=350)
 
-# --- COP Analysis ---
+    st.subheader("🗓️ Daily Completeness by Site [%]")
+    daily_completeness = checks.site_heatmap("D")
+    fig = go.Figure(go.Heatmap(
+        z=daily_completeness.T.values, x=daily_completeness.index, y=daily_completeness.columns,
+        zmin=0, zmax=100, colorscale="RdYlGn"
+    ))
+    fig.update_layout(template="plotly_white", height=max(300, 25 * len(daily_completeness.columns)))
+    st.plotly_chart(fig, use_container_width=True)
 
-def get_sliced_data(df, interval):
-    """Extract data for given interval and resample appropriately, ignoring NaNs."""
-    sliced_df = df.loc[intervals[interval]:end_time]
-    return sliced_df.resample('D' if interval in ["Monthly", "Weekly"] else 'H').agg(lambda x: x.dropna().max())
+# --- COP Analysis ---
 
 with st.expander("⚡ COP Analysis", expanded=False): 
-    cop_data = pd.DataFrame()
-    heat_diff_data = pd.DataFrame()
-    consumption_diff_data = pd.DataFrame()
-
-    for interval in intervals.keys():
-        # Get the sliced data for the current interval
-        interval_df = get_sliced_data(st.session_state.nisep_df, interval)
-        
-        # Calculate the COP, heat difference, and consumption difference for the current interval
-        interval_cop, interval_heat_diff, interval_consumption_diff = calculate_cop(interval_df)
-        # Renaming the columns to match the interval (adding the interval as a column name)
-        interval_cop.rename(columns={interval_cop.columns[0]: interval}, inplace=True)
-        interval_heat_diff.rename(columns={interval_heat_diff.columns[0]: interval}, inplace=True)
-        interval_consumption_diff.rename(columns={interval_consumption_diff.columns[0]: interval}, inplace=True)
-
-        # Merge with the existing data, if not empty, otherwise just assign the new data
-        if not interval_cop.empty:
-            cop_data = cop_data.merge(interval_cop, left_index=True, right_index=True, how="outer") if not cop_data.empty else interval_cop
-        if not interval_heat_diff.empty:
-            heat_diff_data = heat_diff_data.merge(interval_heat_diff, left_index=True, right_index=True, how="outer") if not heat_diff_data.empty else interval_heat_diff
-        if not interval_consumption_diff.empty:
-            consumption_diff_data = consumption_diff_data.merge(interval_consumption_diff, left_index=True, right_index=True, how="outer") if not consumption_diff_data.empty else interval_consumption_diff
+    # First/last valid meter reading per window, from the running meter counters
+    cop_data, heat_diff_data, consumption_diff_data = checks.cop_summary(windows)
 
     st.subheader("📊 Heat Pump COP Analysis")
     for col, title, df in zip(st.columns(3), ["Heat Diff", "Consumption Diff", "COPH2"], [heat_diff_data, consumption_diff_data, cop_data]):
@@ -174,7 +209,7 @@ with st.expander("⚡ COP Analysis", expanded=False):
                 # Format numbers and handle None/NaN
                 styled_df = df.applymap(lambda x: f"{x:.0f}" if pd.notna(x) else '').style.applymap(
                     lambda x: 'background-color: yellow' if (pd.isna(x) or (x != '' and float(x) <= 1)) else '', subset=pd.IndexSlice[:, :])
-            elif title == "COP":
+            elif title == "COPH2":
                 # Format numbers and handle None/NaN
                 styled_df = df.applymap(lambda x: f"{x:.2f}" if pd.notna(x) else '').style.applymap(
                     lambda x: 'background-color: red' if (pd.isna(x) or (x == '' or (x != '' and (float(x) < 1 or float(x) > 6)))) else '', subset=pd.IndexSlice[:, :])
@@ -182,3 +217,41 @@ with st.expander("⚡ COP Analysis", expanded=False):
             # Display the styled dataframe
             st.dataframe(styled_df, use_container_width=True)
     
+
+    st.subheader("📈 Daily COP")
+    daily_cop_data = checks.daily_cop()[0]
+    fig = go.Figure()
+    for site in daily_cop_data.columns:
+        fig.add_trace(go.Scatter(x=daily_cop_data.index, y=daily_cop_data[site], mode="lines+markers", name=site))
+    fig.update_layout(xaxis=dict(title="Date"), yaxis_title="COP", template="plotly_white", hoverlabel_namelength=-1)
+    st.plotly_chart(fig, use_container_width=True)
+
+# --- Heat Pump Cycling ---
+with st.expander("🔁 Heat Pump Cycling", expanded=False):
+    starts_per_hour, mean_run_length, min_off_time = daily_cycling(snapshot.fetched_at, snapshot.frame)
+    if starts_per_hour.empty:
+        st.info("No power, consumption or Delta T data to detect compressor runs.")
+    else:
+        st.subheader("📋 Daily Averages by Site")
+        summary = pd.DataFrame({
+            "Starts per hour": starts_per_hour.mean(),
+            "Mean run length [min]": mean_run_length.mean(),
+            "Min off time [min]": min_off_time.min(),
+        })
+        st.dataframe(summary.style.format("{:.1f}", na_rep="").applymap(
+            lambda v: 'background-color: red' if pd.notna(v) and v > MAX_STARTS_PER_HOUR else '',
+            subset=["Starts per hour"]).applymap(
+            lambda v: 'background-color: red' if pd.notna(v) and v < MIN_OFF_TIME_MIN else '',
+            subset=["Min off time [min]"]), use_container_width=True)
+
+        for col, title, df, zmax in zip(
+                st.columns(3), ["Starts per Hour", "Mean Run Length [min]", "Min Off Time [min]"],
+                [starts_per_hour, mean_run_length, min_off_time], [2 * MAX_STARTS_PER_HOUR, None, None]):
+            with col:
+                st.subheader(title)
+                fig = go.Figure(go.Heatmap(
+                    z=df.T.values, x=df.index, y=df.columns, zmin=0, zmax=zmax,
+                    colorscale="RdYlGn_r" if title == "Starts per Hour" else "RdYlGn"
+                ))
+                fig.update_layout(template="plotly_white", height=max(300, 25 * len(df.columns)))
+                st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,82 @@
+import streamlit as st
+from instrumentation import METRICS, PROFILER, configure_logging
+from series_store import get_series_store
+from refresher import active_refreshers
+from getNISEPdata import cached_lookups
+from compact import memory_report
+from datetime import datetime
+import logging
+import pandas as pd
+
+# Page layout configuration
+st.set_page_config(
+    page_title="NISEP Heat Pumpz",
+    page_icon="favicon.png",
+    layout="wide"
+)
+st.logo('logo.svg', size='large')
+configure_logging()
+
+st.title("🩺 Diagnostics")
+
+# --- Controls ---
+col1, col2, col3 = st.columns(3)
+with col1:
+    # cProfile the next data requests (e.g. the background refresh) and keep the report
+    PROFILER.enabled = st.toggle("Profile data requests", value=PROFILER.enabled)
+with col2:
+    # Write every span as a JSON log line
+    span_logs = st.toggle("Structured span logs", value=logging.getLogger("instrumentation").level == logging.DEBUG)
+    logging.getLogger("instrumentation").setLevel(logging.DEBUG if span_logs else logging.NOTSET)
+with col3:
+    if st.button("Reset metrics"):
+        METRICS.reset()
+
+spans, counters, recent = METRICS.snapshot()
+
+# --- Per-stage latency ---
+st.subheader("Stages")
+if spans:
+    stages = pd.DataFrame.from_dict(spans, orient="index")
+    stages["mean_s"] = stages["total_s"] / stages["count"]
+    stages = stages[["count", "total_s", "mean_s", "max_s", "last_s"]].sort_values("total_s", ascending=False)
+    st.dataframe(stages.style.format("{:.3f}", subset=["total_s", "mean_s", "max_s", "last_s"]),
+                 use_container_width=True)
+else:
+    st.info("No spans recorded yet: load one of the data pages first.")
+
+# --- Counters ---
+st.subheader("Counters")
+store = get_series_store()
+counters["store.bytes_held"] = store.nbytes
+counters["store.series_held"] = len(store)
+st.dataframe(pd.Series(counters, name="value").sort_index().to_frame(), use_container_width=True)
+
+# --- Memory ---
+st.subheader("Memory")
+frames = {}
+for refresher in active_refreshers():
+    if refresher.current is not None:
+        frames[f"snapshot ({refresher.name})"] = refresher.current.frame
+for (url, user, compact), lookup in cached_lookups().items():
+    frames[f"ref map ({'compact' if compact else 'full'})"] = lookup.frame
+if frames:
+    st.dataframe(memory_report(**frames).style.format("{:.2f}", subset=["values_mb", "index_mb", "total_mb"]),
+                 use_container_width=True)
+else:
+    st.info("Nothing loaded yet.")
+
+# --- Recent spans ---
+with st.expander("🕒 Recent spans"):
+    if recent:
+        recent_df = pd.DataFrame(recent[::-1])
+        recent_df["at"] = pd.to_datetime(recent_df["at"], unit="s", utc=True).dt.tz_convert("Europe/London")
+        st.dataframe(recent_df, use_container_width=True)
+
+# --- Profiles ---
+st.subheader("Profiles")
+if not PROFILER.reports:
+    st.info("No profiles yet: switch on profiling and load data.")
+for name, (at, report) in sorted(PROFILER.reports.items()):
+    with st.expander(f"{name} ({datetime.fromtimestamp(at):%Y-%m-%d %H:%M:%S})"):
+        st.code(report)
@@ -0,0 +1,25 @@
+#!python
+# -*- coding: utf-8 -*-
+"""DST-safe period boundaries for tz-aware (Europe/London) indexes.
+
+``Timestamp.floor`` and ``pd.date_range`` work on local wall time, so they
+raise ``Cannot infer dst time`` inside the hour repeated when the clocks go
+back. Fixed frequencies below a day are floored in UTC instead (London's
+offsets are whole hours, so the boundaries are the same); days and longer
+are floored on local midnights, which are never ambiguous.
+"""
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+
+def floor(ts, freq):
+    """``ts.floor(freq)`` that also works in the repeated autumn hour."""
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None and isinstance(to_offset(freq), pd.offsets.Tick):
+        return ts.tz_convert("UTC").floor(freq).tz_convert(ts.tz)
+    return ts.floor(freq)
+
+
+def period_starts(first, last, freq):
+    """Starts of the ``freq`` periods from the one holding ``first`` to the one holding ``last``."""
+    return pd.date_range(floor(first, freq), floor(last, freq), freq=freq)
@@ -0,0 +1,121 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Plot decimation and trace helpers for the Streamlit pages.
+
+A chart a few thousand pixels wide cannot show more points than that, so
+series are reduced before their traces are built: largest-triangle-three-
+buckets (LTTB) keeps the visual shape of a line, and the min/max envelope
+keeps every extreme (spikes, out-of-bounds dips). Traces with many points
+are drawn with WebGL (``Scattergl``) instead of SVG.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# Above this many points a trace is drawn with WebGL
+SCATTERGL_THRESHOLD = 5000
+# Default chart width in pixels for full-width charts
+DEFAULT_WIDTH_PX = 1500
+
+
+def _as_numeric(x):
+    if hasattr(x, "asi8"):  # DatetimeIndex, tz-aware or not
+        return x.asi8.astype(float)
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points picked by largest-triangle-three-buckets.
+
+    Args:
+        x (array): Sorted x values (numbers or datetime64).
+        y (array): y values without NaNs.
+        n_out (int): Number of points to keep (at least 3).
+
+    Returns:
+        np.ndarray: Sorted indices into ``x``/``y``.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = _as_numeric(x), np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, n_buckets):
+    """Indices of the minimum and maximum of ``y`` in each of ``n_buckets`` equal buckets."""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if 2 * n_buckets >= n:
+        return np.arange(n)
+    size = -(-n // n_buckets)
+    padded = np.full(size * n_buckets, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    filled = ~np.isnan(buckets).all(axis=1)
+    rows = np.flatnonzero(filled)
+    low = np.nanargmin(buckets[filled], axis=1) + rows * size
+    high = np.nanargmax(buckets[filled], axis=1) + rows * size
+    return np.unique(np.concatenate([low, high]))
+
+
+def decimate(x, y, width_px=DEFAULT_WIDTH_PX, method="lttb"):
+    """Reduce a series to roughly one point per pixel (two for the min/max envelope).
+
+    ``method`` is "lttb" or "minmax". The series is split on runs of NaNs wider than a
+    pixel, each part is reduced on its share of ``width_px`` and the first NaN of every
+    such run is kept, so the line breaks there instead of bridging the gap. Shorter
+    runs of NaNs are dropped.
+
+    Args:
+        x (array or DatetimeIndex): Sorted x values.
+        y (array): y values.
+
+    Returns:
+        tuple: (x, y) subsets to plot.
+    """
+    y = np.asarray(y, dtype=float)
+    keep = np.flatnonzero(~np.isnan(y))
+    if not len(keep):
+        return x[keep], y[keep]
+    min_gap = max(1, len(y) // width_px)
+    breaks = np.flatnonzero(np.diff(keep) - 1 >= min_gap) + 1
+    positions = [keep[breaks - 1] + 1]  # first NaN of every wide gap
+    numeric_x = _as_numeric(x)
+    for part in np.split(keep, breaks):
+        n_out = max(3, round(width_px * len(part) / len(keep)))
+        if method == "minmax":
+            idx = minmax(y[part], n_out)
+        else:
+            idx = lttb(numeric_x[part], y[part], n_out)
+        positions.append(part[idx])
+    positions = np.sort(np.concatenate(positions))
+    return x[positions], y[positions]
+
+
+def make_trace(x, y, threshold=SCATTERGL_THRESHOLD, **kwargs):
+    """``go.Scatter`` for small series, ``go.Scattergl`` (WebGL) above ``threshold`` points."""
+    trace = go.Scattergl if len(x) > threshold else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+
+def series_trace(series, width_px=DEFAULT_WIDTH_PX, method="lttb", **kwargs):
+    """Decimated trace for a pandas Series indexed by time."""
+    x, y = decimate(series.index, series.to_numpy(), width_px, method)
+    return make_trace(x, y, **kwargs)
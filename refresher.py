@@ -0,0 +1,145 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Background refresh of the NISEP data shared by all Streamlit sessions.
+
+A daemon thread fetches on a fixed schedule and swaps in a new immutable
+``Snapshot``. Pages read the latest ready snapshot and never wait on the BMOS
+API, apart from the very first load after the server starts
+(stale-while-revalidate). Combined with a ``HistoryCache`` each refresh only
+downloads data newer than the previous one.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from getNISEPdata import getTimeseries, getRefLookup, label_columns
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot(object):
+    """One consistent view of the data. Treat ``frame`` as read-only: it is shared.
+
+    ``lookup`` is the RefLookup the frame was labelled with and ``display`` maps each
+    ref id to the display name its column is labelled with.
+    """
+    __slots__ = ("sites", "frame", "start_time", "end_time", "fetched_at", "lookup", "display")
+
+    def __init__(self, sites, frame, start_time, end_time, lookup=None, display=None):
+        self.sites = tuple(sites)
+        self.frame = frame
+        self.start_time = start_time
+        self.end_time = end_time
+        self.fetched_at = time.time()
+        self.lookup = lookup
+        self.display = display or {}
+
+
+class SnapshotRefresher(object):
+    """Runs ``fetch()`` every ``interval`` seconds on a daemon thread and keeps the latest Snapshot.
+
+    A failed refresh is logged and the previous snapshot keeps being served.
+    """
+
+    def __init__(self, fetch, interval=3600, name="nisep-refresher"):
+        self.fetch = fetch
+        self.interval = interval
+        self.name = name
+        self.last_error = None
+        self._snapshot = None
+        self._ready = threading.Event()
+        # Set after every refresh attempt, successful or not
+        self._attempted = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def refresh_now(self):
+        """Ask the background thread to refresh without waiting for the schedule."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                started = time.time()
+                snapshot = self.fetch()
+                # A single reference assignment: readers see the old or the new snapshot, never a mix
+                self._snapshot = snapshot
+                self.last_error = None
+                self._ready.set()
+                logger.info("%s: new snapshot in %.1fs", self.name, time.time() - started)
+            except Exception as e:
+                self.last_error = e
+                logger.exception("%s: refresh failed, keeping previous snapshot", self.name)
+            self._attempted.set()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    @property
+    def current(self):
+        """The latest Snapshot, or None before the first refresh finished (never waits)."""
+        return self._snapshot
+
+    def latest(self, timeout=None):
+        """Return the newest ready Snapshot, waiting only if none has been produced yet.
+
+        Raises the refresh error when the first fetch failed (and asks for a retry),
+        or TimeoutError when it has not finished within ``timeout`` seconds.
+        """
+        if not self._ready.is_set():
+            self._attempted.wait(timeout)
+        snapshot = self._snapshot
+        if snapshot is None:
+            if self.last_error is not None:
+                self.refresh_now()
+                raise self.last_error
+            raise TimeoutError("no snapshot ready yet")
+        return snapshot
+
+
+def nisep_fetcher(auth_url, username, password, days=30, cache=None, compact=False):
+    """Fetch function for SnapshotRefresher: the last ``days`` of minute data for every point.
+
+    ``compact`` is passed on to ``getTimeseries`` (float32 sensor columns).
+    """
+    def fetch():
+        end_time = datetime.now().replace(second=0, microsecond=0)
+        start_time = datetime(*end_time.timetuple()[:3]) - timedelta(days=days)
+        frame = getTimeseries(end_time, start_time, None, None, auth_url, username, password, cache=cache,
+                              compact=compact, columns="ref")
+        lookup = getRefLookup(auth_url, username, password, compact=compact)
+        display = dict(frame.attrs.get("display", {}))
+        return Snapshot(lookup.sites, label_columns(frame, lookup), start_time, end_time, lookup, display)
+    return fetch
+
+
+_refreshers = {}
+_refreshers_lock = threading.Lock()
+
+
+def shared_refresher(auth_url, username, password, days=30, interval=3600, cache=None, compact=False):
+    """Return the process-wide, already started refresher for these credentials and window."""
+    key = (auth_url, username, days, compact)
+    with _refreshers_lock:
+        if key not in _refreshers:
+            fetch = nisep_fetcher(auth_url, username, password, days=days, cache=cache, compact=compact)
+            _refreshers[key] = SnapshotRefresher(fetch, interval=interval, name="nisep-refresher-%dd" % days).start()
+        return _refreshers[key]
+
+
+def active_refreshers():
+    """The shared refreshers started in this process."""
+    with _refreshers_lock:
+        return list(_refreshers.values())
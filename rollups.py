@@ -0,0 +1,147 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Multi-resolution rollups (minute -> 15min -> hour -> day) for zoomable history.
+
+Each level keeps min, max, mean, count, first and last per point. Levels are
+built from the level below (not from the raw data), and an update only
+recomputes the buckets from the first new timestamp onwards, so appending a
+few minutes of data touches a few buckets per level.
+"""
+import threading
+
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from periods import floor
+
+LEVELS = ("15min", "h", "D")
+STATS = ("min", "max", "mean", "count", "first", "last")
+
+
+def _aggregate(stats, freq):
+    """Roll a finer level (dict of stat frames) up to ``freq``."""
+    counts = stats["count"].resample(freq).sum()
+    weighted = (stats["mean"] * stats["count"]).resample(freq).sum(min_count=1)
+    return {
+        "min": stats["min"].resample(freq).min(),
+        "max": stats["max"].resample(freq).max(),
+        "mean": weighted / counts.where(counts > 0),
+        "count": counts,
+        "first": stats["first"].resample(freq).first(),
+        "last": stats["last"].resample(freq).last(),
+    }
+
+
+def _raw_stats(frame):
+    """Treat minute data as its own finest level: every sample is a bucket of one."""
+    return {
+        "min": frame, "max": frame, "mean": frame,
+        "count": frame.notna().astype("int64"),
+        "first": frame, "last": frame,
+    }
+
+
+class RollupStore(object):
+    """Minute data plus its rollup levels, updated incrementally.
+
+    Args:
+        levels (tuple): Rollup frequencies from fine to coarse.
+        target_points (int): Points per series a query aims for when picking a level.
+    """
+
+    def __init__(self, levels=LEVELS, target_points=2000):
+        self.levels = tuple(levels)
+        self.target_points = target_points
+        self.raw = None
+        self.rollups = {freq: None for freq in self.levels}
+        self.lock = threading.RLock()
+
+    def update(self, frame):
+        """Merge new/updated minute rows and refresh only the affected buckets."""
+        if frame.empty:
+            return
+        frame = frame.sort_index()
+        with self.lock:
+            if self.raw is None:
+                self.raw = frame
+            else:
+                kept = self.raw[~self.raw.index.isin(frame.index)]
+                self.raw = pd.concat([kept, frame]).sort_index()
+            self._refresh(frame.index[0])
+
+    def append(self, frame, settle="15min"):
+        """Take the next snapshot of a rolling frame (sorted, read-only) as the minute data.
+
+        Only buckets from the previous snapshot's last ``settle`` onwards are recomputed;
+        buckets before the new frame's start are dropped and the one holding it is rebuilt
+        from the rows still in the window. The snapshot is kept, not copied.
+        Feeding the same frame again does nothing.
+        """
+        with self.lock:
+            if frame is self.raw or frame.empty:
+                return
+            if self.raw is None or self.raw.empty or not frame.columns.equals(self.raw.columns):
+                self.raw = None
+                self.rollups = {freq: None for freq in self.levels}
+                self.update(frame)
+                return
+            since = max(self.raw.index[-1] - pd.Timedelta(settle), frame.index[0])
+            self.raw = frame
+            self._trim(frame.index[0])
+            self._refresh(since)
+
+    def _trim(self, start):
+        """Drop the buckets before ``start`` and recompute the one holding it from the rows left."""
+        finer = None
+        for freq in self.levels:
+            head = floor(start, freq)
+            end = head + to_offset(freq)
+            if finer is None:
+                source = _raw_stats(self.raw.iloc[:self.raw.index.searchsorted(end)])
+            else:
+                source = {stat: df.iloc[:df.index.searchsorted(end)] for stat, df in finer.items()}
+            fresh = _aggregate(source, freq)
+            self.rollups[freq] = {stat: pd.concat([fresh[stat], df.iloc[df.index.searchsorted(end):]])
+                                  for stat, df in self.rollups[freq].items()}
+            finer = self.rollups[freq]
+
+    def _refresh(self, since):
+        finer = None
+        for freq in self.levels:
+            # Buckets before the one holding the first new sample are unchanged
+            cut = floor(since, freq)
+            if finer is None:
+                source = _raw_stats(self.raw.loc[cut:])
+            else:
+                source = {stat: df.loc[cut:] for stat, df in finer.items()}
+            fresh = _aggregate(source, freq)
+            existing = self.rollups[freq]
+            if existing is not None:
+                fresh = {stat: pd.concat([existing[stat].loc[existing[stat].index < cut], fresh[stat]])
+                         for stat in STATS}
+            self.rollups[freq] = fresh
+            finer = fresh
+
+    def choose_level(self, start, end, target_points=None):
+        """Coarsest level that still gives ``target_points`` buckets over [start, end] (None = raw)."""
+        target = target_points or self.target_points
+        span = pd.Timestamp(end) - pd.Timestamp(start)
+        chosen = None
+        for freq in self.levels:
+            if span / pd.to_timedelta(freq if freq[0].isdigit() else "1" + freq) >= target:
+                chosen = freq
+        return chosen
+
+    def read(self, start, end, stat="mean", columns=None, target_points=None):
+        """Return (level, frame) for [start, end] at the level picked by ``choose_level``.
+
+        ``level`` is None when the raw minute data is returned.
+        """
+        level = self.choose_level(start, end, target_points)
+        with self.lock:
+            source = self.raw if level is None else (self.rollups[level] or {}).get(stat)
+        if source is None:
+            return level, pd.DataFrame()
+        if columns is not None:
+            source = source[list(columns)]
+        return level, source.loc[start:end]
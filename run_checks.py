@@ -0,0 +1,173 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Headless runner for the Checks page: bounds, missing data and COP for every site.
+
+The data is fetched once (through the on-disk history cache), split per site
+and the per-site checks run on a process pool. Results are the same tables the
+page shows, written for cron jobs:
+
+- ``summary.json``: run metadata and, per site, violation counts, missing data and COP
+- ``cop.<fmt>``, ``missing.<fmt>``, ``daily_cop.<fmt>``: fleet-wide tables
+- ``violations/<site>.<fmt>``: every out-of-bounds sample (datetime, column, value)
+
+Usage::
+
+    python run_checks.py --out results --format parquet --workers 8
+"""
+import os
+
+# getNISEPdata changes the working directory on import; resolve user paths against the caller's
+CALLER_CWD = os.getcwd()
+
+import argparse
+import json
+import logging
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytz
+
+from checks_functions import (check_bounds, check_windows, cop_summary, daily_cop, missing_data_by_site,
+                              DEFAULT_BOUNDS)
+from column_model import select
+from completeness import Completeness
+from getNISEPdata import getTimeseries, getRefLookup, load_config
+from history_cache import HistoryCache
+from instrumentation import configure_logging, span
+
+logger = logging.getLogger(__name__)
+
+
+def site_checks(site, frame, bounds, bounds_start, bounds_end, windows):
+    """Every check of one site (runs in a worker process).
+
+    Args:
+        site (str): Site name (NISEPxx).
+        frame (pd.DataFrame): The site's columns only.
+        bounds (dict): Bounds keyed like ``DEFAULT_BOUNDS``.
+        bounds_start, bounds_end (datetime): Window of the bounds check.
+        windows (dict): Missing data / COP windows, see ``check_windows``.
+
+    Returns:
+        dict: "violations" (long DataFrame), "missing", "cop", "heat_diff", "consumption_diff"
+            (DataFrames as on the page) and "daily_cop" (Series).
+    """
+    bounds_result = check_bounds(frame, bounds_start, bounds_end, bounds, [site])[site]
+    violations = bounds_result["out_of_bounds"].stack().rename("value").reset_index()
+    violations.columns = ["datetime", "column", "value"]
+
+    missing = missing_data_by_site(Completeness(frame), windows).get(site, pd.DataFrame(columns=list(windows)))
+    cop, heat_diff, consumption_diff = cop_summary(frame, windows)
+    daily = daily_cop(frame)[0]
+    return {
+        "violations": violations,
+        "missing": missing,
+        "cop": cop,
+        "heat_diff": heat_diff,
+        "consumption_diff": consumption_diff,
+        "daily_cop": daily[site] if site in daily.columns else pd.Series(dtype=float, name=site),
+    }
+
+
+def _write(frame, path, fmt):
+    if fmt == "parquet":
+        frame.to_parquet(path + ".parquet")
+    else:
+        frame.to_json(path + ".json", orient="table", date_format="iso", indent=1)
+
+
+def _records(frame):
+    """JSON-safe {row: {column: value}} with NaN as null."""
+    return json.loads(frame.to_json(orient="index"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the NISEP heat pump checks for every site.")
+    parser.add_argument("--out", default="check_results", help="output directory")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    parser.add_argument("--days", type=int, default=30, help="days of data to fetch")
+    parser.add_argument("--past-days", type=int, default=2, help="days covered by the bounds check")
+    parser.add_argument("--bounds", default=None, help="JSON file with bounds overriding the defaults")
+    parser.add_argument("--sites", nargs="+", default=None, help="only these sites")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--cache", default=".cache/history", help="history cache directory")
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    args = parser.parse_args()
+
+    configure_logging()
+    url, username, password = load_config()
+    url, username, password = args.url or url, args.username or username, args.password or password
+
+    bounds = {key: dict(value) for key, value in DEFAULT_BOUNDS.items()}
+    if args.bounds:
+        with open(os.path.join(CALLER_CWD, args.bounds)) as f:
+            for key, value in json.load(f).items():
+                bounds.setdefault(key, {}).update(value)
+
+    started = time.time()
+    uk_tz = pytz.timezone("Europe/London")
+    now = datetime.now(uk_tz)
+    # Same windows as the page: bounds up to today's midnight, missing data/COP up to now
+    bounds_end = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    bounds_start = bounds_end - timedelta(days=args.past_days)
+    windows = check_windows(now)
+
+    # Same range as the page's snapshot (see refresher.nisep_fetcher): up to the current minute
+    end_time = datetime.now().replace(second=0, microsecond=0)
+    start_time = datetime(*end_time.timetuple()[:3]) - timedelta(days=args.days)
+    with span("run_checks.fetch"):
+        data = getTimeseries(end_time, start_time, None, None, url, username, password,
+                             cache=HistoryCache(os.path.join(CALLER_CWD, args.cache)))
+    sites = args.sites or getRefLookup(url, username, password).sites
+    logger.info("Fetched %d columns x %d rows in %.1fs", data.shape[1], data.shape[0], time.time() - started)
+
+    results = {}
+    with span("run_checks.sites", sites=len(sites)), ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {site: pool.submit(site_checks, site, select(data, site=site), bounds, bounds_start, bounds_end,
+                                     windows) for site in sites}
+        for site, future in futures.items():
+            results[site] = future.result()
+
+    out = os.path.join(CALLER_CWD, args.out)
+    os.makedirs(os.path.join(out, "violations"), exist_ok=True)
+    summary = {
+        "generated_at": now.isoformat(),
+        "data_start": str(start_time),
+        "data_end": str(end_time),
+        "bounds": bounds,
+        "bounds_window": [bounds_start.isoformat(), bounds_end.isoformat()],
+        "windows": {name: [start.isoformat(), end.isoformat()] for name, (start, end) in windows.items()},
+        "sites": {},
+    }
+    for site, result in results.items():
+        _write(result["violations"], os.path.join(out, "violations", site), args.format)
+        summary["sites"][site] = {
+            "out_of_bounds_samples": {str(k): int(v) for k, v in result["violations"]["column"].value_counts().items()},
+            "missing_percentage": _records(result["missing"]),
+            "cop": _records(result["cop"]).get(site, {}),
+            "heat_diff": _records(result["heat_diff"]).get(site, {}),
+            "consumption_diff": _records(result["consumption_diff"]).get(site, {}),
+        }
+
+    cop = pd.concat({name: pd.concat([result[name] for result in results.values()])
+                     for name in ("cop", "heat_diff", "consumption_diff")}, axis=1)
+    cop.columns = [f"{name} {window}" for name, window in cop.columns]
+    _write(cop, os.path.join(out, "cop"), args.format)
+    missing = pd.concat({site: result["missing"] for site, result in results.items()}, names=["site", "column"])
+    _write(missing, os.path.join(out, "missing"), args.format)
+    _write(pd.DataFrame({site: result["daily_cop"] for site, result in results.items()}),
+           os.path.join(out, "daily_cop"), args.format)
+    with open(os.path.join(out, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=1)
+
+    logger.info("Checked %d sites in %.1fs, results in %s", len(results), time.time() - started, out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,13 +3,6 @@
 
 import logging
 
-# Configure logging level here
-LOG_LEVEL = logging.INFO
-
-logging.basicConfig(level=LOG_LEVEL,
-                    format='%(asctime)s - %(levelname)s - %(message)s',
-                    datefmt='%Y-%m-%d %H:%M:%S')
-
 from binascii import b2a_hex, unhexlify, b2a_base64, hexlify
 from requests.auth import HTTPBasicAuth
 from base64 import standard_b64encode, b64decode, urlsafe_b64encode, urlsafe_b64decode
@@ -20,6 +13,7 @@ from hashlib import pbkdf2_hmac
 
 import re
 import os
+from functools import lru_cache
 
 def marker_split(s, m1, m2=None):
     start = s.find(m1) + len(m1)
@@ -53,10 +47,8 @@ def salted_password(salt, iterations, algorithm_name, password):
 
 
 def salted_password_2(salt, iterations, algorithm_name, password):
-    logging.debug("password: %s", password)
     logging.debug("salt: %s", salt)
     logging.debug("unhexlify(salt): %s", unhexlify(salt))
-    logging.debug(" password.encode(): %s",  password.encode())
     logging.debug(int(iterations))
     dk = pbkdf2_hmac(
         algorithm_name, password.encode(), unhexlify(salt), int(iterations)
@@ -67,6 +59,13 @@ def salted_password_2(salt, iterations, algorithm_name, password):
     return encrypt_password
 
 
+@lru_cache(maxsize=32)
+def cached_salted_password_2(salt, iterations, algorithm_name, password):
+    # SaltedPassword only depends on (salt, iterations, password), so repeat logins
+    # against the same server salt can skip the PBKDF2 round.
+    return salted_password_2(salt, iterations, algorithm_name, password)
+
+
 def base64_no_padding(s):
     encoded_str = urlsafe_b64encode(s.encode())
     encoded_str = encoded_str.decode().replace("=", "")
@@ -0,0 +1,222 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Process-wide, read-only store of point histories shared by all sessions.
+
+Each series is held once, as a contiguous read-only array, keyed by
+(granularity, column). Sessions get range views into those arrays (no copy)
+instead of keeping their own frames in ``st.session_state``, so server memory
+grows with the amount of data rather than the number of users. When the total
+size exceeds ``max_bytes`` the least recently used series are evicted.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from history_cache import _localize, merge_ranges, missing_ranges
+from instrumentation import count
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def _read_only(series, index):
+    """Contiguous copy of ``series`` (dtype kept, e.g. float32) that cannot be written to, on ``index``."""
+    values = np.array(series.to_numpy(), copy=True)
+    values.flags.writeable = False
+    return pd.Series(values, index=index, name=series.name, copy=False)
+
+
+def _nbytes(series):
+    return series.to_numpy().nbytes
+
+
+def _index_key(index):
+    return (len(index), index[0], index[-1]) if len(index) else (0, None, None)
+
+
+class SeriesStore(object):
+    """LRU-bounded map of (granularity, column) -> read-only series plus the ranges it covers.
+
+    Args:
+        max_bytes (int): Memory cap for the stored series (values and index).
+        tz (str): Timezone used for naive start/end times.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, tz="Europe/London"):
+        self.max_bytes = max_bytes
+        self.tz = tz
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (series, covered)
+        # Series with the same timestamps share one index object (and its int64 buffer)
+        self._indexes = {}  # _index_key -> [index, ...]
+        self._index_users = {}  # id(index) -> number of stored series on it
+        # Display names of the columns (from the hisRead headers), kept for every column ever put
+        self._display = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def coverage(self, granularity, column):
+        with self._lock:
+            entry = self._entries.get((granularity, column))
+            return list(entry[1]) if entry else []
+
+    def missing(self, granularity, columns, start_time, end_time):
+        """Sub-ranges of [start_time, end_time] not held for at least one of ``columns``."""
+        start, end = _localize(start_time, self.tz), _localize(end_time, self.tz)
+        gaps = []
+        for column in columns:
+            gaps.extend(missing_ranges(start, end, self.coverage(granularity, column)))
+        return merge_ranges(gaps)
+
+    def _intern(self, index):
+        """Return the stored index equal to ``index`` (registering it if new) and count one more user."""
+        candidates = self._indexes.setdefault(_index_key(index), [])
+        for candidate in candidates:
+            if candidate is index or candidate.equals(index):
+                index = candidate
+                break
+        else:
+            candidates.append(index)
+            self._index_users[id(index)] = 0
+            self.nbytes += index.nbytes
+        self._index_users[id(index)] += 1
+        return index
+
+    def _release(self, series):
+        index = series.index
+        self.nbytes -= _nbytes(series)
+        self._index_users[id(index)] -= 1
+        if self._index_users[id(index)] == 0:
+            del self._index_users[id(index)]
+            key = _index_key(index)
+            self._indexes[key] = [candidate for candidate in self._indexes[key] if candidate is not index]
+            if not self._indexes[key]:
+                del self._indexes[key]
+            self.nbytes -= index.nbytes
+
+    def put(self, granularity, frame, covered):
+        """Merge the columns of ``frame`` into the store and record ``covered`` as downloaded.
+
+        Display names in ``frame.attrs['display']`` are kept and returned by ``frame``.
+        """
+        covered = [(_localize(lo, self.tz), _localize(hi, self.tz)) for lo, hi in covered]
+        with self._lock:
+            self._display.update(frame.attrs.get('display', {}))
+            for column in frame.columns:
+                key = (granularity, column)
+                new = frame[column]
+                old, old_covered = self._entries.pop(key, (None, []))
+                if old is not None:
+                    self._release(old)
+                    new = pd.concat([old[~old.index.isin(new.index)], new]).sort_index()
+                series = _read_only(new, self._intern(new.index))
+                self._entries[key] = (series, merge_ranges(old_covered + covered))
+                self.nbytes += _nbytes(series)
+            self._evict()
+
+    def read(self, granularity, columns, start_time, end_time, fetch):
+        """Frame of ``columns`` over [start_time, end_time], fetching only what is not held.
+
+        ``fetch(columns, start, end)`` must return a frame with (a subset of) those columns;
+        columns that share the same gaps are fetched together. Columns evicted again before
+        the read returns (a read larger than ``max_bytes``) come from the fetched data.
+        """
+        start, end = _localize(start_time, self.tz), _localize(end_time, self.tz)
+        groups = {}
+        for column in columns:
+            gaps = tuple(missing_ranges(start, end, self.coverage(granularity, column)))
+            if gaps:
+                groups.setdefault(gaps, []).append(column)
+        count("store.hit_columns", len(columns) - sum(len(group) for group in groups.values()))
+        fetched_parts = {}
+        for gaps, group in groups.items():
+            count("store.miss_columns", len(group))
+            for lo, hi in gaps:
+                fetched = fetch(group, lo, hi).reindex(columns=group)
+                # Chunks that failed must be fetched again next time
+                covered = [] if fetched.attrs.get('failed_chunks') else [(lo, hi)]
+                self.put(granularity, fetched, covered)
+                for column in group:
+                    fetched_parts.setdefault(column, []).append(fetched[column])
+        frame = self.frame(granularity, columns, start, end)
+        # A read larger than the cap can evict columns it has just fetched: serve those from the fetch
+        evicted = [column for column in columns if column in fetched_parts and column not in frame.columns]
+        if evicted:
+            parts = {column: pd.concat(fetched_parts[column]).sort_index().loc[start:end] for column in evicted}
+            frame = pd.concat([frame, pd.DataFrame(parts)], axis=1)
+            frame = frame[[column for column in columns if column in frame.columns]]
+            frame.attrs['display'] = self._displays(frame.columns)
+        return frame
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self._entries) > 1:
+            key, (series, _) = self._entries.popitem(last=False)
+            self._release(series)
+            count("store.evictions")
+            logger.debug("Evicted %s (%d bytes)", key, _nbytes(series))
+
+    def get(self, granularity, column, start_time=None, end_time=None):
+        """View of one stored series over [start_time, end_time], or None if it is not held."""
+        key = (granularity, column)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        series = entry[0]
+        a = 0 if start_time is None else series.index.searchsorted(_localize(start_time, self.tz), "left")
+        b = len(series) if end_time is None else series.index.searchsorted(_localize(end_time, self.tz), "right")
+        return series.iloc[a:b]
+
+    def frame(self, granularity, columns, start_time=None, end_time=None):
+        """DataFrame of the held ``columns`` over [start_time, end_time]; columns not held are left out.
+
+        Columns stored on the same timestamps share one index, and pandas' copy-on-write lets the
+        frame reference their arrays without copying. Columns with different timestamps are
+        aligned first, which copies them; use ``get`` for per-column views in that case. The
+        display names of the columns are in ``attrs['display']``.
+        """
+        views = {}
+        for column in columns:
+            view = self.get(granularity, column, start_time, end_time)
+            if view is not None:
+                views[column] = view
+        if not views:
+            return pd.DataFrame()
+        frame = pd.concat(views, axis=1)
+        frame.attrs['display'] = self._displays(frame.columns)
+        return frame
+
+    def _displays(self, columns):
+        with self._lock:
+            return {column: self._display[column] for column in columns if column in self._display}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._indexes.clear()
+            self._index_users.clear()
+            self._display.clear()
+            self.nbytes = 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_series_store(max_bytes=DEFAULT_MAX_BYTES):
+    """Return the process-wide SeriesStore, created with ``max_bytes`` on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SeriesStore(max_bytes)
+        return _store
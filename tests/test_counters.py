@@ -0,0 +1,23 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checks_functions import corrected_counters  # noqa: E402
+
+
+def test_jitter_cancels_against_the_next_increase():
+    counters = corrected_counters(np.array([[100.0], [100.5], [100.4], [101.0]]))
+    assert np.isclose(counters[-1, 0] - counters[0, 0], 1.0)
+
+
+def test_large_drop_is_a_reset():
+    counters = corrected_counters(np.array([[100.0], [101.0], [np.nan], [2.0], [3.0]]))
+    np.testing.assert_allclose(counters[:, 0], [0.0, 1.0, np.nan, 1.0, 2.0])
+
+
+def test_large_drop_is_a_rollover_when_the_wrap_value_is_known():
+    counters = corrected_counters(np.array([[990.0], [995.0], [5.0]]), rollover=1000)
+    np.testing.assert_allclose(counters[:, 0], [0.0, 5.0, 15.0])
@@ -0,0 +1,46 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checks_functions import cycling_analysis  # noqa: E402
+
+INDEX = pd.date_range("2026-01-05", periods=2 * 1440, freq="min", tz="Europe/London")
+
+
+def quantized_meter(power_kw, resolution=0.1):
+    """Cumulative kWh readings of a meter that only reports whole ``resolution`` steps."""
+    energy = np.cumsum(power_kw) / 60
+    return np.floor(energy / resolution) * resolution
+
+
+def test_steady_running_through_quantized_meter_is_not_short_cycling():
+    data = pd.DataFrame({"ASHP Consumption Energy (NISEP01)": quantized_meter(np.full(len(INDEX), 1.5))},
+                        index=INDEX)
+    starts_per_hour, mean_run_length, min_off_time = cycling_analysis(data)
+    assert starts_per_hour["NISEP01"].fillna(0).max() == 0
+    assert min_off_time["NISEP01"].isna().all()
+
+
+def test_hourly_cycles_through_quantized_meter():
+    minutes = np.arange(len(INDEX))
+    power = np.where(minutes % 120 < 60, 3.0, 0.0)
+    data = pd.DataFrame({"ASHP Consumption Energy (NISEP01)": quantized_meter(power)}, index=INDEX)
+    starts_per_hour, mean_run_length, min_off_time = cycling_analysis(data)
+    assert np.allclose(starts_per_hour["NISEP01"], 0.5, atol=0.05)
+    # The trailing window shifts starts and stops alike, so lengths stay close to an hour
+    assert np.allclose(mean_run_length["NISEP01"].dropna(), 60, atol=15)
+    assert np.allclose(min_off_time["NISEP01"].dropna(), 60, atol=15)
+
+
+def test_power_signal_counts_short_cycles():
+    minutes = np.arange(len(INDEX))
+    power = np.where(minutes % 30 < 10, 2.0, 0.0)
+    data = pd.DataFrame({"ASHP Power (NISEP01)": power}, index=INDEX)
+    starts_per_hour, mean_run_length, min_off_time = cycling_analysis(data)
+    assert np.allclose(starts_per_hour["NISEP01"], 2, atol=0.1)
+    assert (mean_run_length["NISEP01"] == 10).all()
+    assert (min_off_time["NISEP01"] == 20).all()
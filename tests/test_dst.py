@@ -0,0 +1,70 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checks_functions import cycling_analysis, daily_cop  # noqa: E402
+from completeness import Completeness  # noqa: E402
+from online_checks import OnlineChecks  # noqa: E402
+from periods import floor, period_starts  # noqa: E402
+from rollups import RollupStore  # noqa: E402
+
+# The clocks go back at 02:00 BST on 2026-10-25: 01:00-01:59 happens twice
+FIRST_0120 = pd.Timestamp("2026-10-25 00:20", tz="UTC").tz_convert("Europe/London")
+SECOND_0120 = pd.Timestamp("2026-10-25 01:20", tz="UTC").tz_convert("Europe/London")
+
+
+def frame_until(end):
+    index = pd.date_range(end - pd.Timedelta(days=2), end, freq="min")
+    minutes = np.arange(len(index))
+    return pd.DataFrame({
+        "Output Heat Energy (NISEP01)": 1000 + 0.1 * minutes,
+        "ASHP Consumption Energy (NISEP01)": 500 + 0.03 * minutes,
+        "ASHP Power (NISEP01)": np.where(minutes % 60 < 30, 2.0, 0.0),
+        "Flow Temperature (NISEP01)": 40 + np.sin(minutes / 100),
+    }, index=index)
+
+
+@pytest.mark.parametrize("end", [FIRST_0120, SECOND_0120])
+def test_floor_in_the_repeated_hour(end):
+    assert floor(end, "h") == end - pd.Timedelta(minutes=20)
+    assert floor(end, "15min") == end - pd.Timedelta(minutes=5)
+    assert floor(end, "D") == pd.Timestamp("2026-10-25", tz="Europe/London")
+    hours = period_starts(end - pd.Timedelta(hours=3), end, "h")
+    assert len(hours) == 4 and hours[-1] == floor(end, "h")
+
+
+@pytest.mark.parametrize("end", [FIRST_0120, SECOND_0120])
+def test_checks_over_the_clock_change(end):
+    frame = frame_until(end)
+    heatmap = Completeness(frame).site_heatmap()
+    assert list(heatmap.index.day) == [23, 24, 25]
+    cop = daily_cop(frame)[0]
+    assert np.allclose(cop["NISEP01"].dropna(), 0.1 / 0.03)
+    hourly = daily_cop(frame, "h")[0]
+    assert hourly.index.is_unique
+    starts_per_hour = cycling_analysis(frame)[0]
+    assert len(starts_per_hour) == 3
+
+
+@pytest.mark.parametrize("end", [FIRST_0120, SECOND_0120])
+def test_online_checks_and_rollups_over_the_clock_change(end):
+    frame = frame_until(end)
+    online = OnlineChecks()
+    online.update(frame.iloc[:-120])
+    online.update(frame)
+    for freq in ("D", "h"):
+        pd.testing.assert_frame_equal(online.daily_cop(freq)[0], daily_cop(frame, freq)[0], check_freq=False)
+    pd.testing.assert_frame_equal(online.site_heatmap(), Completeness(frame).site_heatmap(), check_freq=False)
+
+    rollups = RollupStore()
+    rollups.append(frame.iloc[:-120])
+    rollups.append(frame)
+    fresh = RollupStore()
+    fresh.update(frame)
+    for freq in rollups.levels:
+        pd.testing.assert_frame_equal(rollups.rollups[freq]["mean"], fresh.rollups[freq]["mean"], check_freq=False)
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checks_functions import step_mask  # noqa: E402
+
+
+def test_level_shift_is_flagged_once_at_the_shift():
+    noise = np.random.default_rng(0).normal(0, 0.3, 400)
+    shifted = np.r_[np.full(200, 20.0), np.full(200, 25.0)] + noise
+    mask = step_mask(np.column_stack([shifted, 20.0 + noise]), None)
+    assert np.flatnonzero(mask[:, 0]).tolist() == [200]
+    assert not mask[:, 1].any()
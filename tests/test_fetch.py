@@ -0,0 +1,33 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from getNISEPdata import _fetch_partitioned  # noqa: E402
+
+INDEX = pd.date_range("2025-01-01", periods=60, freq="min", tz="Europe/London")
+
+
+def read(refs, start, end):
+    if "@b" in refs:
+        raise RuntimeError("hisRead failed")
+    frame = pd.DataFrame({ref.lstrip("@"): 1.0 for ref in refs}, index=INDEX).loc[start:end]
+    frame.attrs["display"] = {ref.lstrip("@"): "Point " + ref for ref in refs}
+    return frame
+
+
+def test_refs_whose_every_chunk_failed_are_kept_as_nan():
+    frame = _fetch_partitioned(read, ["@a", "@b", "@c"], INDEX[0], INDEX[-1], ref_batch_size=1,
+                               time_slice="20min", retries=0)
+    assert list(frame.columns) == ["a", "b", "c"]
+    assert frame["b"].isna().all() and (frame[["a", "c"]] == 1).all().all()
+    assert {tuple(chunk) for chunk, _, _ in frame.attrs["failed_chunks"]} == {("@b",)}
+    assert frame.attrs["display"] == {"a": "Point @a", "c": "Point @c"}
+
+
+def test_a_fetch_where_everything_failed_keeps_the_columns():
+    frame = _fetch_partitioned(read, ["@b"], INDEX[0], INDEX[-1], retries=0, time_slice="20min")
+    assert list(frame.columns) == ["b"] and np.isnan(frame.to_numpy()).all()
@@ -0,0 +1,134 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history_cache import HistoryCache, missing_ranges  # noqa: E402
+
+REFS = ["@p1", "@p2", "@p3"]
+START = pd.Timestamp("2025-01-10 00:00", tz="Europe/London")
+
+
+class Server(object):
+    """Deterministic stand-in for hisRead: one reading per minute, recording every request."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, refs, start, end):
+        self.calls.append((tuple(refs), start, end))
+        index = pd.date_range(start.ceil("min"), end, freq="min", name="datetime")
+        minutes = ((index - START) // pd.Timedelta("1min")).to_numpy(dtype=float)
+        frame = pd.DataFrame({ref.strip("@"): minutes * int(ref[-1]) for ref in refs}, index=index)
+        frame.attrs["display"] = {ref.strip("@"): "Point " + ref.strip("@") for ref in refs}
+        return frame
+
+
+def uncached(refs, start, end):
+    frame = Server().fetch(refs, start, end)
+    frame.attrs = {}
+    return frame
+
+
+def check_equal(cached, refs, start, end):
+    pd.testing.assert_frame_equal(cached, uncached(refs, start, end), check_freq=False)
+
+
+def test_cached_frame_equals_uncached_and_is_served_from_disk(tmp_path):
+    server = Server()
+    end = START + pd.Timedelta(hours=6)
+    frame = HistoryCache(str(tmp_path)).read(REFS, "a", "g", START, end, server.fetch)
+    assert frame.attrs.pop("display") == {"p1": "Point p1", "p2": "Point p2", "p3": "Point p3"}
+    check_equal(frame, REFS, START, end)
+    assert len(server.calls) == 1
+
+    # A new cache on the same directory answers without asking the server
+    frame = HistoryCache(str(tmp_path)).read(REFS, "a", "g", START, end, server.fetch)
+    frame.attrs = {}
+    check_equal(frame, REFS, START, end)
+    assert len(server.calls) == 1
+
+
+def test_only_the_gaps_are_fetched(tmp_path):
+    server = Server()
+    cache = HistoryCache(str(tmp_path))
+    cache.read(REFS, "a", "g", START, START + pd.Timedelta(hours=6), server.fetch)
+    cache.read(REFS[:1], "a", "g", START + pd.Timedelta(days=1), START + pd.Timedelta(days=1, hours=6), server.fetch)
+
+    # The window spans stored data, a gap of all refs and one of p2/p3 only
+    end = START + pd.Timedelta(days=1, hours=6)
+    frame = cache.read(REFS, "a", "g", START + pd.Timedelta(hours=3), end, server.fetch)
+    frame.attrs = {}
+    check_equal(frame, REFS, START + pd.Timedelta(hours=3), end)
+    assert sorted(server.calls[2:]) == sorted([
+        (("@p1",), START + pd.Timedelta(hours=6), START + pd.Timedelta(days=1)),
+        (("@p2", "@p3"), START + pd.Timedelta(hours=6), end),
+    ])
+    assert cache.coverage("@p2", "a", "g") == [(START, end)]
+    # The gap spans midnight (UTC): one partition per day
+    assert sorted(os.listdir(os.path.join(str(tmp_path), "a", "g", "p2"))) == ["2025-01-10.parquet", "2025-01-11.parquet"]
+
+
+def test_invalidate_refetches_only_the_invalidated_refs(tmp_path):
+    server = Server()
+    cache = HistoryCache(str(tmp_path))
+    end = START + pd.Timedelta(hours=6)
+    cache.read(REFS, "a", "g", START, end, server.fetch)
+    cache.invalidate(["@p2"])
+    assert cache.coverage("@p2", "a", "g") == [] and cache.load("@p2", "a", "g").empty
+
+    frame = cache.read(REFS, "a", "g", START, end, server.fetch)
+    frame.attrs = {}
+    check_equal(frame, REFS, START, end)
+    assert server.calls[1:] == [(("@p2",), START, end)]
+
+
+def test_failed_chunks_stay_uncovered(tmp_path):
+    def failing(refs, start, end):
+        frame = Server().fetch(refs, start, end)
+        frame["p1"] = np.nan
+        frame.attrs["failed_chunks"] = [(["@p1"], start, end)]
+        return frame
+
+    cache = HistoryCache(str(tmp_path))
+    end = START + pd.Timedelta(hours=1)
+    cache.read(REFS[:2], "a", "g", START, end, failing)
+    assert missing_ranges(START, end, cache.coverage("@p1", "a", "g")) == [(START, end)]
+    assert cache.coverage("@p2", "a", "g") == [(START, end)]
+
+
+def test_retention_drops_old_partitions(tmp_path):
+    server = Server()
+    cache = HistoryCache(str(tmp_path), retention="2D")
+    today = pd.Timestamp.now(tz="UTC").floor("D").tz_convert("Europe/London")
+    start, end = today - pd.Timedelta(days=5), today - pd.Timedelta(hours=1)
+    cache.read(REFS[:1], "a", "g", start, end, server.fetch)
+
+    days = sorted(os.listdir(os.path.join(str(tmp_path), "a", "g", "p1")))
+    assert days[0] == (today - pd.Timedelta(days=2)).tz_convert("UTC").strftime("%Y-%m-%d.parquet")
+    assert cache.coverage("@p1", "a", "g") == [(today - pd.Timedelta(days=2), end)]
+    # The dropped days are fetched again when asked for
+    cache.read(REFS[:1], "a", "g", start, end, server.fetch)
+    assert server.calls[-1] == (("@p1",), start, today - pd.Timedelta(days=2))
+
+
+def test_single_file_caches_are_split_into_partitions(tmp_path):
+    server = Server()
+    cache = HistoryCache(str(tmp_path))
+    end = START + pd.Timedelta(hours=6)
+    cache.read(REFS[:1], "a", "g", START, end, server.fetch)
+    # Rewrite the point as the single Parquet file older versions kept
+    base = os.path.join(str(tmp_path), "a", "g", "p1")
+    cache.load("@p1", "a", "g").to_frame().to_parquet(base + ".parquet")
+    for name in os.listdir(base):
+        os.remove(os.path.join(base, name))
+
+    later = end + pd.Timedelta(hours=20)
+    frame = cache.read(REFS[:1], "a", "g", START, later, server.fetch)
+    frame.attrs = {}
+    check_equal(frame, REFS[:1], START, later)
+    assert not os.path.exists(base + ".parquet")
+    assert sorted(os.listdir(base)) == ["2025-01-10.parquet", "2025-01-11.parquet"]
@@ -0,0 +1,67 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import getNISEPdata  # noqa: E402
+import mock_server  # noqa: E402
+from history_cache import HistoryCache  # noqa: E402
+from series_store import SeriesStore  # noqa: E402
+
+END = datetime(2025, 1, 10)
+START = END - timedelta(hours=6)
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = mock_server.serve_in_thread(sites=2, gap_rate=0.0)
+    previous, getNISEPdata.BMOS_SERVER = getNISEPdata.BMOS_SERVER, server.url
+    yield server
+    getNISEPdata.BMOS_SERVER = previous
+    server.shutdown()
+
+
+def baseline_labels(server):
+    """Labels as the original getTimeseries built them: hisRead header name, then the ref map site."""
+    points = server.fleet.points
+    return [f"{dis} ({site.split('.')[-1]})" for dis, site in zip(points["dis"], points["siteNamespace"])]
+
+
+def get(server, **kwargs):
+    return getNISEPdata.getTimeseries(END, START, None, None, server.url, "nisep", "nisep", **kwargs)
+
+
+def test_mock_ref_map_names_differ_from_display_names(server):
+    points = server.fleet.points
+    assert (points["name"] != points["dis"]).all()
+    assert "output_heat_energy" in set(points["name"])
+
+
+def test_labels_use_the_hisread_display_names(server):
+    assert list(get(server).columns) == baseline_labels(server)
+
+
+def test_cached_reads_keep_the_display_names(server, tmp_path):
+    get(server, cache=HistoryCache(str(tmp_path)))
+    his_reads = server.stats["his_reads"]
+    # A new cache on the same directory serves everything from disk
+    frame = get(server, cache=HistoryCache(str(tmp_path)))
+    assert server.stats["his_reads"] == his_reads
+    assert list(frame.columns) == baseline_labels(server)
+
+
+def test_multiindex_and_series_store_use_the_display_names(server):
+    frame = get(server, columns="multi")
+    assert list(frame.columns.get_level_values("variable")) == list(server.fleet.points["dis"])
+
+    lookup = getNISEPdata.getRefLookup(server.url, "nisep", "nisep")
+    refs = [ref.lstrip("@") for ref in lookup.refs()]
+    store = SeriesStore()
+    frame = store.read("minute", refs, START, END,
+                       lambda refs, start, end: getNISEPdata.getTimeseries(
+                           end, start, None, None, server.url, "nisep", "nisep", columns="ref",
+                           refs=["@" + ref for ref in refs]))
+    assert list(getNISEPdata.label_columns(frame, lookup).columns) == baseline_labels(server)
@@ -0,0 +1,114 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checks_functions import DEFAULT_BOUNDS, check_bounds, cop_windows, daily_cop  # noqa: E402
+from completeness import Completeness  # noqa: E402
+from online_checks import OnlineChecks  # noqa: E402
+
+START = pd.Timestamp("2025-01-10 00:00", tz="Europe/London")
+SITES = ["NISEP01", "NISEP02"]
+# NISEP02's meters are reset (back to near zero) here, within the settle tail of a snapshot
+RESET = START + pd.Timedelta(days=2, hours=5, minutes=-5)
+ROLLOVER = 20000.0
+
+
+def minute_data(days=4, seed=0, wrap=False):
+    index = pd.date_range(START, START + pd.Timedelta(days=days), freq="min", inclusive="left", name="datetime")
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for k, site in enumerate(SITES):
+        heat = 15000 + np.cumsum(rng.uniform(0, 0.2, len(index)))
+        consumption = 5000 + np.cumsum(rng.uniform(0, 0.06, len(index)))
+        if k == 1:
+            after = index >= RESET
+            if wrap:
+                # The heat meter passes its wrap value at RESET
+                heat += ROLLOVER + 0.05 - heat[after][0]
+                heat[after] -= ROLLOVER
+            else:
+                heat[after] -= heat[after][0] - 1.0
+                consumption[after] -= consumption[after][0] - 1.0
+        flow = 40 + 10 * np.sin(np.arange(len(index)) / 300) + rng.normal(0, 1, len(index))
+        flow[rng.random(len(index)) < 0.002] = 90.0
+        columns[f"Output Heat Energy ({site})"] = heat
+        columns[f"ASHP Consumption Energy ({site})"] = consumption
+        columns[f"Flow Temperature ({site})"] = flow
+        columns[f"Delta T ({site})"] = rng.normal(5, 3, len(index))
+    frame = pd.DataFrame(columns, index=index)
+    # Missing and zero samples
+    holes = rng.random(frame.shape) < 0.03
+    frame = frame.mask(holes)
+    frame.iloc[100:160, 2] = 0.0
+    return frame
+
+
+def snapshots(data, window="2D", step="5h"):
+    """Rolling snapshots of ``data``; the latest minutes of each arrive late in the next."""
+    end = data.index[0] + pd.Timedelta(window)
+    while end <= data.index[-1]:
+        snapshot = data.loc[end - pd.Timedelta(window):end].copy()
+        snapshot.iloc[-5:] = np.nan
+        yield snapshot
+        end += pd.Timedelta(step)
+
+
+def windows(frame):
+    end = frame.index[-1]
+    return {"Hour": (end - pd.Timedelta(hours=1), end), "Day": (end - pd.Timedelta(days=1), end),
+            "Reset": (RESET - pd.Timedelta(hours=2), RESET + pd.Timedelta(hours=2))}
+
+
+def check_same_as_recompute(online, frame, rollover=None):
+    for freq in ("D", "h"):
+        for got, want in zip(online.daily_cop(freq), daily_cop(frame, freq, rollover)):
+            pd.testing.assert_frame_equal(got, want, check_freq=False)
+    for got, want in zip(online.cop_windows(windows(frame)), cop_windows(frame, windows(frame), rollover)):
+        pd.testing.assert_frame_equal(got, want)
+    completeness = Completeness(frame)
+    pd.testing.assert_frame_equal(online.missing_percentage(windows(frame)),
+                                  completeness.missing_percentage(windows(frame)))
+    pd.testing.assert_frame_equal(online.site_heatmap(), completeness.site_heatmap(), check_freq=False)
+
+    start, end = frame.index[-1] - pd.Timedelta(days=1), frame.index[-1]
+    got = online.check_bounds(start, end, DEFAULT_BOUNDS, SITES)
+    want = check_bounds(frame, start, end, DEFAULT_BOUNDS, SITES)
+    for site in SITES:
+        for key in want[site]:
+            pd.testing.assert_frame_equal(got[site][key], want[site][key], check_freq=False)
+
+
+@pytest.mark.parametrize("wrap", [False, True])
+def test_updates_equal_a_full_recompute_across_a_meter_reset(wrap):
+    rollover = ROLLOVER if wrap else None
+    online = OnlineChecks(rollover=rollover)
+    consumed = []
+    for frame in snapshots(minute_data(wrap=wrap)):
+        consumed.append(online.update(frame))
+        check_same_as_recompute(online, frame, rollover)
+    # Only the first snapshot is read in full
+    assert consumed[0] == len(frame) and max(consumed[1:]) < len(frame) // 4
+
+
+def test_the_reset_is_not_counted_as_negative_energy():
+    frame = minute_data().loc[RESET - pd.Timedelta(hours=1):RESET + pd.Timedelta(hours=1)]
+    online = OnlineChecks()
+    online.update(frame.iloc[:60])
+    online.update(frame)
+    heat = online.cop_windows({"All": (frame.index[0], frame.index[-1])})[1]
+    assert (heat["All"] > 0).all()
+
+
+def test_snapshots_that_do_not_continue_the_last_one_start_over():
+    data = minute_data()
+    online = OnlineChecks()
+    online.update(data.iloc[:3000])
+    # Earlier data than the last snapshot, and different columns
+    for frame in (data.iloc[1000:2000], data.iloc[1000:2000, :4]):
+        assert online.update(frame) == len(frame)
+        check_same_as_recompute(online, frame)
@@ -0,0 +1,37 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import getNISEPdata  # noqa: E402
+import mock_server  # noqa: E402
+from history_cache import HistoryCache  # noqa: E402
+
+END = datetime(2025, 1, 10)
+START = END - timedelta(hours=1)
+
+
+def test_removed_refs_are_pruned_once_per_cache_even_if_the_map_is_refetched(tmp_path, monkeypatch):
+    server = mock_server.serve_in_thread(sites=2, gap_rate=0.0)
+    monkeypatch.setattr(getNISEPdata, "BMOS_SERVER", server.url)
+    lookup = getNISEPdata.getRefLookup(server.url, "nisep", "nisep", ttl=0)
+    gone = lookup.refs()[0]
+    cache = HistoryCache(str(tmp_path))
+    getNISEPdata.getTimeseries(END, START, None, None, server.url, "nisep", "nisep", cache=cache)
+    assert cache.coverage(gone, "max", "minute")
+
+    server.fleet.points = server.fleet.points[server.fleet.points["ref"] != gone]
+    assert getNISEPdata.getRefLookup(server.url, "nisep", "nisep", ttl=0).removed == {gone}
+    # The unchanged map is fetched again before any getTimeseries call has pruned the cache
+    lookup = getNISEPdata.getRefLookup(server.url, "nisep", "nisep", ttl=0)
+    assert lookup.removed == {gone}
+
+    invalidated = []
+    monkeypatch.setattr(cache, "invalidate", lambda refs: invalidated.append(set(refs)) or
+                        HistoryCache.invalidate(cache, refs))
+    for _ in range(2):
+        getNISEPdata.getTimeseries(END, START, None, None, server.url, "nisep", "nisep", cache=cache)
+    assert invalidated == [{gone}]
+    assert cache.coverage(gone, "max", "minute") == []
+    server.shutdown()
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rollups import STATS, RollupStore  # noqa: E402
+
+START = pd.Timestamp("2025-01-10 00:00", tz="Europe/London")
+
+
+def minute_data(days=4, seed=0):
+    index = pd.date_range(START, START + pd.Timedelta(days=days), freq="min", inclusive="left", name="datetime")
+    values = np.random.default_rng(seed).normal(40, 5, (len(index), 2))
+    values[np.random.default_rng(seed + 1).random(values.shape) < 0.05] = np.nan
+    return pd.DataFrame(values, index=index, columns=["Flow Temperature (NISEP01)", "Flow Temperature (NISEP02)"])
+
+
+def snapshots(data, window="2D", step="7h"):
+    """Rolling snapshots of ``data``, each revising the last few minutes of the one before."""
+    end = data.index[0] + pd.Timedelta(window)
+    revised = data.copy()
+    while end <= data.index[-1]:
+        snapshot = revised.loc[end - pd.Timedelta(window):end].copy()
+        yield snapshot
+        # Late-arriving samples: the next snapshot fills values the previous one was missing
+        revised.loc[end - pd.Timedelta("10min"):end] = revised.loc[end - pd.Timedelta("10min"):end].fillna(1.0)
+        end += pd.Timedelta(step)
+
+
+def check_same(store, fresh):
+    for freq in store.levels:
+        for stat in STATS:
+            pd.testing.assert_frame_equal(store.rollups[freq][stat], fresh.rollups[freq][stat],
+                                          check_freq=False, obj=f"{freq} {stat}")
+
+
+def test_append_equals_a_fresh_update():
+    store = RollupStore()
+    for snapshot in snapshots(minute_data()):
+        store.append(snapshot)
+        fresh = RollupStore()
+        fresh.update(snapshot)
+        check_same(store, fresh)
+
+
+def test_update_merges_new_rows_like_a_single_update():
+    data = minute_data(days=2)
+    store = RollupStore()
+    for part in np.array_split(np.arange(len(data)), 5):
+        store.update(data.iloc[part])
+    fresh = RollupStore()
+    fresh.update(data)
+    check_same(store, fresh)
+
+
+def test_append_starts_over_when_the_columns_change():
+    data = minute_data(days=2)
+    store = RollupStore()
+    store.append(data)
+    store.append(data.iloc[:, :1])
+    fresh = RollupStore()
+    fresh.update(data.iloc[:, :1])
+    check_same(store, fresh)
+
+
+def test_read_picks_the_coarsest_level_with_enough_points():
+    data = minute_data()
+    store = RollupStore(target_points=50)
+    store.update(data)
+    level, frame = store.read(START, START + pd.Timedelta(hours=6))
+    assert level is None and len(frame) == 6 * 60 + 1
+    level, frame = store.read(START, START + pd.Timedelta(days=3))
+    assert level == "h" and len(frame) == 3 * 24 + 1
+    assert np.allclose(frame.iloc[0], data.iloc[:60].mean())
@@ -0,0 +1,112 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from series_store import SeriesStore  # noqa: E402
+
+START = pd.Timestamp("2025-01-10 00:00", tz="Europe/London")
+HOUR = pd.Timedelta(hours=1)
+# Bytes of the values, or of the index, of two hours of minute data
+ARRAY_BYTES = (2 * 60 + 1) * 8
+
+
+class Server(object):
+    """One reading per minute per column, recording every request."""
+
+    def __init__(self):
+        self.calls = []
+
+    def fetch(self, columns, start, end):
+        self.calls.append((tuple(columns), start, end))
+        index = pd.date_range(start, end, freq="min", name="datetime")
+        minutes = ((index - START) // pd.Timedelta("1min")).to_numpy(dtype=float)
+        return pd.DataFrame({column: minutes * int(column[-1]) for column in columns}, index=index)
+
+
+def expected(columns, start, end):
+    return Server().fetch(columns, start, end)
+
+
+def test_missing_is_the_union_of_the_column_gaps():
+    store = SeriesStore()
+    store.put("minute", expected(["p1", "p2"], START, START + 2 * HOUR), [(START, START + 2 * HOUR)])
+    store.put("minute", expected(["p1"], START + 3 * HOUR, START + 4 * HOUR), [(START + 3 * HOUR, START + 4 * HOUR)])
+    assert store.missing("minute", ["p1"], START, START + 4 * HOUR) == [(START + 2 * HOUR, START + 3 * HOUR)]
+    assert store.missing("minute", ["p1", "p2"], START + HOUR, START + 4 * HOUR) == [(START + 2 * HOUR, START + 4 * HOUR)]
+    assert store.missing("minute", ["p1", "p2"], START, START + 2 * HOUR) == []
+    assert store.missing("other", ["p1"], START, START + HOUR) == [(START, START + HOUR)]
+
+
+def test_reads_fetch_only_what_is_not_held():
+    server = Server()
+    store = SeriesStore()
+    frame = store.read("minute", ["p1", "p2"], START, START + 2 * HOUR, server.fetch)
+    pd.testing.assert_frame_equal(frame, expected(["p1", "p2"], START, START + 2 * HOUR), check_freq=False)
+
+    frame = store.read("minute", ["p1", "p2", "p3"], START + HOUR, START + 3 * HOUR, server.fetch)
+    pd.testing.assert_frame_equal(frame, expected(["p1", "p2", "p3"], START + HOUR, START + 3 * HOUR), check_freq=False)
+    assert sorted(server.calls[1:]) == sorted([
+        (("p1", "p2"), START + 2 * HOUR, START + 3 * HOUR),
+        (("p3",), START + HOUR, START + 3 * HOUR),
+    ])
+    # Held data is read-only
+    with pytest.raises(ValueError):
+        store.get("minute", "p1").to_numpy()[0] = 1.0
+
+
+def test_failed_fetches_are_not_covered():
+    def failing(columns, start, end):
+        frame = Server().fetch(columns, start, end)
+        frame.attrs["failed_chunks"] = [(["@" + columns[0]], start, end)]
+        return frame
+
+    store = SeriesStore()
+    store.read("minute", ["p1"], START, START + HOUR, failing)
+    assert store.missing("minute", ["p1"], START, START + HOUR) == [(START, START + HOUR)]
+
+
+def test_least_recently_used_columns_are_evicted():
+    store = SeriesStore(max_bytes=4 * ARRAY_BYTES)
+    for column in ["p1", "p2", "p3"]:
+        store.put("minute", expected([column], START, START + 2 * HOUR), [(START, START + 2 * HOUR)])
+    # The columns share one index, so all three fit
+    assert len(store) == 3 and store.nbytes == 4 * ARRAY_BYTES
+    store.get("minute", "p1")
+    store.put("minute", expected(["p4"], START, START + 2 * HOUR), [(START, START + 2 * HOUR)])
+    assert [column for column in ["p1", "p2", "p3", "p4"] if ("minute", column) in store] == ["p1", "p3", "p4"]
+    assert store.nbytes == 4 * ARRAY_BYTES
+    # An evicted column is fetched again
+    assert store.missing("minute", ["p2"], START, START + HOUR) == [(START, START + HOUR)]
+
+
+def test_byte_count_returns_to_zero():
+    store = SeriesStore(max_bytes=2 * ARRAY_BYTES)
+    for hour in range(3):
+        start = START + hour * HOUR
+        store.put("minute", expected(["p%d" % (hour + 1)], start, start + 2 * HOUR), [(start, start + 2 * HOUR)])
+    # Each column had its own index: evicting a column also frees its index
+    assert len(store) == 1 and store.nbytes == 2 * ARRAY_BYTES
+    store.clear()
+    assert len(store) == 0 and store.nbytes == 0
+
+
+def test_reads_larger_than_the_cap_are_served_from_the_fetch():
+    server = Server()
+    store = SeriesStore(max_bytes=2 * ARRAY_BYTES)
+    columns = ["p1", "p2", "p3"]
+    frame = store.read("minute", columns, START, START + 2 * HOUR, server.fetch)
+    pd.testing.assert_frame_equal(frame, expected(columns, START, START + 2 * HOUR), check_freq=False)
+    assert len(store) == 1
+
+
+def test_frames_share_the_stored_arrays():
+    store = SeriesStore()
+    store.put("minute", expected(["p1", "p2"], START, START + 2 * HOUR), [(START, START + 2 * HOUR)])
+    frame = store.frame("minute", ["p1", "p2"], START, START + HOUR)
+    assert np.shares_memory(frame["p1"].to_numpy(), store.get("minute", "p1").to_numpy())
+    assert store.frame("minute", ["p9"]).empty
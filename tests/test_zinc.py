@@ -0,0 +1,57 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import zinc  # noqa: E402
+
+HEADER = 'ver:"3.0" hisStart:2025-01-01T00:00:00+00:00 London'
+STAMPS = ["2025-01-01T00:%02d:00+00:00 London" % minute for minute in range(60)]
+
+
+def grid(rows, columns=("Flow Temperature (a)", "Output Heat Energy (b)", "Runtime (c)")):
+    return [HEADER, "ts," + ",".join(columns)] + [stamp + "," + row for stamp, row in zip(STAMPS, rows)]
+
+
+def slow(cells, ncols):
+    rows = [cell.split(",") for cell in cells]
+    rows = np.array([row[:ncols] + [""] * (ncols - len(row)) for row in rows], dtype=str)
+    out = np.empty(rows.shape)
+    zinc._parse_values(rows, out)
+    return out
+
+
+def test_units_are_removed():
+    frame = zinc.read_his_grid(grid(["45.2°C,1_000kWh,12sec", "-3.5°C,1e3kWh,4sec"]))
+    np.testing.assert_array_equal(frame.to_numpy(), [[45.2, 1000.0, 12.0], [-3.5, 1000.0, 4.0]])
+    assert list(frame.columns) == ["Flow Temperature (a)", "Output Heat Energy (b)", "Runtime (c)"]
+
+
+def test_nulls_markers_and_empty_cells_are_nan():
+    frame = zinc.read_his_grid(grid(["N,M,", ",2kWh,3sec", "1°C,N,N"]))
+    np.testing.assert_array_equal(frame.to_numpy(), [[np.nan, np.nan, np.nan],
+                                                    [np.nan, 2.0, 3.0],
+                                                    [1.0, np.nan, np.nan]])
+
+
+def test_ragged_rows_keep_their_columns():
+    # One row misses a cell and the next has one too many: same total, but nothing may shift
+    rows = ["1°C,2kWh,3sec", "4°C,5kWh", "7°C,8kWh,9sec,10sec", "11°C,12kWh,13sec"]
+    assert zinc._parse_values_fast([row for row in rows], len(rows), 3) is None
+    frame = zinc.read_his_grid(grid(rows))
+    np.testing.assert_array_equal(frame.to_numpy(), [[1, 2, 3], [4, 5, np.nan], [7, 8, 9], [11, 12, 13]])
+
+
+@pytest.mark.parametrize("cells", [
+    ["45.2°C,1_000kWh,12sec", "-3.5°C,1e3kWh,4sec", "N,N,N"],
+    ["1,2,3", ",,", "1.5e-3,-2,+4"],
+    ["12kW2,1,2", "3,4,5"],
+    ['"text",1,2', "3,4,5"],
+])
+def test_fast_path_matches_the_slow_path_or_declines(cells):
+    fast = zinc._parse_values_fast(cells, len(cells), 3)
+    if fast is not None:
+        np.testing.assert_array_equal(fast, slow(cells, 3))
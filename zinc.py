@@ -0,0 +1,201 @@
+#!python
+# -*- coding: utf-8 -*-
+"""Streaming reader for the Zinc grids returned by hisRead.
+
+The grid is read line by line (e.g. from ``response.iter_lines``) in batches.
+For each batch the unit suffixes such as ``45.2°C`` are removed from the raw
+bytes and the numbers are parsed into one float array in a single C pass, so
+no full string copy of the payload and no per-column ``to_numeric`` loop is
+needed. Batches holding quoted strings or other odd cells fall back to a
+cell-by-cell path.
+"""
+import csv
+import re
+import string
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Characters that can trail a Zinc number as its unit (°C, kW, m³/h, %, ...)
+UNIT_CHARS = string.ascii_letters + "°%/_$µ³²·'"
+
+# A Zinc number without its unit; Zinc units contain no digits, and an exponent needs some
+_NUMBER = re.compile(r"[-+]?[0-9][0-9_]*(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?")
+
+_NUMERIC = b"0123456789.+-eE,"
+
+_META_TOKEN = re.compile(r'(\w+)(?::("(?:[^"\\]|\\.)*"|\S+))?')
+
+# Zinc gives the city part of the tz database name ("London")
+_TZ_ALIASES = {"UTC": "UTC", "London": "Europe/London"}
+
+
+class ZincError(Exception):
+    """Raised when the server answers with an error grid."""
+
+
+def parse_meta(line):
+    """Parse a Zinc meta line (``ver:"3.0" aggregate:"max" err``) into a dict."""
+    meta = {}
+    for name, value in _META_TOKEN.findall(line):
+        if not value:
+            meta[name] = True
+        elif value.startswith('"'):
+            meta[name] = value[1:-1].replace('\\"', '"')
+        else:
+            meta[name] = value
+    return meta
+
+
+def _split_row(line):
+    if '"' in line:
+        return next(csv.reader([line]))
+    return line.split(',')
+
+
+def _unit_suffixes(cells):
+    """Units trailing the numbers of the first and last row of a batch, longest first.
+
+    Suffixes with characters a unit cannot have (digits, ...) are not units and stay in.
+    """
+    units = set()
+    for row in {cells[0], cells[-1]}:
+        for cell in row.split(","):
+            match = _NUMBER.match(cell)
+            if match and match.end() < len(cell) and not cell[match.end():].strip(UNIT_CHARS):
+                units.add(cell[match.end():])
+    return sorted(units, key=len, reverse=True)
+
+
+def _parse_values_fast(cells, nrows, ncols):
+    """Parse the value part of a batch of rows in one C pass, or return None.
+
+    The unit suffixes found in the batch (``°C``, ``kWh``, ``sec``, ...) are
+    removed from the bytes, then ``N`` nulls, ``M`` markers and ``_`` digit separators. Only when
+    nothing but numbers and commas is left, empty cells become ``nan`` and
+    ``np.fromstring`` reads the lot. Anything else (a row without exactly ``ncols``
+    cells, an unseen unit, strings, a count other than ``nrows * ncols``) returns
+    None for the cell-by-cell path.
+    """
+    # Every row must hold exactly ``ncols`` cells, or later values would shift into the wrong column
+    if len(cells) != nrows or any(cell.count(",") != ncols - 1 for cell in cells):
+        return None
+    buf = ",".join(cells).encode("utf-8")
+    for unit in _unit_suffixes(cells):
+        buf = buf.replace(unit.encode("utf-8"), b"")
+    buf = buf.translate(None, b"NM_")
+    if buf.translate(None, _NUMERIC):
+        return None
+    buf = buf.replace(b",,", b",nan,").replace(b",,", b",nan,")
+    if buf.startswith(b","):
+        buf = b"nan" + buf
+    if buf.endswith(b","):
+        buf = buf + b"nan"
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            values = np.fromstring(buf, sep=",")
+        except ValueError:
+            return None
+    if values.size != nrows * ncols:
+        return None
+    return values.reshape(nrows, ncols)
+
+
+def _parse_values(cells, out):
+    """Write a 2D array of Zinc value strings into the float64 array ``out``.
+
+    Nulls (``N``), markers, booleans and anything non-numeric become NaN.
+    """
+    stripped = np.char.rstrip(cells, UNIT_CHARS)
+    stripped[(stripped == "") | (stripped == "-")] = "nan"
+    try:
+        np.copyto(out, stripped, casting="unsafe")
+    except ValueError:
+        # Odd cells (strings, refs, ...) in the batch: coerce column by column
+        for j in range(stripped.shape[1]):
+            out[:, j] = pd.to_numeric(pd.Series(stripped[:, j]), errors="coerce").to_numpy(dtype=np.float64)
+
+
+def _parse_timestamps(cells):
+    """Parse ``2024-01-01T00:00:00+00:00 London`` strings into a tz-aware index."""
+    parts = np.char.partition(cells, " ")
+    tz_name = parts[0, 2] if len(parts) else ""
+    tz = _TZ_ALIASES.get(tz_name, tz_name if "/" in tz_name else "Europe/" + tz_name) if tz_name else "UTC"
+    index = pd.to_datetime(parts[:, 0], utc=True, format="ISO8601")
+    return index.tz_convert(tz)
+
+
+def read_his_grid(lines, batch_size=50000, tz=None):
+    """Read a hisRead Zinc grid into a DataFrame indexed by its timestamp column.
+
+    Args:
+        lines (iterable): Lines of the grid, e.g. ``response.iter_lines(decode_unicode=True)``.
+        batch_size (int): Rows parsed per vectorized batch.
+        tz (str): Convert the index to this timezone (default: the grid's own).
+
+    Returns:
+        pd.DataFrame: Float columns named as in the grid header, grid meta in ``attrs['meta']``.
+    """
+    lines = iter(lines)
+    meta = {}
+    header = None
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line:
+            continue
+        if not meta:
+            meta = parse_meta(line)
+            if "err" in meta:
+                raise ZincError(meta.get("dis", "hisRead error grid"))
+            continue
+        header = _split_row(line)
+        break
+    if header is None:
+        frame = pd.DataFrame(index=pd.DatetimeIndex([], tz=tz or "UTC", name="datetime"))
+        frame.attrs["meta"] = meta
+        return frame
+
+    ncols = len(header)
+    values, stamps = [], []
+    batch = []
+
+    def flush():
+        out = None
+        if not any('"' in line for line in batch):
+            parts = [line.split(",", 1) for line in batch]
+            stamps.append(_parse_timestamps(np.array([part[0] for part in parts], dtype=str)))
+            out = _parse_values_fast([part[1] if len(part) > 1 else "" for part in parts], len(batch), ncols - 1)
+            if out is None:
+                stamps.pop()
+        if out is None:
+            rows = [_split_row(line) for line in batch]
+            rows = np.array([row[:ncols] + [""] * (ncols - len(row)) for row in rows], dtype=str)
+            stamps.append(_parse_timestamps(rows[:, 0]))
+            out = np.empty((len(batch), ncols - 1), dtype=np.float64)
+            _parse_values(rows[:, 1:], out)
+        values.append(out)
+        batch.clear()
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+
+    if values:
+        index = stamps[0].append(stamps[1:]) if len(stamps) > 1 else stamps[0]
+        data = np.vstack(values) if len(values) > 1 else values[0]
+    else:
+        index = pd.DatetimeIndex([], tz="UTC")
+        data = np.empty((0, ncols - 1))
+    if tz is not None:
+        index = index.tz_convert(tz)
+    index.name = "datetime"
+    frame = pd.DataFrame(data, index=index, columns=header[1:], copy=False)
+    frame.attrs["meta"] = meta
+    return frame